@@ -0,0 +1,122 @@
+"""
+Password hashers with a configurable cost that hash in a bounded worker pool.
+
+PASSWORD_HASHER selects the hasher new passwords are stored with (argon2,
+bcrypt or pbkdf2); the others stay listed in PASSWORD_HASHERS so existing
+hashes keep verifying and are re-hashed with the configured algorithm and
+cost on the user's next login. Costs are read from settings on every call,
+so raising ARGON2_TIME_COST, BCRYPT_ROUNDS or PBKDF2_ITERATIONS also upgrades
+hashes on login.
+
+Hashing is deliberately CPU-bound. Every encode and verify runs in one
+per-process pool of PASSWORD_HASH_WORKERS threads (the underlying libraries
+release the GIL while hashing), so a burst of logins can occupy at most that
+many cores. At most PASSWORD_HASH_QUEUE further calls wait for a thread; past
+that `PasswordHashingBusy` is raised at once and the auth views answer 503
+rather than queueing requests that would time out anyway.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PasswordHashingBusy(Exception):
+    """Every hashing worker is busy and the queue is full."""
+
+
+class HashingPool:
+    """A thread pool that rejects work instead of queueing more than `queue_size` calls."""
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._local = threading.local()
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created lazily, and again after a fork: a forked worker process
+        # inherits the executor object but none of its threads.
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='password-hashing',
+                    initializer=self._mark_worker,
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _mark_worker(self):
+        self._local.worker = True
+
+    def run(self, func, *args, **kwargs):
+        # Hashers call each other (PBKDF2's verify encodes); run those inline
+        # rather than waiting on the pool from inside it.
+        if getattr(self._local, 'worker', False):
+            return func(*args, **kwargs)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy('Too many password hashing requests')
+        try:
+            future = self._get_executor().submit(func, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def hashing_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashingPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE)
+        return _pool
+
+
+class PooledHasherMixin:
+    def encode(self, password, salt, *args, **kwargs):
+        return hashing_pool().run(super().encode, password, salt, *args, **kwargs)
+
+    def verify(self, password, encoded):
+        return hashing_pool().run(super().verify, password, encoded)
+
+
+class Argon2PasswordHasher(PooledHasherMixin, hashers.Argon2PasswordHasher):
+    """Argon2id (requires argon2-cffi); ARGON2_TIME_COST, ARGON2_MEMORY_COST (KiB), ARGON2_PARALLELISM."""
+
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARALLELISM
+
+
+class BCryptSHA256PasswordHasher(PooledHasherMixin, hashers.BCryptSHA256PasswordHasher):
+    """bcrypt over a SHA-256 digest (requires bcrypt); BCRYPT_ROUNDS is the log2 cost."""
+
+    @property
+    def rounds(self):
+        return settings.BCRYPT_ROUNDS
+
+
+class PBKDF2PasswordHasher(PooledHasherMixin, hashers.PBKDF2PasswordHasher):
+    """Django's default PBKDF2-SHA256; PBKDF2_ITERATIONS."""
+
+    @property
+    def iterations(self):
+        return settings.PBKDF2_ITERATIONS
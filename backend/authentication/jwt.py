@@ -0,0 +1,144 @@
+"""
+JWT authentication without a users-table query per request.
+
+Access tokens carry id, username and email claims (see
+`ClaimsTokenObtainPairSerializer`) and request.user is built from them. What
+a token cannot tell is whether the user has since been deactivated, so that
+state is read from the database once and kept in a small per-process LRU
+cache for JWT_USER_CACHE_TTL seconds. Saving or deleting a user evicts its entry in
+this process (see `authentication.signals`); other processes pick the change
+up when their entry expires, so the TTL bounds how long a deactivated user
+can keep using an unexpired token.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+USER_STATE_FIELDS = ('username', 'email', 'is_active', 'is_staff', 'is_superuser')
+
+
+class UserStateCache:
+    """Thread-safe LRU mapping of user id to its USER_STATE_FIELDS, with a TTL."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            state, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return state
+
+    def set(self, user_id, state):
+        with self._lock:
+            self._entries[user_id] = (state, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def forget(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_state_cache = UserStateCache(
+    max_size=getattr(settings, 'JWT_USER_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'JWT_USER_CACHE_TTL', 60),
+)
+
+
+class ClaimsUser(TokenUser):
+    """
+    Lightweight request.user built from the token and the cached user state.
+
+    It has no database row behind it: use `request.user.id` (or `.pk`) when
+    filtering or assigning foreign keys, never the object itself.
+    """
+
+    def __init__(self, token, state):
+        super().__init__(token)
+        self.state = state
+
+    @cached_property
+    def username(self):
+        # Tokens issued before the claims were added fall back to the cached row.
+        return self.token.get('username', self.state['username'])
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', self.state['email'])
+
+    @cached_property
+    def is_active(self):
+        return self.state['is_active']
+
+    @cached_property
+    def is_staff(self):
+        return self.state['is_staff']
+
+    @cached_property
+    def is_superuser(self):
+        return self.state['is_superuser']
+
+
+def user_id_from_token(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken('Token contained no recognizable user identification')
+
+
+def state_queryset(user_id):
+    return get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id})\
+        .values(*USER_STATE_FIELDS)
+
+
+def user_from_state(validated_token, state):
+    if state is None:
+        raise AuthenticationFailed('User not found', code='user_not_found')
+    if not state['is_active']:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+    return ClaimsUser(validated_token, state)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that resolves users through `user_state_cache`."""
+
+    def get_user(self, validated_token):
+        user_id = user_id_from_token(validated_token)
+        state = user_state_cache.get(user_id)
+        if state is None:
+            state = state_queryset(user_id).first()
+            if state is not None:
+                user_state_cache.set(user_id, state)
+        return user_from_state(validated_token, state)
+
+    async def aget_user(self, validated_token):
+        user_id = user_id_from_token(validated_token)
+        state = user_state_cache.get(user_id)
+        if state is None:
+            state = await state_queryset(user_id).afirst()
+            if state is not None:
+                user_state_cache.set(user_id, state)
+        return user_from_state(validated_token, state)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from authentication.revocation import DEFAULT_PURGE_BATCH, purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Deletes revoked refresh tokens that have expired anyway, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_PURGE_BATCH)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        def progress(deleted):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{deleted} revoked tokens deleted')
+
+        deleted = purge_expired(batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully purged {deleted} expired revoked tokens')
+        )
@@ -1,3 +1,16 @@
 from django.db import models
 
-# Create your models here.
+
+class RevokedToken(models.Model):
+    """A refresh token that may no longer be used, keyed by its jti claim.
+
+    Rows are written when a refresh token is rotated (see
+    `authentication.revocation`) and are only needed until the token would
+    have expired anyway; `purge_revoked_tokens` deletes them after that.
+    """
+    jti = models.CharField(max_length=255, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.jti} (expires {self.expires_at})"
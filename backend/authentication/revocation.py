@@ -0,0 +1,172 @@
+"""
+Revocation of refresh tokens, checked without a query on the common path.
+
+`RevokedToken` rows (keyed by jti) are the persistent record. In front of
+them each process keeps a bloom filter of the revoked jtis, synced from the
+table every TOKEN_REVOCATION_SYNC_INTERVAL seconds by reading only the rows
+revoked since the last sync, and rebuilt from the unexpired rows every
+TOKEN_REVOCATION_REBUILD_INTERVAL seconds so expired entries drop out. A
+token the filter has never seen is not revoked; only a possible match is
+confirmed through the exact set in the cache, then the table, so a refresh
+costs the same however many revocations pile up.
+
+The filter may lag revocations made by other processes by up to one sync
+interval. That does not matter for rotation: the presented token is revoked
+with an INSERT on the jti primary key, so a second use of the same refresh
+token fails there even if no filter has seen it yet.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import RevokedToken
+
+CACHE_PREFIX = 'revoked-jti:'
+DEFAULT_PURGE_BATCH = 5000
+# Rows are stamped before their transaction commits; re-read a little of the
+# previous window so late commits are not missed.
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+class BloomFilter:
+    """Fixed-size bloom filter of strings, sized for `capacity` items at `error_rate`."""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, key):
+        # Double hashing: k positions from two 64-bit halves of one digest.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, key):
+        positions = self._positions(key)
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationStore:
+    def __init__(self, capacity, error_rate, sync_interval, rebuild_interval):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self._bloom = None
+        self._synced_at = None
+        self._next_sync = 0.0
+        self._next_rebuild = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'TOKEN_REVOCATION_CACHE_ALIAS', 'default')]
+
+    def _sync(self):
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        # One thread syncs; the others keep using the current filter meanwhile.
+        if not self._lock.acquire(blocking=self._bloom is None):
+            return
+        try:
+            if now < self._next_sync:
+                return
+            started = timezone.now()
+            if self._bloom is None or now >= self._next_rebuild:
+                bloom = BloomFilter(self.capacity, self.error_rate)
+                rows = RevokedToken.objects.filter(expires_at__gt=started)
+                self._next_rebuild = now + self.rebuild_interval
+            else:
+                bloom = self._bloom
+                rows = RevokedToken.objects.filter(revoked_at__gte=self._synced_at - SYNC_OVERLAP)
+            for jti in rows.values_list('jti', flat=True).iterator(chunk_size=10000):
+                bloom.add(jti)
+            self._bloom, self._synced_at, self._next_sync = bloom, started, now + self.sync_interval
+        finally:
+            self._lock.release()
+
+    def is_revoked(self, jti):
+        self._sync()
+        if jti not in self._bloom:
+            return False
+        # A possible match: a revoked token or a false positive.
+        key = CACHE_PREFIX + jti
+        revoked = self.cache.get(key)
+        if revoked is None:
+            expires_at = RevokedToken.objects\
+                .filter(jti=jti, expires_at__gt=timezone.now())\
+                .values_list('expires_at', flat=True)\
+                .first()
+            revoked = expires_at is not None
+            if revoked:
+                self.cache.set(key, True, timeout=self._seconds_until(expires_at))
+            else:
+                # Could still be revoked later; revoke() overwrites this entry.
+                self.cache.set(key, False, timeout=self.sync_interval)
+        return revoked
+
+    def revoke(self, jti, expires_at):
+        """Record `jti` as revoked; returns False if it already was."""
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            return False
+        if self._bloom is not None:
+            self._bloom.add(jti)
+        self.cache.set(CACHE_PREFIX + jti, True, timeout=self._seconds_until(expires_at))
+        return True
+
+    @staticmethod
+    def _seconds_until(moment):
+        return max(1, int((moment - timezone.now()).total_seconds()))
+
+    def reset(self):
+        """Forget the filter; the next check rebuilds it from the table."""
+        with self._lock:
+            self._bloom = None
+            self._next_sync = 0.0
+
+
+def purge_expired(batch_size=DEFAULT_PURGE_BATCH, now=None, progress=None):
+    """
+    Delete revocations of tokens that have expired by `now`, `batch_size`
+    rows per statement so each transaction stays short; returns the count.
+    """
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        batch = RevokedToken.objects\
+            .filter(expires_at__lte=now)\
+            .order_by('expires_at')\
+            .values_list('jti', flat=True)[:batch_size]
+        batch = list(batch)
+        if not batch:
+            return deleted
+        deleted += RevokedToken.objects.filter(jti__in=batch).delete()[0]
+        if progress is not None:
+            progress(deleted)
+
+
+revocations = RevocationStore(
+    capacity=getattr(settings, 'TOKEN_REVOCATION_BLOOM_CAPACITY', 1000000),
+    error_rate=getattr(settings, 'TOKEN_REVOCATION_BLOOM_ERROR_RATE', 0.001),
+    sync_interval=getattr(settings, 'TOKEN_REVOCATION_SYNC_INTERVAL', 5),
+    rebuild_interval=getattr(settings, 'TOKEN_REVOCATION_REBUILD_INTERVAL', 3600),
+)
@@ -1,5 +1,11 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .revocation import revocations
 
 User = get_user_model()
 
@@ -23,4 +29,48 @@ class RegisterSerializer(serializers.ModelSerializer):
             email=validated_data['email'],
             password=validated_data['password']
         )
-        return user
\ No newline at end of file
+        return user
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Adds username and email claims, so requests can identify the user without a query."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['username'] = user.username
+        token['email'] = user.email
+        return token
+
+
+class RevocationTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Token refresh that honours `authentication.revocation`: revoked refresh
+    tokens are rejected, and with BLACKLIST_AFTER_ROTATION a rotated token is
+    revoked, so each refresh token can be used once.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        jti = refresh[api_settings.JTI_CLAIM]
+        if revocations.is_revoked(jti):
+            raise TokenError('Token is blacklisted')
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                # Also catches a concurrent refresh with the same token.
+                if not revocations.revoke(jti, datetime_from_epoch(refresh['exp'])):
+                    raise TokenError('Token is blacklisted')
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
+
+
+def tokens_for_user(user):
+    refresh = ClaimsTokenObtainPairSerializer.get_token(user)
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    }
@@ -1,10 +1,19 @@
-from django.test import TestCase, Client
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.utils import timezone
+from datetime import timedelta
+from io import StringIO
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 from unittest.mock import patch
+import threading
+from .hashers import HashingPool, PasswordHashingBusy
+from .jwt import UserStateCache, user_state_cache
+from .models import RevokedToken
+from .revocation import BloomFilter, revocations
 
 User = get_user_model()
 
@@ -98,3 +107,189 @@ class AuthenticationTests(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTrue(response.data['valid'])
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        user_state_cache.clear()
+        self.user = User.objects.create_user(
+            username='claims', email='claims@example.com', password='testpass123'
+        )
+        self.list_url = reverse('expense-list')
+
+    def login(self):
+        response = self.client.post(reverse('token_obtain_pair'), {
+            'username': 'claims', 'password': 'testpass123'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_login_returns_user_without_second_lookup(self):
+        with self.assertNumQueries(1):
+            data = self.login()
+        self.assertEqual(data['user'], {'id': self.user.id, 'username': 'claims', 'email': 'claims@example.com'})
+
+        token = AccessToken(data['tokens']['access'])
+        self.assertEqual((token['username'], token['email']), ('claims', 'claims@example.com'))
+
+    def test_authenticated_reads_cost_no_user_queries(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['tokens']['access']}")
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Only the data version and the expense query remain once the user
+        # state is cached...
+        with self.assertNumQueries(2):
+            self.client.get(self.list_url)
+        # ...and a conditional hit only reads the data version.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['tokens']['access']}")
+        self.assertEqual(self.client.get(self.list_url).status_code, status.HTTP_200_OK)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.list_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.user.delete()
+        self.assertEqual(self.client.get(self.list_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_state_cache_is_bounded_and_expires(self):
+        cache = UserStateCache(max_size=2, ttl=10)
+        with patch('authentication.jwt.time.monotonic', return_value=100):
+            cache.set(1, {'is_active': True})
+            cache.set(2, {'is_active': True})
+            cache.get(1)
+            cache.set(3, {'is_active': True})
+            # 2 was the least recently used entry.
+            self.assertIsNone(cache.get(2))
+            self.assertIsNotNone(cache.get(1))
+        with patch('authentication.jwt.time.monotonic', return_value=111):
+            self.assertIsNone(cache.get(1))
+
+
+class PasswordHashingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='hasher', email='hasher@example.com',
+                                             password='Hashing-passw0rd')
+
+    def test_register_checks_duplicates_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('register'), {
+                'username': 'hasher', 'email': 'other@example.com', 'password': 'x'})
+        self.assertEqual(response.data['error'], 'Username already exists')
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('register'), {
+                'username': 'other', 'email': 'hasher@example.com', 'password': 'x'})
+        self.assertEqual(response.data['error'], 'Email already exists')
+
+    def test_hashing_runs_in_the_pool(self):
+        threads = []
+        pool = HashingPool(workers=1, queue_size=0)
+        self.assertEqual(pool.run(lambda: threads.append(threading.current_thread().name) or 'done'), 'done')
+        self.assertTrue(threads[0].startswith('password-hashing'))
+        # Nested calls from a worker run inline instead of waiting on the pool.
+        self.assertEqual(pool.run(pool.run, lambda: 'nested'), 'nested')
+
+    def test_full_pool_rejects_instead_of_queueing(self):
+        pool = HashingPool(workers=1, queue_size=0)
+        started, release = threading.Event(), threading.Event()
+        blocked = threading.Thread(target=pool.run, args=(lambda: started.set() or release.wait(5),))
+        blocked.start()
+        started.wait(5)
+        try:
+            with self.assertRaises(PasswordHashingBusy):
+                pool.run(lambda: None)
+        finally:
+            release.set()
+            blocked.join()
+        self.assertIsNone(pool.run(lambda: None))
+
+    def test_login_and_register_answer_503_when_hashing_is_busy(self):
+        with patch.object(HashingPool, 'run', side_effect=PasswordHashingBusy):
+            login = self.client.post(reverse('token_obtain_pair'),
+                                     {'username': 'hasher', 'password': 'Hashing-passw0rd'})
+            register = self.client.post(reverse('register'), {
+                'username': 'new', 'email': 'new@example.com', 'password': 'Hashing-passw0rd'})
+        for response in (login, register):
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(User.objects.filter(username='new').exists())
+
+    def test_changed_cost_upgrades_the_hash_on_login(self):
+        with override_settings(PBKDF2_ITERATIONS=1000):
+            self.user.set_password('Hashing-passw0rd')
+            self.user.save()
+        self.assertIn('$1000$', User.objects.get(pk=self.user.pk).password)
+
+        with override_settings(PBKDF2_ITERATIONS=1500):
+            response = self.client.post(reverse('token_obtain_pair'),
+                                        {'username': 'hasher', 'password': 'Hashing-passw0rd'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('$1500$', User.objects.get(pk=self.user.pk).password)
+
+
+class RefreshTokenRevocationTests(APITestCase):
+    def setUp(self):
+        revocations.reset()
+        self.user = User.objects.create_user(username='rotating', password='testpass123')
+        self.refresh_url = reverse('token_refresh')
+
+    def refresh(self, token):
+        return self.client.post(self.refresh_url, {'refresh': str(token)})
+
+    def test_rotated_refresh_token_cannot_be_reused(self):
+        token = RefreshToken.for_user(self.user)
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(RevokedToken.objects.filter(jti=token['jti']).exists())
+
+        self.assertEqual(self.refresh(token).status_code, status.HTTP_401_UNAUTHORIZED)
+        # The rotated token is good, once.
+        self.assertEqual(self.refresh(response.data['refresh']).status_code, status.HTTP_200_OK)
+
+    def test_reuse_is_caught_by_the_table_when_the_filter_has_not_seen_it(self):
+        token = RefreshToken.for_user(self.user)
+        revocations.is_revoked('warm-up')
+        # As if another process revoked it after this one last synced.
+        RevokedToken.objects.create(jti=token['jti'], expires_at=timezone.now() + timedelta(days=1))
+        self.assertFalse(revocations.is_revoked(token['jti']))
+        self.assertEqual(self.refresh(token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_unrevoked_tokens_are_checked_without_queries(self):
+        RevokedToken.objects.bulk_create([
+            RevokedToken(jti=f'old-{index}', expires_at=timezone.now() + timedelta(days=1))
+            for index in range(1000)
+        ])
+        revocations.is_revoked('warm-up')
+        with self.assertNumQueries(0):
+            self.assertFalse(revocations.is_revoked(str(RefreshToken.for_user(self.user)['jti'])))
+        # A revoked one is confirmed once, then answered from the cache.
+        with self.assertNumQueries(1):
+            self.assertTrue(revocations.is_revoked('old-7'))
+        with self.assertNumQueries(0):
+            self.assertTrue(revocations.is_revoked('old-7'))
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        keys = [f'jti-{index}' for index in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(f'other-{index}' in bloom for index in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_purge_deletes_only_expired_revocations_in_batches(self):
+        now = timezone.now()
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(jti=f'expired-{index}', expires_at=now - timedelta(minutes=1)) for index in range(25)]
+            + [RevokedToken(jti=f'live-{index}', expires_at=now + timedelta(days=1)) for index in range(5)]
+        )
+        out = StringIO()
+        call_command('purge_revoked_tokens', '--batch-size', '10', stdout=out)
+        self.assertIn('purged 25', out.getvalue())
+        self.assertEqual(set(RevokedToken.objects.values_list('jti', flat=True)),
+                         {f'live-{index}' for index in range(5)})
@@ -4,7 +4,8 @@ from .views import (
     CustomTokenObtainPairView,
     register,
     verify_token,
-    health_check
+    health_check,
+    metrics
 )
 
 urlpatterns = [
@@ -13,4 +14,5 @@ urlpatterns = [
     path('register/', register, name='register'),
     path('verify-token/', verify_token, name='verify_token'),
     path('health-check/', health_check, name='health-check'),
+    path('metrics/', metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -1,42 +1,62 @@
 from django.contrib.auth import get_user_model
 from rest_framework import status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
+from django.conf import settings
 from django.db import IntegrityError
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from backend.instrumentation import render_prometheus
+from .hashers import PasswordHashingBusy
+from .serializers import tokens_for_user
 import logging
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+
+def hashing_busy_response():
+    return Response(
+        {'error': 'Too many sign-in requests, please retry shortly'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': '1'}
+    )
+
 class CustomTokenObtainPairView(TokenObtainPairView):
     permission_classes = (permissions.AllowAny,)
     
     def post(self, request, *args, **kwargs):
         try:
-            response = super().post(request, *args, **kwargs)
-            if response.status_code == 200:
-                user = User.objects.get(username=request.data['username'])
-                response.data = {
-                    'tokens': {
-                        'access': response.data['access'],
-                        'refresh': response.data['refresh']
-                    },
-                    'user': {
-                        'id': user.id,
-                        'username': user.username,
-                        'email': user.email
-                    }
+            serializer = self.get_serializer(data=request.data)
+            try:
+                serializer.is_valid(raise_exception=True)
+            except TokenError as e:
+                raise InvalidToken(e.args[0])
+            # The serializer already authenticated the user; no second lookup.
+            user = serializer.user
+            return Response({
+                'tokens': {
+                    'access': serializer.validated_data['access'],
+                    'refresh': serializer.validated_data['refresh']
+                },
+                'user': {
+                    'id': user.id,
+                    'username': user.username,
+                    'email': user.email
                 }
-            return response
+            }, status=status.HTTP_200_OK)
         except (TokenError, InvalidToken) as e:
             logger.error(f"Token error: {str(e)}")
             return Response(
                 {'error': 'Invalid credentials'},
                 status=status.HTTP_401_UNAUTHORIZED
             )
+        except PasswordHashingBusy:
+            logger.warning("Login rejected: password hashing pool is full")
+            return hashing_busy_response()
         except Exception as e:
             logger.error(f"Login error: {str(e)}")
             return Response(
@@ -58,15 +78,16 @@ def register(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check if username exists
-        if User.objects.filter(username=username).exists():
+        # One query for both checks, before paying for the password hash.
+        taken = list(User.objects\
+            .filter(Q(username=username) | Q(email=email))\
+            .values_list('username', flat=True))
+        if username in taken:
             return Response(
                 {'error': 'Username already exists'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-            
-        # Check if email exists
-        if User.objects.filter(email=email).exists():
+        if taken:
             return Response(
                 {'error': 'Email already exists'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -79,16 +100,16 @@ def register(request):
                 password=password
             )
         except IntegrityError:
+            # A concurrent registration took the username after the check.
             return Response(
-                {'error': 'Failed to create user. Please try again.'},
+                {'error': 'Username already exists'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        except PasswordHashingBusy:
+            logger.warning("Registration rejected: password hashing pool is full")
+            return hashing_busy_response()
             
-        refresh = RefreshToken.for_user(user)
-        tokens = {
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
-        }
+        tokens = tokens_for_user(user)
         
         return Response({
             'tokens': tokens,
@@ -129,3 +150,12 @@ def verify_token(request):
 @permission_classes([permissions.AllowAny])
 def health_check(request):
     return Response({'status': 'ok'}, status=200)
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def metrics(request):
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response({'error': 'Invalid metrics token'}, status=status.HTTP_403_FORBIDDEN)
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
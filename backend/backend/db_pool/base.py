@@ -0,0 +1,94 @@
+"""
+PostgreSQL backend that hands out connections from an in-process pool.
+
+Django opens a connection per thread and, with CONN_MAX_AGE = 0, closes it at
+the end of every request. With this engine "closing" returns the connection
+to a per-process `ConnectionPool` instead, so the next request skips the
+TCP/TLS handshake and authentication. Configure it with the `POOL` entry of
+the database settings (see `backend.settings`):
+
+    'POOL': {'SIZE': 10, 'MAX_OVERFLOW': 10, 'TIMEOUT': 5, 'CHECK_AFTER': 30}
+
+Connections returned inside a transaction are rolled back; broken ones, and
+ones returned in the middle of an atomic block, are closed instead.
+"""
+import os
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from .pool import ConnectionPool, PoolTimeout
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict, conn_params):
+    # Keyed by process so forked workers never share sockets, and by the
+    # connection parameters so a switch to the test database gets its own pool.
+    key = (os.getpid(), alias, tuple(sorted((name, repr(value)) for name, value in conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            options = settings_dict.get('POOL') or {}
+            pool = _pools[key] = ConnectionPool(
+                size=options.get('SIZE', 10),
+                max_overflow=options.get('MAX_OVERFLOW', 10),
+                timeout=options.get('TIMEOUT', 5),
+                check_after=options.get('CHECK_AFTER', 30),
+            )
+        return pool
+
+
+def pool_stats():
+    """Statistics of every pool in this process, keyed by database alias."""
+    with _pools_lock:
+        pools = [(key[1], pool) for key, pool in _pools.items() if key[0] == os.getpid()]
+    return {alias: pool.stats() for alias, pool in pools}
+
+
+def _is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return True
+    except base.Database.Error:
+        return False
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(self.alias, self.settings_dict, conn_params)
+        try:
+            connection = self.pool.acquire(
+                lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                is_usable=_is_usable,
+            )
+        except PoolTimeout as e:
+            raise base.Database.OperationalError(str(e)) from e
+        # Normally set while opening the connection, which reused ones skip.
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        self.isolation_level = (
+            base.IsolationLevel.READ_COMMITTED if isolation_level is None
+            else base.IsolationLevel(isolation_level)
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        connection = self.connection
+        reusable = not self.in_atomic_block and not connection.closed
+        if reusable:
+            status = connection.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                reusable = False
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                except base.Database.Error:
+                    reusable = False
+        self.pool.release(connection, reusable=reusable)
@@ -0,0 +1,125 @@
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the pool's wait timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections.
+
+    Up to `size` idle connections are kept open. When all of them are in use
+    up to `max_overflow` more are opened, and closed again when returned.
+    Past that, `acquire` waits up to `timeout` seconds for a connection to be
+    released and then raises PoolTimeout.
+    """
+
+    def __init__(self, size=10, max_overflow=10, timeout=5.0, check_after=30.0):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.check_after = check_after
+        self._idle = []  # (connection, released_at), most recently used last
+        self._in_use = 0
+        self._condition = threading.Condition()
+        self._stats = {
+            'connections_created': 0,
+            'connections_closed': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'timeouts': 0,
+        }
+
+    @property
+    def capacity(self):
+        return self.size + self.max_overflow
+
+    def acquire(self, connect, is_usable=None):
+        """
+        Return an idle connection, or a new one from `connect()`.
+
+        Connections idle for longer than `check_after` seconds are checked
+        with `is_usable(connection)` first, outside the pool lock; failing
+        ones are closed and another is tried.
+        """
+        while True:
+            connection, released_at = self._checkout()
+            if connection is None:
+                break
+            if (is_usable is None or time.monotonic() - released_at < self.check_after
+                    or is_usable(connection)):
+                return connection
+            self.release(connection, reusable=False)
+
+        try:
+            connection = connect()
+        except BaseException:
+            with self._condition:
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._stats['connections_created'] += 1
+        return connection
+
+    def _checkout(self):
+        """Take an idle connection, or reserve a slot for a new one (None)."""
+        with self._condition:
+            wait_started = None
+            while not self._idle and self._in_use >= self.capacity:
+                if wait_started is None:
+                    wait_started = time.monotonic()
+                    self._stats['waits'] += 1
+                remaining = wait_started + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    self._stats['wait_seconds'] += time.monotonic() - wait_started
+                    raise PoolTimeout(
+                        f'No database connection available within {self.timeout}s '
+                        f'({self.capacity} in use)'
+                    )
+                self._condition.wait(remaining)
+            if wait_started is not None:
+                self._stats['wait_seconds'] += time.monotonic() - wait_started
+
+            self._in_use += 1
+            self._stats['checkouts'] += 1
+            if self._idle:
+                return self._idle.pop()
+            return None, None
+
+    def release(self, connection, reusable=True):
+        """Give a connection back; it is closed if not reusable or over `size`."""
+        with self._condition:
+            self._in_use -= 1
+            if reusable and len(self._idle) < self.size:
+                self._idle.append((connection, time.monotonic()))
+            else:
+                self._discard(connection)
+            self._condition.notify()
+
+    def close_idle(self):
+        with self._condition:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+    def stats(self):
+        with self._condition:
+            return dict(
+                self._stats,
+                size=self.size,
+                max_overflow=self.max_overflow,
+                in_use=self._in_use,
+                idle=len(self._idle),
+                overflow=max(0, self._in_use + len(self._idle) - self.size),
+            )
+
+    def _discard(self, connection):
+        self._stats['connections_closed'] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
@@ -0,0 +1,91 @@
+import threading
+from unittest.mock import Mock, patch
+
+from django.db.backends.postgresql.base import IsolationLevel
+from django.test import SimpleTestCase
+from psycopg2 import extensions
+
+from .base import DatabaseWrapper
+from .pool import ConnectionPool, PoolTimeout
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_reuses_released_connections(self):
+        pool = ConnectionPool(size=2, max_overflow=0)
+        connect = Mock(side_effect=lambda: Mock())
+        first = pool.acquire(connect)
+        pool.release(first)
+        self.assertIs(pool.acquire(connect), first)
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual(pool.stats()['checkouts'], 2)
+
+    def test_overflow_connections_are_closed_on_release(self):
+        pool = ConnectionPool(size=1, max_overflow=1)
+        connections = [pool.acquire(Mock) for _ in range(2)]
+        self.assertEqual(pool.stats()['overflow'], 1)
+        for connection in connections:
+            pool.release(connection)
+        stats = pool.stats()
+        self.assertEqual((stats['idle'], stats['in_use'], stats['connections_closed']), (1, 0, 1))
+        connections[1].close.assert_called_once()
+
+    def test_waits_for_a_release_then_times_out(self):
+        pool = ConnectionPool(size=1, max_overflow=0, timeout=2)
+        held = pool.acquire(Mock)
+        threading.Timer(0.05, pool.release, [held]).start()
+        self.assertIs(pool.acquire(Mock), held)
+
+        pool.timeout = 0.05
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(Mock)
+        stats = pool.stats()
+        self.assertEqual((stats['waits'], stats['timeouts']), (2, 1))
+
+    def test_failed_connect_frees_its_slot(self):
+        pool = ConnectionPool(size=1, max_overflow=0, timeout=0.01)
+        with self.assertRaises(OSError):
+            pool.acquire(Mock(side_effect=OSError))
+        self.assertIsNotNone(pool.acquire(Mock))
+
+    def test_stale_idle_connections_are_checked(self):
+        pool = ConnectionPool(size=2, max_overflow=0, check_after=10)
+        broken = pool.acquire(Mock)
+        pool.release(broken)
+        fresh = Mock()
+        with patch('backend.db_pool.pool.time.monotonic', return_value=10 ** 6):
+            connection = pool.acquire(lambda: fresh, is_usable=lambda connection: False)
+        self.assertIs(connection, fresh)
+        broken.close.assert_called_once()
+
+
+class PooledDatabaseWrapperTests(SimpleTestCase):
+    def make_wrapper(self, transaction_status):
+        wrapper = DatabaseWrapper({
+            'ENGINE': 'backend.db_pool', 'NAME': 'pool_test', 'USER': '', 'PASSWORD': '',
+            'HOST': '', 'PORT': '', 'OPTIONS': {}, 'TIME_ZONE': None,
+            'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'AUTOCOMMIT': True,
+        }, alias='pool_test')
+        wrapper.pool = ConnectionPool(size=1, max_overflow=0)
+        wrapper.connection = wrapper.pool.acquire(lambda: Mock(closed=0))
+        wrapper.connection.get_transaction_status.return_value = transaction_status
+        return wrapper
+
+    def test_close_returns_connection_to_pool(self):
+        wrapper = self.make_wrapper(extensions.TRANSACTION_STATUS_INTRANS)
+        connection = wrapper.connection
+        wrapper.close()
+        connection.rollback.assert_called_once()
+        connection.close.assert_not_called()
+        self.assertEqual(wrapper.pool.stats()['idle'], 1)
+
+        with patch.object(DatabaseWrapper, 'get_connection_params', return_value={}), \
+                patch('backend.db_pool.base.get_pool', return_value=wrapper.pool):
+            self.assertIs(wrapper.get_new_connection({}), connection)
+        self.assertEqual(wrapper.isolation_level, IsolationLevel.READ_COMMITTED)
+
+    def test_broken_connection_is_discarded(self):
+        wrapper = self.make_wrapper(extensions.TRANSACTION_STATUS_UNKNOWN)
+        connection = wrapper.connection
+        wrapper.close()
+        connection.close.assert_called_once()
+        self.assertEqual(wrapper.pool.stats()['idle'], 0)
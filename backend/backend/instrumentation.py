@@ -0,0 +1,296 @@
+"""
+Per-route request instrumentation.
+
+`RequestMetricsMiddleware` records, for every request, the wall time, the
+time spent in database queries, the number of queries, how many of them were
+exact repeats (same SQL and parameters) or repeats with other parameters
+(the N+1 pattern), and the response size. Totals are kept per process, keyed
+by HTTP method and URL name, and rendered in the Prometheus text format by
+`render_prometheus()` (served at /api/auth/metrics/).
+
+With DEBUG on, adding `?profile=1` to any request runs it under cProfile and
+returns the profile instead of the response (`profile_sort=` picks the sort
+column, `cumulative` by default; `profile_limit=` how many rows, 50 by
+default and at most 1000).
+
+Queries are counted through a database execute wrapper installed on every
+connection; it reads the current request from a context variable, so queries
+run by async views in sync_to_async threads are attributed correctly.
+"""
+import contextvars
+import cProfile
+import io
+import logging
+import pstats
+import threading
+import time
+from collections import Counter, defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Repeats of one statement with different parameters above this are logged.
+SIMILAR_QUERY_WARNING = 10
+PROFILE_LIMIT_DEFAULT = 50
+PROFILE_LIMIT_MAX = 1000
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+def _fingerprint(params):
+    # A hash rather than repr(): multi-row INSERTs carry thousands of
+    # parameters, and this runs for every query. None when unhashable.
+    try:
+        if isinstance(params, dict):
+            return hash(tuple(params.items()))
+        return hash(tuple(params)) if params is not None else None
+    except TypeError:
+        return None
+
+
+class RequestStats:
+    def __init__(self):
+        self.db_seconds = 0.0
+        self.queries = Counter()
+
+    def record(self, sql, params, seconds):
+        self.db_seconds += seconds
+        self.queries[(sql, _fingerprint(params))] += 1
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicate_count(self):
+        return sum(count - 1 for count in self.queries.values())
+
+    @property
+    def similar_count(self):
+        statements = Counter()
+        for (sql, _), count in self.queries.items():
+            statements[sql] += count
+        return sum(count - 1 for count in statements.values()) - self.duplicate_count
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record(sql, params, time.perf_counter() - started)
+
+
+def install_execute_wrapper(connection):
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    install_execute_wrapper(connection)
+
+
+connection_created.connect(_on_connection_created, dispatch_uid='instrumentation_execute_wrapper')
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.requests = Counter()  # by status code
+        self.seconds = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.duplicate_queries = 0
+        self.similar_queries = 0
+        self.response_bytes = 0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._routes = defaultdict(RouteMetrics)
+        self._lock = threading.Lock()
+
+    def observe(self, method, route, status, seconds, stats, response_bytes):
+        with self._lock:
+            metrics = self._routes[(method, route)]
+            metrics.requests[status] += 1
+            metrics.seconds += seconds
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    metrics.buckets[index] += 1
+            metrics.db_seconds += stats.db_seconds
+            metrics.queries += stats.query_count
+            metrics.duplicate_queries += stats.duplicate_count
+            metrics.similar_queries += stats.similar_count
+            metrics.response_bytes += response_bytes
+
+    def snapshot(self):
+        with self._lock:
+            return {key: vars(metrics).copy() for key, metrics in self._routes.items()}
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+registry = MetricsRegistry()
+
+
+def _labels(**labels):
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def render_prometheus():
+    """All recorded metrics, plus connection pool gauges, in Prometheus text format."""
+    snapshot = registry.snapshot()
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(f'{name}{labels} {value}' for labels, value in samples)
+
+    def per_route(field):
+        return [(_labels(method=method, route=route), metrics[field])
+                for (method, route), metrics in sorted(snapshot.items())]
+
+    family('http_requests_total', 'counter', 'Requests by route and status code.', [
+        (_labels(method=method, route=route, status=status), count)
+        for (method, route), metrics in sorted(snapshot.items())
+        for status, count in sorted(metrics['requests'].items())
+    ])
+
+    lines.append('# HELP http_request_duration_seconds Wall time per request.')
+    lines.append('# TYPE http_request_duration_seconds histogram')
+    for (method, route), metrics in sorted(snapshot.items()):
+        total = sum(metrics['requests'].values())
+        for bound, count in zip(LATENCY_BUCKETS, metrics['buckets']):
+            lines.append(f'http_request_duration_seconds_bucket{_labels(method=method, route=route, le=bound)} {count}')
+        lines.append(f'http_request_duration_seconds_bucket{_labels(method=method, route=route, le="+Inf")} {total}')
+        lines.append(f'http_request_duration_seconds_sum{_labels(method=method, route=route)} {metrics["seconds"]}')
+        lines.append(f'http_request_duration_seconds_count{_labels(method=method, route=route)} {total}')
+
+    family('http_request_db_seconds_total', 'counter', 'Time spent in database queries.', per_route('db_seconds'))
+    family('http_request_queries_total', 'counter', 'Database queries executed.', per_route('queries'))
+    family('http_request_duplicate_queries_total', 'counter',
+           'Queries repeating an earlier one in the same request with the same parameters.',
+           per_route('duplicate_queries'))
+    family('http_request_similar_queries_total', 'counter',
+           'Queries repeating an earlier statement in the same request with other parameters (N+1).',
+           per_route('similar_queries'))
+    family('http_response_bytes_total', 'counter', 'Response body bytes (streamed bodies excluded).',
+           per_route('response_bytes'))
+
+    try:
+        from backend.db_pool.base import pool_stats
+    except ImportError:  # psycopg2 not installed
+        pools = {}
+    else:
+        pools = pool_stats()
+    for field in ('in_use', 'idle', 'overflow', 'checkouts', 'waits', 'wait_seconds', 'timeouts'):
+        gauge = field in ('in_use', 'idle', 'overflow')
+        family(f'db_pool_{field}' if gauge else f'db_pool_{field}_total', 'gauge' if gauge else 'counter',
+               f'Connection pool {field.replace("_", " ")}.',
+               [(_labels(alias=alias), stats[field]) for alias, stats in sorted(pools.items())])
+
+    return '\n'.join(lines) + '\n'
+
+
+def _response_size(response):
+    if getattr(response, 'streaming', False):
+        return 0
+    return len(response.content)
+
+
+def _profile_response(profiler, request):
+    output = io.StringIO()
+    sort = request.GET.get('profile_sort', 'cumulative')
+    try:
+        stats = pstats.Stats(profiler, stream=output).sort_stats(sort)
+    except KeyError:
+        stats = pstats.Stats(profiler, stream=output).sort_stats('cumulative')
+    try:
+        limit = min(max(int(request.GET.get('profile_limit', PROFILE_LIMIT_DEFAULT)), 1), PROFILE_LIMIT_MAX)
+    except ValueError:
+        limit = PROFILE_LIMIT_DEFAULT
+    stats.print_stats(limit)
+    return HttpResponse(output.getvalue(), content_type='text/plain; charset=utf-8')
+
+
+class RequestMetricsMiddleware:
+    """Records per-route timings and query counts; see the module docstring."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        for connection in connections.all():
+            install_execute_wrapper(connection)
+
+    def _wants_profile(self, request):
+        return settings.DEBUG and request.GET.get('profile') == '1'
+
+    def _start(self):
+        stats = RequestStats()
+        return stats, _current.set(stats), time.perf_counter()
+
+    def _finish(self, request, response, stats, started):
+        seconds = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        route = (match.view_name or match.route) if match else 'unmatched'
+        registry.observe(request.method, route, response.status_code, seconds, stats, _response_size(response))
+        if stats.similar_count >= SIMILAR_QUERY_WARNING:
+            logger.warning(
+                f"{request.method} {route} ran {stats.query_count} queries, "
+                f"{stats.similar_count} of them repeated statements with other parameters"
+            )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, started = self._start()
+        try:
+            if self._wants_profile(request):
+                profiler = cProfile.Profile()
+                profiler.runcall(self.get_response, request)
+                response = _profile_response(profiler, request)
+            else:
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, stats, started)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, started = self._start()
+        try:
+            if self._wants_profile(request):
+                # Only covers the event loop thread, not sync_to_async threads.
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    await self.get_response(request)
+                finally:
+                    profiler.disable()
+                response = _profile_response(profiler, request)
+            else:
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, stats, started)
+        return response
@@ -23,9 +23,12 @@ INSTALLED_APPS = [
     'corsheaders',
     'expenses',
     'authentication',
+    'jobs',
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware.
+    'backend.instrumentation.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -56,27 +59,85 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
-# Use SQLite for testing
+# Use SQLite for testing (set USE_SQLITE=1 to run benchmarks against it too;
+# SQLITE_NAME points it at a file shared by several processes)
 import sys
-if 'test' in sys.argv:
+if 'test' in sys.argv or os.getenv('USE_SQLITE') == '1':
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': ':memory:',
+            'NAME': os.getenv('SQLITE_NAME', ':memory:'),
         }
     }
 else:
+    # Connection management: POSTGRES_CONN_MAX_AGE keeps a connection per
+    # thread open between requests (0 closes it after each one, the safe
+    # choice under ASGI). POSTGRES_POOL=1 instead returns connections to an
+    # in-process pool (backend.db_pool) when Django closes them.
+    POSTGRES_POOL = os.getenv('POSTGRES_POOL') == '1'
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql',
+            'ENGINE': 'backend.db_pool' if POSTGRES_POOL else 'django.db.backends.postgresql',
             'NAME': os.getenv('POSTGRES_DB', 'expense_tracker'),
             'USER': os.getenv('POSTGRES_USER', 'postgres'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'postgres'),
             'HOST': os.getenv('POSTGRES_HOST', 'db'),
             'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            # The pool already keeps connections open; a per-thread persistent
+            # connection on top of it would just hold pool slots.
+            'CONN_MAX_AGE': 0 if POSTGRES_POOL else int(os.getenv('POSTGRES_CONN_MAX_AGE', '0')),
+            'CONN_HEALTH_CHECKS': os.getenv('POSTGRES_CONN_HEALTH_CHECKS', '1') == '1',
+            'POOL': {
+                'SIZE': int(os.getenv('POSTGRES_POOL_SIZE', '10')),
+                'MAX_OVERFLOW': int(os.getenv('POSTGRES_POOL_MAX_OVERFLOW', '10')),
+                'TIMEOUT': float(os.getenv('POSTGRES_POOL_TIMEOUT', '5')),
+                'CHECK_AFTER': float(os.getenv('POSTGRES_POOL_CHECK_AFTER', '30')),
+            },
         }
     }
 
+# Caching: Redis when REDIS_URL is set (requires the `redis` package), otherwise
+# a per-process local-memory cache, which is also what the tests use.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Cache alias used for expense summaries (their data generations are kept in
+# the database; see expenses.cache).
+EXPENSES_CACHE_ALIAS = 'default'
+
+# Currencies (expenses.fx): expenses default to EXPENSES_BASE_CURRENCY, the
+# currency FxRate rows value the others in. Each process caches the rate table
+# and checks its version in the database every EXPENSES_FX_SYNC_INTERVAL
+# seconds, reloading it after a change.
+EXPENSES_BASE_CURRENCY = os.getenv('EXPENSES_BASE_CURRENCY', 'USD').upper()
+EXPENSES_FX_SYNC_INTERVAL = int(os.getenv('EXPENSES_FX_SYNC_INTERVAL', '5'))
+
+# Background jobs (see jobs.runner), run by `manage.py run_jobs`. Failed
+# attempts are retried after JOB_RETRY_BACKOFF seconds, doubling up to
+# JOB_RETRY_BACKOFF_MAX; running jobs without a heartbeat for JOB_STALE_AFTER
+# seconds are given to another worker. Uploads and exports live in
+# JOB_FILES_DIR/<job id>/.
+JOB_FILES_DIR = os.getenv('JOB_FILES_DIR', str(BASE_DIR / 'job-files'))
+JOB_WORKER_CONCURRENCY = int(os.getenv('JOB_WORKER_CONCURRENCY', '2'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+JOB_RETRY_BACKOFF = int(os.getenv('JOB_RETRY_BACKOFF', '5'))
+JOB_RETRY_BACKOFF_MAX = int(os.getenv('JOB_RETRY_BACKOFF_MAX', '300'))
+JOB_STALE_AFTER = int(os.getenv('JOB_STALE_AFTER', '300'))
+
+# Covering-index INCLUDE columns only apply on PostgreSQL; SQLite (tests) ignores them.
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -92,6 +153,40 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing (see authentication.hashers). PASSWORD_HASHER picks the
+# algorithm new passwords use: argon2 (needs argon2-cffi), bcrypt (needs
+# bcrypt) or pbkdf2; it falls back to pbkdf2 when the library is missing. The
+# other hashers stay listed so existing hashes verify and upgrade on login.
+import importlib.util
+PASSWORD_HASHER_CLASSES = {
+    'argon2': ('authentication.hashers.Argon2PasswordHasher', 'argon2'),
+    'bcrypt': ('authentication.hashers.BCryptSHA256PasswordHasher', 'bcrypt'),
+    'pbkdf2': ('authentication.hashers.PBKDF2PasswordHasher', None),
+}
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2').lower()
+if PASSWORD_HASHER not in PASSWORD_HASHER_CLASSES:
+    raise ValueError(f"PASSWORD_HASHER must be one of {', '.join(PASSWORD_HASHER_CLASSES)}")
+if PASSWORD_HASHER_CLASSES[PASSWORD_HASHER][1] and not importlib.util.find_spec(PASSWORD_HASHER_CLASSES[PASSWORD_HASHER][1]):
+    import warnings
+    warnings.warn(f'PASSWORD_HASHER={PASSWORD_HASHER} but its library is not installed; using pbkdf2')
+    PASSWORD_HASHER = 'pbkdf2'
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER][0]] + [
+    path for name, (path, _) in PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER
+] + [
+    # The rest of Django's defaults, so any hash it could have stored verifies.
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', '2'))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', '65536'))  # KiB
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', '1'))
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+PBKDF2_ITERATIONS = int(os.getenv('PBKDF2_ITERATIONS', '600000'))
+# Threads hashing at once per process, and calls allowed to wait for one
+# before the auth views answer 503.
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 2)))
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', str(4 * PASSWORD_HASH_WORKERS)))
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
@@ -148,7 +243,7 @@ LOGGING = {
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.jwt.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -170,4 +265,22 @@ SIMPLE_JWT = {
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    'TOKEN_OBTAIN_SERIALIZER': 'authentication.serializers.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'authentication.serializers.RevocationTokenRefreshSerializer',
 }
+
+# Refresh-token revocation (authentication.revocation): a per-process bloom
+# filter synced from the RevokedToken table, confirmed through this cache.
+TOKEN_REVOCATION_CACHE_ALIAS = 'default'
+TOKEN_REVOCATION_BLOOM_CAPACITY = int(os.getenv('TOKEN_REVOCATION_BLOOM_CAPACITY', '1000000'))
+TOKEN_REVOCATION_BLOOM_ERROR_RATE = 0.001
+TOKEN_REVOCATION_SYNC_INTERVAL = int(os.getenv('TOKEN_REVOCATION_SYNC_INTERVAL', '5'))
+TOKEN_REVOCATION_REBUILD_INTERVAL = int(os.getenv('TOKEN_REVOCATION_REBUILD_INTERVAL', '3600'))
+
+# Per-process cache of the user state CachedJWTAuthentication checks tokens
+# against; the TTL bounds how long other processes may miss a deactivation.
+JWT_USER_CACHE_TTL = int(os.getenv('JWT_USER_CACHE_TTL', '60'))
+JWT_USER_CACHE_SIZE = 10000
+
+# When set, /api/auth/metrics/ requires "Authorization: Bearer <METRICS_TOKEN>".
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
@@ -0,0 +1,99 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from expenses.models import Expense
+from .instrumentation import RequestStats, registry
+
+User = get_user_model()
+
+
+class RequestStatsTests(TestCase):
+    def test_duplicate_and_similar_queries(self):
+        stats = RequestStats()
+        stats.record('SELECT * FROM t WHERE id = %s', (1,), 0.001)
+        stats.record('SELECT * FROM t WHERE id = %s', (1,), 0.001)
+        stats.record('SELECT * FROM t WHERE id = %s', (2,), 0.001)
+        stats.record('SELECT 1', None, 0.001)
+        self.assertEqual(stats.query_count, 4)
+        self.assertEqual(stats.duplicate_count, 1)
+        self.assertEqual(stats.similar_count, 1)
+        self.assertAlmostEqual(stats.db_seconds, 0.004)
+
+    def test_parameters_are_fingerprinted(self):
+        stats = RequestStats()
+        insert = 'INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)'
+        stats.record(insert, [1, 'x', 2, 'y'], 0.001)
+        stats.record(insert, [1, 'x', 2, 'z'], 0.001)
+        stats.record('SELECT * FROM t WHERE id = %(id)s', {'id': 1}, 0.001)
+        stats.record('SELECT * FROM t WHERE id = ANY(%s)', [[1, 2]], 0.001)
+        self.assertEqual(stats.query_count, 4)
+        self.assertEqual(stats.duplicate_count, 0)
+        self.assertEqual(stats.similar_count, 1)
+
+
+class RequestMetricsMiddlewareTests(APITestCase):
+    def setUp(self):
+        registry.reset()
+        self.user = User.objects.create_user(username='metrics', password='testpass123')
+        Expense.objects.create(description="Lunch", amount=Decimal("12.00"),
+                               category="Food", date=date(2024, 5, 1))
+
+    def metric(self, text, name, **labels):
+        prefix = name + '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+        for line in text.splitlines():
+            if line.startswith(prefix + ' '):
+                return float(line.split()[-1])
+        self.fail(f'{prefix} not found')
+
+    def test_records_requests_queries_and_size_per_route(self):
+        self.client.force_authenticate(user=self.user)
+        sizes = [len(self.client.get(reverse('expense-list')).content) for _ in range(2)]
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+
+        route = {'method': 'GET', 'route': 'expense-list'}
+        self.assertEqual(self.metric(text, 'http_requests_total', **route, status=200), 2)
+        self.assertEqual(self.metric(text, 'http_request_duration_seconds_count', **route), 2)
+        self.assertEqual(self.metric(text, 'http_request_duration_seconds_bucket', **route, le='+Inf'), 2)
+        self.assertGreaterEqual(self.metric(text, 'http_request_queries_total', **route), 2)
+        self.assertEqual(self.metric(text, 'http_response_bytes_total', **route), sum(sizes))
+
+    def test_counts_queries_run_by_async_views(self):
+        token = AccessToken.for_user(self.user)
+        self.client.get(reverse('async-expense-list'), HTTP_AUTHORIZATION=f'Bearer {token}')
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertGreaterEqual(
+            self.metric(text, 'http_request_queries_total', method='GET', route='async-expense-list'), 1
+        )
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_profile_only_in_debug(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('expense-list'), {'profile': '1'})
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+        with override_settings(DEBUG=True):
+            response = self.client.get(reverse('expense-list'), {'profile': '1'})
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('function calls', response.content.decode())
+
+        with override_settings(DEBUG=True):
+            response = self.client.get(reverse('expense-list'), {'profile': '1', 'profile_limit': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('function calls', response.content.decode())
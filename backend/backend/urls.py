@@ -17,13 +17,17 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from expenses.views import ExpenseViewSet
+from expenses.views import ExpenseViewSet, RecurringExpenseViewSet
+from jobs.views import JobViewSet
 
 router = DefaultRouter()
 router.register(r'expenses', ExpenseViewSet)
+router.register(r'recurring-expenses', RecurringExpenseViewSet, basename='recurring-expense')
+router.register(r'jobs', JobViewSet, basename='job')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('authentication.urls')),
+    path('api/async/', include('expenses.async_urls')),
     path('api/', include(router.urls)),
 ]
@@ -0,0 +1,125 @@
+"""
+Login and register throughput and latency under concurrent load, per hasher.
+
+    USE_SQLITE=1 SQLITE_NAME=/tmp/loadtest.sqlite3 python -m benchmarks.auth
+    python -m benchmarks.auth --hashers pbkdf2,argon2,bcrypt --concurrency 64
+
+Like benchmarks.loadtest this uses the configured database, which the server
+processes share (point it at a scratch database). For each hasher in
+--hashers a gunicorn WSGI server is started with PASSWORD_HASHER set to it
+(hashers whose library is not installed are skipped), and --concurrency
+clients post to /api/auth/token/ and then /api/auth/register/ for
+--duration seconds each. Reported per hasher and endpoint: successful
+requests per second, p50 and p99 latency, 503 answers from a full hashing
+pool (PASSWORD_HASH_WORKERS / PASSWORD_HASH_QUEUE, passed through from the
+environment) and other errors.
+"""
+import argparse
+import http.client
+import importlib.util
+import itertools
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import setup_django
+from benchmarks.loadtest import start_server
+
+PASSWORD = 'Benchmark-passw0rd'
+LIBRARIES = {'argon2': 'argon2', 'bcrypt': 'bcrypt', 'pbkdf2': None}
+
+
+def client(port, path, make_body, deadline, results):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    headers = {'Content-Type': 'application/json'}
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            connection.request('POST', path, body=json.dumps(make_body()), headers=headers)
+            response = connection.getresponse()
+            response.read()
+            outcome = response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            outcome = None
+        elapsed = (time.perf_counter() - started) * 1000
+        with results['lock']:
+            if outcome in (200, 201):
+                results['latencies'].append(elapsed)
+            elif outcome == 503:
+                results['busy'] += 1
+            else:
+                results['errors'] += 1
+    connection.close()
+
+
+def run_load(port, path, make_body, concurrency, duration):
+    results = {'latencies': [], 'busy': 0, 'errors': 0, 'lock': threading.Lock()}
+    deadline = time.monotonic() + duration
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client, port, path, make_body, deadline, results)
+    latencies = sorted(results['latencies'])
+    percentile = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] if latencies else 0.0
+    return {
+        'rps': len(latencies) / duration,
+        'p50': percentile(0.5),
+        'p99': percentile(0.99),
+        'busy': results['busy'],
+        'errors': results['errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hashers', default='pbkdf2,argon2,bcrypt')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=16, help='Threads per WSGI worker')
+    parser.add_argument('--port', type=int, default=8111)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+    user, _ = get_user_model().objects.get_or_create(username='auth-benchmark')
+    # Stored with the first hasher; each server re-hashes it on its first login.
+    user.set_password(PASSWORD)
+    user.save()
+
+    login = lambda: {'username': 'auth-benchmark', 'password': PASSWORD}
+    run_id, counter = uuid.uuid4().hex[:8], itertools.count()
+
+    def register():
+        name = f'auth-{run_id}-{next(counter)}'
+        return {'username': name, 'email': f'{name}@example.com', 'password': PASSWORD}
+
+    print(f'{args.concurrency} concurrent clients, {args.duration:.0f}s per endpoint, '
+          f'{args.workers} workers with {args.threads} threads')
+    print(f"{'hasher':<8} {'endpoint':<9} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'503s':>6} {'errors':>7}")
+    for index, hasher in enumerate(name.strip() for name in args.hashers.split(',')):
+        library = LIBRARIES.get(hasher, hasher)
+        if library and not importlib.util.find_spec(library):
+            print(f'{hasher:<8} skipped: {library} is not installed')
+            continue
+        port = args.port + index
+        process, _ = start_server('wsgi', port, args.workers, args.threads, env={'PASSWORD_HASHER': hasher})
+        try:
+            for endpoint, path, make_body in (('login', '/api/auth/token/', login),
+                                              ('register', '/api/auth/register/', register)):
+                result = run_load(port, path, make_body, args.concurrency, args.duration)
+                print(f"{hasher:<8} {endpoint:<9} {result['rps']:>8.1f} {result['p50']:>9.1f} "
+                      f"{result['p99']:>9.1f} {result['busy']:>6} {result['errors']:>7}", flush=True)
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
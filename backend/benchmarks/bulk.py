@@ -0,0 +1,77 @@
+"""
+Throughput of the bulk expense endpoints.
+
+    python -m benchmarks.bulk --sizes 1000,10000,100000
+
+For each batch size the script POSTs, PATCHes and DELETEs one batch through
+`/api/expenses/bulk/` and reports rows per second. As a reference point it
+also creates a smaller batch one `POST /api/expenses/` request at a time.
+"""
+import argparse
+import time
+
+from benchmarks.common import api_client, benchmark_database, setup_django
+
+
+def rows_per_second(count, func):
+    started = time.perf_counter()
+    response = func()
+    elapsed = time.perf_counter() - started
+    assert response.status_code < 300, response.content[:500]
+    return response, count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--single-requests', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from expenses.models import Expense
+
+    categories = [choice for choice, _ in Expense.CATEGORY_CHOICES]
+
+    def payload(count):
+        return [
+            {
+                'description': f'Statement line {i}',
+                'amount': f'{i % 900 + 1}.25',
+                'category': categories[i % len(categories)],
+                'date': f'2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}',
+            }
+            for i in range(count)
+        ]
+
+    with benchmark_database():
+        client = api_client()
+        url = '/api/expenses/bulk/'
+
+        print(f"{'operation':<28} {'rows':>8} {'rows/sec':>12}")
+        rows = payload(args.single_requests)
+        started = time.perf_counter()
+        for row in rows:
+            client.post('/api/expenses/', row, format='json')
+        rate = len(rows) / (time.perf_counter() - started)
+        print(f"{'single POST (reference)':<28} {len(rows):>8} {rate:>12.0f}")
+        Expense.objects.all().delete()
+
+        for size in [int(size) for size in args.sizes.split(',')]:
+            response, rate = rows_per_second(
+                size, lambda: client.post(url, payload(size), format='json')
+            )
+            print(f"{'bulk POST':<28} {size:>8} {rate:>12.0f}")
+
+            ids = [row['id'] for row in response.data]
+            updates = [{'id': pk, 'amount': '3.50'} for pk in ids]
+            _, rate = rows_per_second(size, lambda: client.patch(url, updates, format='json'))
+            print(f"{'bulk PATCH':<28} {size:>8} {rate:>12.0f}")
+
+            _, rate = rows_per_second(
+                size, lambda: client.delete(url, {'ids': ids}, format='json')
+            )
+            print(f"{'bulk DELETE':<28} {size:>8} {rate:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Shared helpers for the standalone benchmark scripts.
+
+Benchmarks are run from the backend directory as modules, for example::
+
+    python -m benchmarks.pagination --rows 100000
+
+They create a throwaway test database from the configured `DATABASES`
+setting (PostgreSQL by default, in-memory SQLite with USE_SQLITE=1) and
+destroy it again when they finish.
+"""
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def benchmark_database(verbosity=0):
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    # An in-memory SQLite test database can outlive destroy_test_db() while
+    # another connection holds it, so start each run from empty tables.
+    call_command('flush', interactive=False, verbosity=0)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def make_expenses(count, seed=0, end=None, days=365, username='benchmark'):
+    """
+    Append `count` synthetic expenses (see expenses.synthetic), the same data
+    `manage.py seed_expenses` writes, so every benchmark shares one dataset.
+    They belong to `username`, the user `api_client()` authenticates as.
+    """
+    from django.contrib.auth import get_user_model
+    from expenses.synthetic import seed_expenses
+
+    user, _ = get_user_model().objects.get_or_create(username=username)
+    seed_expenses(1, count, seed=seed, end=end, days=days, clear=False, owner_ids=[user.id])
+
+
+def api_client(username='benchmark'):
+    from django.contrib.auth import get_user_model
+    from rest_framework.test import APIClient
+
+    user, _ = get_user_model().objects.get_or_create(username=username)
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+def measure(func, repeat=5, warmup=1):
+    """Run `func` repeatedly and return timing statistics in milliseconds."""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'min': timings[0],
+        'median': statistics.median(timings),
+        'max': timings[-1],
+    }
+
+
+def print_table(title, rows):
+    print(f'\n{title}')
+    print(f"{'case':<40} {'min ms':>10} {'median ms':>10} {'max ms':>10}")
+    for name, stats in rows:
+        print(f"{name:<40} {stats['min']:>10.2f} {stats['median']:>10.2f} {stats['max']:>10.2f}")
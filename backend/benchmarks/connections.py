@@ -0,0 +1,61 @@
+"""
+Requests/sec with and without persistent connections and the connection pool.
+
+    POSTGRES_DB=expense_loadtest POSTGRES_HOST=localhost python -m benchmarks.connections
+
+Like `benchmarks.loadtest` this needs a scratch PostgreSQL database the
+server processes can share (connection setup is what is being measured, so
+SQLite is not meaningful). A threaded WSGI server is started once per
+configuration and the same DB-bound endpoints are loaded against each.
+"""
+import argparse
+
+from benchmarks.common import setup_django
+from benchmarks.loadtest import prepare_database, run_load, start_server
+
+CONFIGURATIONS = [
+    ('new connection per request', {'POSTGRES_POOL': '0', 'POSTGRES_CONN_MAX_AGE': '0'}),
+    ('persistent (CONN_MAX_AGE=60)', {'POSTGRES_POOL': '0', 'POSTGRES_CONN_MAX_AGE': '60'}),
+    ('pool (backend.db_pool)', {'POSTGRES_POOL': '1'}),
+]
+
+ENDPOINTS = [
+    ('detail', '/api/expenses/{pk}/'),
+    ('list page', '/api/expenses/?page_size=20'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--port', type=int, default=8111)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    if connection.vendor != 'postgresql':
+        raise SystemExit('This benchmark needs PostgreSQL; unset USE_SQLITE and set POSTGRES_*.')
+    token, expense_id = prepare_database(args.rows)
+    connection.close()
+
+    print(f'\n{args.concurrency} concurrent clients, {args.duration:.0f}s per endpoint, '
+          f'{args.workers} WSGI workers x {args.threads} threads')
+    print(f"{'configuration':<30} {'endpoint':<10} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, env in CONFIGURATIONS:
+        process, url = start_server('wsgi', args.port, args.workers, args.threads, env=env)
+        try:
+            for endpoint, path in ENDPOINTS:
+                result = run_load(url, path.format(pk=expense_id), token, args.concurrency, args.duration)
+                print(f"{name:<30} {endpoint:<10} {result['rps']:>9.1f} {result['p50']:>9.2f} "
+                      f"{result['p99']:>9.2f} {result['errors']:>7}")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Load test: synchronous DRF views under WSGI vs the async views under ASGI.
+
+    USE_SQLITE=1 SQLITE_NAME=/tmp/loadtest.sqlite3 python -m benchmarks.loadtest
+    POSTGRES_DB=expense_loadtest POSTGRES_HOST=localhost python -m benchmarks.loadtest
+
+Unlike the other benchmarks this needs a database the server processes can
+share, so it uses the configured one (point it at a scratch database, never
+at real data): it is migrated, topped up to --rows expenses and gets a
+`loadtest` user. Both servers are then started with gunicorn on the same
+number of workers, one with threads serving `backend.wsgi` and the sync
+endpoints, one with uvicorn workers serving `backend.asgi` and the
+/api/async/ endpoints. Each endpoint is hit by --concurrency keep-alive
+clients for --duration seconds; throughput and latency percentiles are
+reported per server and endpoint.
+
+Pass --wsgi-url / --asgi-url to load servers that are already running.
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from benchmarks.common import make_expenses, setup_django
+
+ENDPOINTS = [
+    ('list page', '/api/expenses/?page_size=50', '/api/async/expenses/?page_size=50'),
+    ('list filtered', '/api/expenses/?category=Food&fields=id,amount,date',
+     '/api/async/expenses/?category=Food&fields=id,amount,date'),
+    ('detail', '/api/expenses/{pk}/', '/api/async/expenses/{pk}/'),
+    ('summary', '/api/expenses/summary/', '/api/async/expenses/summary/'),
+    ('health', '/api/auth/health-check/', '/api/async/health-check/'),
+]
+
+
+def prepare_database(rows):
+    """Migrate, top up the expenses and return (access token, an expense id)."""
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from rest_framework_simplejwt.tokens import AccessToken
+    from expenses.models import Expense
+
+    call_command('migrate', verbosity=0)
+    user, _ = get_user_model().objects.get_or_create(username='loadtest')
+    expenses = Expense.objects.filter(owner=user)
+    missing = rows - expenses.count()
+    if missing > 0:
+        make_expenses(missing, username='loadtest')
+    return str(AccessToken.for_user(user)), expenses.values_list('pk', flat=True).first()
+
+
+def start_server(kind, port, workers, threads, env=None):
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+               '--workers', str(workers), '--log-level', 'warning']
+    if kind == 'wsgi':
+        command += ['--threads', str(threads), 'backend.wsgi:application']
+    else:
+        command += ['-k', 'uvicorn.workers.UvicornWorker', 'backend.asgi:application']
+    process = subprocess.Popen(command, env=dict(os.environ, **(env or {})))
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'{kind} server exited with status {process.returncode}')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/api/auth/health-check/')
+            connection.getresponse().read()
+            return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit(f'{kind} server did not start on port {port}')
+
+
+def client(base_url, path, headers, deadline, latencies, errors):
+    parts = urlsplit(base_url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+            ok = False
+        elapsed = (time.perf_counter() - started) * 1000
+        with errors['lock']:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors['count'] += 1
+    connection.close()
+
+
+def run_load(base_url, path, token, concurrency, duration):
+    latencies, errors = [], {'count': 0, 'lock': threading.Lock()}
+    headers = {'Authorization': f'Bearer {token}'}
+    deadline = time.monotonic() + duration
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client, base_url, path, headers, deadline, latencies, errors)
+    latencies.sort()
+    percentile = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] if latencies else 0.0
+    return {
+        'requests': len(latencies),
+        'errors': errors['count'],
+        'rps': len(latencies) / duration,
+        'p50': statistics.median(latencies) if latencies else 0.0,
+        'p99': percentile(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='Threads per WSGI worker')
+    parser.add_argument('--port', type=int, default=8101, help='WSGI port; ASGI uses the next one')
+    parser.add_argument('--wsgi-url')
+    parser.add_argument('--asgi-url')
+    args = parser.parse_args()
+
+    setup_django()
+    token, expense_id = prepare_database(args.rows)
+
+    processes, targets = [], {}
+    try:
+        for index, kind in enumerate(('wsgi', 'asgi')):
+            url = getattr(args, f'{kind}_url')
+            if url is None:
+                process, url = start_server(kind, args.port + index, args.workers, args.threads)
+                processes.append(process)
+            targets[kind] = url.rstrip('/')
+
+        print(f'\n{args.concurrency} concurrent clients, {args.duration:.0f}s per endpoint, '
+              f'{args.workers} workers ({args.threads} threads each for WSGI)')
+        print(f"{'endpoint':<16} {'server':<6} {'requests':>9} {'errors':>7} "
+              f"{'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+        for name, sync_path, async_path in ENDPOINTS:
+            for kind, path in (('wsgi', sync_path), ('asgi', async_path)):
+                result = run_load(targets[kind], path.format(pk=expense_id), token,
+                                  args.concurrency, args.duration)
+                print(f"{name:<16} {kind:<6} {result['requests']:>9} {result['errors']:>7} "
+                      f"{result['rps']:>9.1f} {result['p50']:>9.2f} {result['p99']:>9.2f}")
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+One user's request cost as other users' expenses pile up in the table.
+
+    python -m benchmarks.ownership --rows 20000 --others 0,10,50
+
+The benchmark user owns --rows expenses throughout. Before each step other
+users' expenses are added until they number --rows times the step's
+multiplier, then the first list page, a filtered page, the summary and a
+search are timed for the benchmark user. With owner-leading indexes the
+list and summary timings should stay flat down each column; search matches
+through the shared full-text index first, so it still grows with the
+matching rows of every user.
+"""
+import argparse
+
+from benchmarks.common import (
+    api_client, benchmark_database, make_expenses, measure, print_table, setup_django,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000, help="The benchmark user's expenses")
+    parser.add_argument('--others', default='0,10,50',
+                        help="Other users' expenses per step, as multiples of --rows")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.cache import cache
+    from expenses.models import Expense
+
+    with benchmark_database() as connection:
+        make_expenses(args.rows)
+        client = api_client()
+        for step, multiple in enumerate(int(value) for value in args.others.split(',')):
+            others = Expense.objects.exclude(owner__username='benchmark').count()
+            if args.rows * multiple > others:
+                make_expenses(args.rows * multiple - others, seed=step + 1, username=f'other-{step}')
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE expenses_expense')
+
+            def summary():
+                cache.clear()
+                client.get('/api/expenses/summary/', {'timeframe': 'monthly'})
+
+            print_table(f'{args.rows} own expenses, {Expense.objects.count()} in the table', [
+                ('list page', measure(lambda: client.get('/api/expenses/', {'page_size': 50}),
+                                      repeat=args.repeat)),
+                ('list page, category filter', measure(lambda: client.get(
+                    '/api/expenses/', {'page_size': 50, 'category': 'Travel'}), repeat=args.repeat)),
+                ('summary (uncached)', measure(summary, repeat=args.repeat)),
+                ('search', measure(lambda: client.get('/api/expenses/search/', {'search': 'coffee'}),
+                                   repeat=args.repeat)),
+            ])
+
+
+if __name__ == '__main__':
+    main()
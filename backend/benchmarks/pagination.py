@@ -0,0 +1,64 @@
+"""
+Compare the unpaginated expense list with offset and keyset pagination.
+
+    python -m benchmarks.pagination --rows 100000 --page-size 50
+
+Offset pages are fetched with DRF's LimitOffsetPagination at increasing
+depths; keyset pages follow the `next` cursor to the same depths. Keyset
+page cost should stay flat while offset cost grows with the depth.
+"""
+import argparse
+
+from benchmarks.common import (
+    api_client, benchmark_database, make_expenses, measure, print_table, setup_django,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.pagination import LimitOffsetPagination
+    from expenses.models import Expense
+    from expenses.pagination import ExpenseKeysetPagination
+    from expenses.views import ExpenseViewSet
+
+    with benchmark_database():
+        make_expenses(args.rows)
+        client = api_client()
+        url = '/api/expenses/'
+        depths = [0, args.rows // 10, args.rows // 2, args.rows - args.page_size]
+
+        results = [
+            ('unpaginated list', measure(lambda: client.get(url), repeat=args.repeat)),
+        ]
+
+        ExpenseViewSet.pagination_class = LimitOffsetPagination
+        for depth in depths:
+            params = {'limit': args.page_size, 'offset': depth}
+            results.append((
+                f'offset page at row {depth}',
+                measure(lambda: client.get(url, params), repeat=args.repeat),
+            ))
+
+        ExpenseViewSet.pagination_class = ExpenseKeysetPagination
+        paginator = ExpenseKeysetPagination()
+        for depth in depths:
+            params = {'page_size': args.page_size}
+            if depth:
+                last = Expense.objects.order_by(*paginator.ordering)[depth - 1]
+                params['cursor'] = paginator.encode_cursor(last.date, last.id)
+            results.append((
+                f'keyset page at row {depth}',
+                measure(lambda: client.get(url, params), repeat=args.repeat),
+            ))
+
+        print_table(f'{args.rows} expenses, page size {args.page_size}', results)
+
+
+if __name__ == '__main__':
+    main()
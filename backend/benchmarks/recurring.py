@@ -0,0 +1,65 @@
+"""
+Catching up a backlog of recurring expenses.
+
+    python -m benchmarks.recurring --schedules 100000 --users 1000 --months 12
+
+Creates --schedules recurring expenses spread over --users users, monthly
+and weekly, all starting --months months ago and none materialized yet.
+It then times one `materialize()` run that writes the whole backlog, and a
+second run, which has nothing left to write.
+"""
+import argparse
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks.common import benchmark_database, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--schedules', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--months', type=int, default=12, help='How far back the schedules start')
+    parser.add_argument('--weekly', type=float, default=0.2, help='Share of weekly schedules')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.db.models import F
+    from django.utils import timezone
+    from expenses.models import Expense, RecurringExpense
+    from expenses.recurring import add_months, materialize
+
+    with benchmark_database():
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(username=f'recurring-{n}') for n in range(args.users)
+        )
+        today = timezone.localdate()
+        start = add_months(today, -args.months)
+        rng = random.Random(0)
+        RecurringExpense.objects.bulk_create((
+            RecurringExpense(
+                owner_id=users[n % len(users)].id, description=f'Subscription {n}',
+                amount=Decimal(rng.randint(100, 50000)) / 100,
+                category=rng.choice(['Housing', 'Utilities', 'Entertainment']),
+                frequency=RecurringExpense.WEEKLY if rng.random() < args.weekly else RecurringExpense.MONTHLY,
+                start_date=start + timedelta(days=rng.randrange(28)), next_date=start,
+            ) for n in range(args.schedules)
+        ), batch_size=5000)
+        # Each cursor starts at its own start date.
+        RecurringExpense.objects.update(next_date=F('start_date'))
+
+        for run in ('backlog', 'nothing due'):
+            started = time.perf_counter()
+            schedules, expenses = materialize(today, batch_size=args.batch_size)
+            elapsed = time.perf_counter() - started
+            print(f'{run:<12} {schedules:>8} schedules {expenses:>9} expenses {elapsed:>8.2f}s '
+                  f'({expenses / max(elapsed, 1e-9):.0f} expenses/sec)')
+        print(f'{Expense.objects.count()} expenses in the table')
+
+
+if __name__ == '__main__':
+    main()
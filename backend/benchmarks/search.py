@@ -0,0 +1,94 @@
+"""
+Compare `icontains` description filtering with the full-text search.
+
+    python -m benchmarks.search --rows 1000000
+    USE_SQLITE=1 python -m benchmarks.search --rows 1000000
+
+Descriptions are built from a fixed vocabulary so that common, rare and
+missing words can be searched for. For each word the benchmark times the
+first page (50 rows, newest first) and the match count with `icontains`,
+the same with the `search` filter, and the ranked top 50 served by
+/api/expenses/search/. On PostgreSQL both `icontains` and search can use an
+index (trigram and tsvector GIN respectively); on SQLite `icontains` always
+scans the table while search goes through FTS5.
+"""
+import argparse
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from benchmarks.common import benchmark_database, measure, print_table, setup_django
+
+WORDS = [
+    'coffee', 'lunch', 'dinner', 'groceries', 'taxi', 'train', 'fuel', 'parking', 'rent',
+    'electricity', 'water', 'internet', 'phone', 'cinema', 'concert', 'books', 'gym',
+    'pharmacy', 'doctor', 'haircut', 'shoes', 'jacket', 'flight', 'hotel', 'museum',
+    'bakery', 'market', 'subscription', 'insurance', 'repair', 'gift', 'stationery',
+]
+# One frequent word, one rare word (added to a few rows) and one missing word.
+RARE_WORD = 'zeppelin'
+QUERIES = [('common', 'coffee'), ('rare', RARE_WORD), ('no match', 'xylophone')]
+
+
+def make_described_expenses(count, chunk_size=5000, seed=1):
+    from django.contrib.auth import get_user_model
+    from expenses.models import Expense
+
+    owner, _ = get_user_model().objects.get_or_create(username='benchmark')
+    generator = random.Random(seed)
+    categories = [choice for choice, _ in Expense.CATEGORY_CHOICES]
+    today = date.today()
+    batch = []
+    for i in range(count):
+        words = generator.sample(WORDS, generator.randint(2, 4))
+        if i % 10000 == 0:
+            words.append(RARE_WORD)
+        batch.append(Expense(
+            description=' '.join(words).capitalize(),
+            amount=Decimal(generator.randint(100, 50000)) / 100,
+            category=generator.choice(categories),
+            date=today - timedelta(days=generator.randint(0, 3650)),
+            owner=owner,
+        ))
+        if len(batch) >= chunk_size:
+            Expense.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Expense.objects.bulk_create(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from expenses.models import Expense
+    from expenses.search import ranked, search_filter
+
+    with benchmark_database() as connection:
+        make_described_expenses(args.rows)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE expenses_expense')
+
+        expenses = Expense.objects.filter(owner__username='benchmark').order_by('-date', '-id')
+        results = []
+        for label, word in QUERIES:
+            contains = expenses.filter(description__icontains=word)
+            matches = search_filter(expenses, word)
+            results += [
+                (f'icontains page ({label})', measure(lambda: list(contains[:50]), repeat=args.repeat)),
+                (f'icontains count ({label})', measure(contains.count, repeat=args.repeat)),
+                (f'search page ({label})', measure(lambda: list(matches[:50]), repeat=args.repeat)),
+                (f'search count ({label})', measure(matches.count, repeat=args.repeat)),
+                (f'ranked top 50 ({label})',
+                 measure(lambda: list(ranked(matches, word)[:50]), repeat=args.repeat)),
+            ]
+
+        print_table(f'{args.rows} expenses on {connection.vendor}', results)
+
+
+if __name__ == '__main__':
+    main()
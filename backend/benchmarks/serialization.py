@@ -0,0 +1,51 @@
+"""
+Serializer time per N expense rows: ExpenseSerializer vs the .values() fast path.
+
+    python -m benchmarks.serialization --rows 10000
+
+Each case is timed twice: serialization alone (rows already fetched) and
+end to end including the query, plus the sparse `?fields=id,amount` case.
+"""
+import argparse
+
+from benchmarks.common import (
+    benchmark_database, make_expenses, measure, print_table, setup_django,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from expenses.models import Expense
+    from expenses.serializers import ExpenseSerializer, serialize_values
+
+    fields = ExpenseSerializer.Meta.fields
+    sparse = ['id', 'amount']
+
+    with benchmark_database():
+        make_expenses(args.rows)
+        queryset = Expense.objects.order_by('-date', '-id')
+        instances = list(queryset)
+        rows = list(queryset.values(*fields))
+
+        results = [
+            ('ExpenseSerializer (serialize only)',
+             measure(lambda: ExpenseSerializer(instances, many=True).data, repeat=args.repeat)),
+            ('serialize_values (serialize only)',
+             measure(lambda: serialize_values(rows, fields), repeat=args.repeat)),
+            ('ExpenseSerializer (query + serialize)',
+             measure(lambda: ExpenseSerializer(queryset.all(), many=True).data, repeat=args.repeat)),
+            ('serialize_values (query + serialize)',
+             measure(lambda: serialize_values(queryset.values(*fields), fields), repeat=args.repeat)),
+            ('serialize_values ?fields=id,amount',
+             measure(lambda: serialize_values(queryset.values(*sparse), sparse), repeat=args.repeat)),
+        ]
+        print_table(f'{args.rows} expenses', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+"""
+Benchmark suite for the expense and authentication APIs, with a baseline.
+
+    python -m benchmarks.suite --update                 # record benchmarks/baseline.json
+    python -m benchmarks.suite                          # compare against it
+    python -m benchmarks.suite --sizes 1000,100000 --cases list,summary
+
+For every dataset size (synthetic data from `make_expenses`) each case is
+requested --repeat times through the test client: the expense list, plain
+and with each ExpenseFilter parameter, create, destroy, the weekly, monthly
+and yearly summary (with a cold cache), token obtain and refresh, and
+register. Per case it records the p50/p90/p99 latency, the queries per
+request and the memory allocated by one request (lowest tracemalloc peak of a few
+separate, untimed requests).
+
+Without --update the results are compared with the baseline. The run fails
+(exit status 1) when the median latency grows by more than
+--latency-threshold, p90 or p99 by more than --tail-threshold (either by at
+least --latency-floor-ms), allocations by more than --memory-threshold, or
+the query count at all. Latencies depend on the machine and database, so keep
+one baseline per environment and record it on the commit you compare with.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from benchmarks.common import api_client, benchmark_database, make_expenses, setup_django
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+PASSWORD = 'Benchmark-passw0rd'
+METRICS = ('p50', 'p90', 'p99', 'queries', 'alloc_kb')
+ALLOCATION_RUNS = 3
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Case:
+    """One benchmarked request; `prepare()` runs untimed before each call."""
+
+    def __init__(self, name, call, prepare=None, repeat=None, expect=200):
+        self.name = name
+        self.call = call
+        self.prepare = prepare or (lambda: None)
+        self.repeat = repeat
+        self.expect = expect
+
+    def run(self, repeat):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        repeat = self.repeat or repeat
+        self._checked(self.call(self.prepare()))  # warm up
+
+        timings, queries = [], []
+        for _ in range(repeat):
+            argument = self.prepare()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = self.call(argument)
+                timings.append((time.perf_counter() - started) * 1000)
+            self._checked(response)
+            queries.append(len(captured))
+
+        # Allocation peaks vary with whatever happens to be cached; keep the lowest.
+        peaks = []
+        for _ in range(ALLOCATION_RUNS):
+            argument = self.prepare()
+            tracemalloc.start()
+            try:
+                self._checked(self.call(argument))
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+
+        timings.sort()
+        queries.sort()
+        return {
+            'p50': percentile(timings, 0.5),
+            'p90': percentile(timings, 0.9),
+            'p99': percentile(timings, 0.99),
+            'queries': queries[len(queries) // 2],
+            'alloc_kb': min(peaks) / 1024,
+        }
+
+    def _checked(self, response):
+        if response.status_code != self.expect:
+            raise SystemExit(f'{self.name}: expected {self.expect}, got {response.status_code}: '
+                             f'{response.content[:300]!r}')
+        return response
+
+
+def build_cases(client, anonymous, login_repeat):
+    from authentication.serializers import tokens_for_user
+    from django.contrib.auth import get_user_model
+    from django.core.cache import cache
+    from expenses.models import Expense
+
+    owner = get_user_model().objects.get(username='benchmark')
+    newest = Expense.objects.order_by('-date').values_list('date', flat=True).first() or date.today()
+    filters = {
+        'min_date': (newest - timedelta(days=30)).isoformat(),
+        'max_date': (newest - timedelta(days=300)).isoformat(),
+        'category': 'Travel',
+        'min_amount': '500',
+        'max_amount': '5',
+        'description': 'coffee',
+        'search': 'coffee',
+    }
+    cases = [Case('list page', lambda _: client.get('/api/expenses/', {'page_size': 50}))]
+    cases += [
+        Case(f'list {name}', lambda _, name=name, value=value: client.get(
+            '/api/expenses/', {name: value, 'page_size': 50}))
+        for name, value in filters.items()
+    ]
+
+    counter = iter(range(10 ** 9))
+    expense = {'description': 'Benchmark lunch', 'amount': '12.50',
+               'category': 'Food & Dining', 'date': newest.isoformat()}
+    cases.append(Case('create', lambda _: client.post('/api/expenses/', expense, format='json'),
+                      expect=201))
+
+    def new_expense():
+        return Expense.objects.create(description='To delete', amount='1.00',
+                                      category='Other', date=newest, owner=owner).pk
+    cases.append(Case('destroy', lambda pk: client.delete(f'/api/expenses/{pk}/'),
+                      prepare=new_expense, expect=204))
+
+    for timeframe in ('weekly', 'monthly', 'yearly'):
+        cases.append(Case(f'summary {timeframe}',
+                          lambda _, timeframe=timeframe: client.get(
+                              '/api/expenses/summary/', {'timeframe': timeframe}),
+                          prepare=cache.clear))
+
+    credentials = {'username': 'benchmark', 'password': PASSWORD}
+    cases.append(Case('token obtain', lambda _: anonymous.post('/api/auth/token/', credentials, format='json'),
+                      repeat=login_repeat))
+
+    # Rotation revokes each refresh token once used, so every call gets its own.
+    def new_refresh_token():
+        return tokens_for_user(owner)['refresh']
+    cases.append(Case('token refresh',
+                      lambda refresh: anonymous.post('/api/auth/token/refresh/', {'refresh': refresh}, format='json'),
+                      prepare=new_refresh_token))
+
+    def new_account():
+        number = next(counter)
+        return {'username': f'bench-{number}', 'email': f'bench-{number}@example.com', 'password': PASSWORD}
+    cases.append(Case('register', lambda data: anonymous.post('/api/auth/register/', data, format='json'),
+                      prepare=new_account, repeat=login_repeat, expect=201))
+    return cases
+
+
+def run_suite(sizes, repeat, login_repeat, selected):
+    from django.contrib.auth import get_user_model
+    from rest_framework.test import APIClient
+
+    results = {}
+    for size in sizes:
+        with benchmark_database():
+            make_expenses(size, seed=1, end=date(2024, 12, 31), days=730)
+            client = api_client()
+            user = get_user_model().objects.get(username='benchmark')
+            user.set_password(PASSWORD)
+            user.save()
+            for case in build_cases(client, APIClient(), login_repeat):
+                if selected and not any(case.name.startswith(prefix) for prefix in selected):
+                    continue
+                results[f'{size}/{case.name}'] = stats = case.run(repeat)
+                print(f"{size:>8} {case.name:<22} " + ' '.join(
+                    f"{stats[metric]:>10.2f}" for metric in METRICS), flush=True)
+    return results
+
+
+def compare(baseline, results, latency_threshold, tail_threshold, memory_threshold, latency_floor_ms=0.0):
+    """Return (key, metric, baseline value, new value) for every regression."""
+    regressions = []
+    for key, stats in sorted(results.items()):
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        for metric in METRICS:
+            old, new = previous[metric], stats[metric]
+            if metric == 'queries':
+                limit = old
+            elif metric == 'alloc_kb':
+                limit = old * (1 + memory_threshold)
+            else:
+                threshold = latency_threshold if metric == 'p50' else tail_threshold
+                # A millisecond of jitter on fast requests is not a regression.
+                limit = max(old * (1 + threshold), old + latency_floor_ms)
+            if new > limit:
+                regressions.append((key, metric, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--login-repeat', type=int, default=5,
+                        help='Repeats for token obtain and register, which hash passwords')
+    parser.add_argument('--cases', default='', help='Comma-separated case name prefixes to run')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--latency-threshold', type=float, default=0.25)
+    parser.add_argument('--tail-threshold', type=float, default=0.5)
+    parser.add_argument('--latency-floor-ms', type=float, default=3.0,
+                        help='Ignore latency increases smaller than this')
+    parser.add_argument('--memory-threshold', type=float, default=0.10)
+    args = parser.parse_args()
+
+    if os.environ.get('PYTHONHASHSEED') != '0':
+        # Dict and set layouts, and so allocation sizes, depend on the hash
+        # seed; pin it so allocations are comparable between runs.
+        os.execve(sys.executable, [sys.executable, '-m', 'benchmarks.suite', *sys.argv[1:]],
+                  dict(os.environ, PYTHONHASHSEED='0'))
+
+    setup_django()
+    from django.db import connection
+
+    print(f"{'rows':>8} {'case':<22} " + ' '.join(f'{metric:>10}' for metric in METRICS))
+    results = run_suite(
+        [int(size) for size in args.sizes.split(',')], args.repeat, args.login_repeat,
+        [name.strip() for name in args.cases.split(',') if name.strip()],
+    )
+
+    if args.update:
+        document = {
+            'environment': {
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'database': connection.vendor,
+                'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'results': results,
+        }
+        with open(args.baseline, 'w') as handle:
+            json.dump(document, handle, indent=2, sort_keys=True)
+        print(f'\nBaseline written to {args.baseline}')
+        return
+
+    try:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+    except FileNotFoundError:
+        raise SystemExit(f'No baseline at {args.baseline}; record one with --update')
+    if baseline['environment']['database'] != connection.vendor:
+        raise SystemExit(f"Baseline was recorded on {baseline['environment']['database']}, "
+                         f"not {connection.vendor}")
+
+    thresholds = (args.latency_threshold, args.tail_threshold, args.memory_threshold, args.latency_floor_ms)
+    regressions = compare(baseline['results'], results, *thresholds)
+    if regressions:
+        # A single slow outlier can push p99 over; only report regressions
+        # that a second run of the case reproduces.
+        print('\nRe-running cases over the thresholds:')
+        for size in sorted({int(key.split('/')[0]) for key, *_ in regressions}):
+            names = sorted({key.split('/', 1)[1] for key, *_ in regressions if key.startswith(f'{size}/')})
+            for key, stats in run_suite([size], args.repeat, args.login_repeat, names).items():
+                results[key] = {metric: min(value, results[key][metric]) for metric, value in stats.items()}
+        regressions = compare(baseline['results'], results, *thresholds)
+    if regressions:
+        print('\nRegressions against the baseline:')
+        for key, metric, old, new in regressions:
+            print(f'  {key}: {metric} {old:.2f} -> {new:.2f}')
+        sys.exit(1)
+    print('\nNo regressions against the baseline.')
+
+
+if __name__ == '__main__':
+    main()
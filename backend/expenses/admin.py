@@ -1,9 +1,22 @@
 from django.contrib import admin
-from .models import Expense
+from .models import Expense, FxRate, RecurringExpense
 
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
-    list_display = ('description', 'amount', 'category', 'date', 'created_at')
-    list_filter = ('category', 'date')
+    list_display = ('description', 'amount', 'currency', 'category', 'date', 'created_at')
+    list_filter = ('category', 'currency', 'date')
     search_fields = ('description', 'category')
     ordering = ('-date',)
+
+@admin.register(RecurringExpense)
+class RecurringExpenseAdmin(admin.ModelAdmin):
+    list_display = ('description', 'amount', 'currency', 'category', 'frequency', 'interval', 'next_date', 'active')
+    list_filter = ('frequency', 'category', 'active')
+    search_fields = ('description',)
+    ordering = ('next_date',)
+
+@admin.register(FxRate)
+class FxRateAdmin(admin.ModelAdmin):
+    list_display = ('currency', 'date', 'rate')
+    list_filter = ('currency',)
+    ordering = ('currency', '-date')
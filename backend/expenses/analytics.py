@@ -0,0 +1,183 @@
+"""
+Grouped expense statistics computed in a single GROUP BY query.
+
+Dimensions are a period (`day`, `week`, `month`, `year`), `category` and
+`amount_bucket`; metrics are `sum`, `count`, `avg`, `min`, `max` and
+percentiles written as `p<1-99>` (`p50`, `p90`, ...). Percentiles use
+PostgreSQL's `percentile_cont ... WITHIN GROUP`; SQLite gets an equivalent
+aggregate function registered on each new connection.
+
+Given a currency, amounts are converted to it inside the same query (see
+`expenses.fx`) before they are bucketed and aggregated; amounts without an
+exchange rate are counted but left out of the other metrics and buckets.
+"""
+import math
+import re
+from decimal import Decimal
+
+from django.db.models import Aggregate, Avg, Case, Count, FloatField, IntegerField, Max, Min, Sum, Value, When
+from rest_framework.exceptions import ValidationError
+
+from .fx import converted
+from .rollups import PERIOD_TRUNCATIONS
+
+PERIODS = PERIOD_TRUNCATIONS
+DIMENSIONS = [*PERIODS, 'category', 'amount_bucket']
+METRICS = {'sum': Sum, 'count': Count, 'avg': Avg, 'min': Min, 'max': Max}
+PERCENTILE_METRIC = re.compile(r'^p([1-9][0-9]?)$')
+DEFAULT_METRICS = ['sum', 'count']
+DEFAULT_BUCKETS = [10, 25, 50, 100, 250, 500, 1000]
+MAX_BUCKETS = 20
+
+CENT = Decimal('0.01')
+
+
+class Percentile(Aggregate):
+    """Continuous percentile (interpolated), like PostgreSQL's percentile_cont."""
+    function = 'percentile_cont'
+    name = 'Percentile'
+    output_field = FloatField()
+    template = '%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+
+    def __init__(self, expression, fraction, **extra):
+        if not 0 < fraction < 1:
+            raise ValueError('fraction must be between 0 and 1')
+        super().__init__(expression, fraction=repr(float(fraction)), **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template='%(function)s(%(expressions)s, %(fraction)s)', **extra_context
+        )
+
+
+class SQLitePercentile:
+    """percentile_cont(value, fraction) aggregate for SQLite connections."""
+
+    def __init__(self):
+        self.values = []
+        self.fraction = None
+
+    def step(self, value, fraction):
+        if value is not None:
+            self.values.append(value)
+            self.fraction = fraction
+
+    def finalize(self):
+        if not self.values:
+            return None
+        values = sorted(self.values)
+        position = (len(values) - 1) * self.fraction
+        lower = math.floor(position)
+        upper = math.ceil(position)
+        return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def register_sqlite_functions(connection):
+    if connection.vendor == 'sqlite':
+        connection.connection.create_aggregate('percentile_cont', 2, SQLitePercentile)
+
+
+def _split(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+def parse_params(query_params):
+    """Validate ?group_by=, ?metrics= and ?buckets= into (dimensions, metrics, buckets)."""
+    errors = {}
+
+    dimensions = list(dict.fromkeys(_split(query_params.get('group_by'))))
+    unknown = [name for name in dimensions if name not in DIMENSIONS]
+    if unknown:
+        errors['group_by'] = [f"Unknown dimension(s): {', '.join(unknown)}. Use {', '.join(DIMENSIONS)}."]
+    elif len([name for name in dimensions if name in PERIODS]) > 1:
+        errors['group_by'] = ['Group by at most one period.']
+
+    metrics = list(dict.fromkeys(_split(query_params.get('metrics')))) or DEFAULT_METRICS
+    unknown = [name for name in metrics if name not in METRICS and not PERCENTILE_METRIC.match(name)]
+    if unknown:
+        errors['metrics'] = [
+            f"Unknown metric(s): {', '.join(unknown)}. Use {', '.join(METRICS)} or p1-p99."
+        ]
+
+    buckets = DEFAULT_BUCKETS
+    if query_params.get('buckets'):
+        try:
+            buckets = sorted({Decimal(edge) for edge in _split(query_params['buckets'])})
+        except ArithmeticError:
+            errors['buckets'] = ['Buckets must be a comma-separated list of amounts.']
+        else:
+            if not 0 < len(buckets) <= MAX_BUCKETS or not all(edge.is_finite() for edge in buckets):
+                errors['buckets'] = [f'Give between 1 and {MAX_BUCKETS} bucket edges.']
+
+    if errors:
+        raise ValidationError(errors)
+    return dimensions, metrics, buckets
+
+
+def bucket_labels(buckets):
+    labels = [f'<{buckets[0]}']
+    labels += [f'{low}-{high}' for low, high in zip(buckets, buckets[1:])]
+    labels.append(f'>={buckets[-1]}')
+    return labels
+
+
+def _aggregate(metric, amount):
+    if metric in METRICS:
+        return METRICS[metric]('id' if metric == 'count' else amount)
+    return Percentile(amount, int(PERCENTILE_METRIC.match(metric).group(1)) / 100)
+
+
+def _money(value):
+    if value is None:
+        return None
+    return '{:f}'.format(Decimal(str(value)).quantize(CENT))
+
+
+def grouped_statistics(queryset, dimensions, metrics, buckets=DEFAULT_BUCKETS, currency=None):
+    """
+    One GROUP BY over `queryset`, returning a list of dicts ordered by the
+    dimensions, with amounts in `currency` when given.
+    """
+    amount = 'amount'
+    if currency is not None:
+        queryset = queryset.annotate(converted_amount=converted('amount', 'currency', 'date', currency))
+        amount = 'converted_amount'
+    annotations = {}
+    for dimension in dimensions:
+        if dimension in PERIODS:
+            annotations[dimension] = PERIODS[dimension]('date')
+        elif dimension == 'amount_bucket':
+            # Group on the bucket index so buckets sort numerically; labelled
+            # below. Amounts without an exchange rate get no bucket.
+            annotations[dimension] = Case(
+                When(**{f'{amount}__isnull': True}, then=Value(None)),
+                *[When(**{f'{amount}__lt': edge}, then=Value(index)) for index, edge in enumerate(buckets)],
+                default=Value(len(buckets)),
+                output_field=IntegerField(),
+            )
+
+    aggregates = {metric: _aggregate(metric, amount) for metric in metrics}
+    if dimensions:
+        rows = queryset.order_by()\
+            .annotate(**annotations)\
+            .values(*dimensions)\
+            .annotate(**aggregates)\
+            .order_by(*dimensions)
+    else:
+        rows = [queryset.order_by().aggregate(**aggregates)]
+
+    labels = bucket_labels(buckets)
+    results = []
+    for row in rows:
+        item = {}
+        for dimension in dimensions:
+            value = row[dimension]
+            if dimension in PERIODS:
+                value = value.isoformat()
+            elif dimension == 'amount_bucket' and value is not None:
+                value = labels[value]
+            item[dimension] = value
+        for metric in metrics:
+            item[metric] = row[metric] if metric == 'count' else _money(row[metric])
+        results.append(item)
+    return results
@@ -0,0 +1,9 @@
+from django.urls import path
+from .async_views import expense_detail, expense_list, expense_summary, health_check
+
+urlpatterns = [
+    path('expenses/', expense_list, name='async-expense-list'),
+    path('expenses/summary/', expense_summary, name='async-expense-summary'),
+    path('expenses/<int:pk>/', expense_detail, name='async-expense-detail'),
+    path('health-check/', health_check, name='async-health-check'),
+]
@@ -0,0 +1,156 @@
+"""
+Async (ASGI) versions of the hot read endpoints, mounted under /api/async/.
+
+These are plain Django async views rather than DRF views: DRF 3.14 runs
+every view synchronously, which under ASGI means a thread per request. Here
+authentication, filtering, pagination and serialization reuse the same
+pieces as `ExpenseViewSet`, while the queries go through the async ORM
+(`aget`, `aiterator`, `aexists`) so a single worker can hold many slow
+clients at once. Responses are rendered with DRF's JSONRenderer and are
+byte-for-byte the same as the synchronous endpoints.
+"""
+import logging
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException, AuthenticationFailed, MethodNotAllowed, NotAuthenticated, NotFound, ValidationError,
+)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from authentication.jwt import CachedJWTAuthentication
+
+from .cache import aconditional_on_data_version, cached_summary
+from .exports import EXPORT_CHUNK_SIZE
+from .fx import parse_currency
+from .models import Expense
+from .pagination import ExpenseKeysetPagination
+from .serializers import serialize_values
+from .views import ExpenseFilter, compute_summary, requested_fields
+
+logger = logging.getLogger(__name__)
+
+
+def render(data, status=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+async def authenticate(request):
+    """Resolve the JWT bearer token to a user, or None without credentials."""
+    authenticator = CachedJWTAuthentication()
+    header = authenticator.get_header(request)
+    if header is None:
+        return None
+    raw_token = authenticator.get_raw_token(header)
+    if raw_token is None:
+        return None
+    # Signature and expiry checks are pure CPU; the user state is cached.
+    return await authenticator.aget_user(authenticator.get_validated_token(raw_token))
+
+
+def async_api_view(methods=('GET',), authenticated=True):
+    """
+    Method check, JWT authentication and DRF-style error responses for an
+    async view, mirroring what @api_view and the default handler provide.
+    """
+    allowed = {*methods, 'HEAD'} if 'GET' in methods else set(methods)
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in allowed:
+                    raise MethodNotAllowed(request.method)
+                if authenticated:
+                    request.user = await authenticate(request)
+                    if request.user is None:
+                        raise NotAuthenticated()
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+                response = render(data, exc.status_code)
+                if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+                    response['WWW-Authenticate'] = CachedJWTAuthentication().authenticate_header(request)
+                if isinstance(exc, MethodNotAllowed):
+                    response['Allow'] = ', '.join(sorted(allowed))
+                return response
+        return wrapper
+    return decorator
+
+
+@async_api_view()
+@aconditional_on_data_version
+async def expense_list(request):
+    try:
+        fields = requested_fields(request.GET)
+        expenses = Expense.objects.filter(owner_id=request.user.id).order_by('-date', '-id')
+        filterset = ExpenseFilter(request.GET, queryset=expenses)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        # Keyset pagination needs date and id even when they aren't requested.
+        rows = filterset.qs.values(*dict.fromkeys([*fields, 'date', 'id']))
+
+        paginator = ExpenseKeysetPagination()
+        page = await paginator.apaginate_queryset(rows, Request(request))
+        if page is not None:
+            return render({'next': paginator.get_next_link(), 'results': serialize_values(page, fields)})
+        rows = [row async for row in rows.aiterator(chunk_size=EXPORT_CHUNK_SIZE)]
+        return render(serialize_values(rows, fields))
+    except APIException:
+        raise
+    except Exception as e:
+        logger.error(f"Error listing expenses: {str(e)}")
+        return render({'error': 'Failed to retrieve expenses'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_api_view()
+async def expense_detail(request, pk):
+    try:
+        fields = requested_fields(request.GET)
+        try:
+            row = await Expense.objects.values(*fields).aget(pk=pk, owner_id=request.user.id)
+        except Expense.DoesNotExist:
+            raise NotFound()
+        return render(serialize_values([row], fields)[0])
+    except APIException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving expense: {str(e)}")
+        return render({'error': 'Failed to retrieve expense'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_api_view()
+@aconditional_on_data_version
+async def expense_summary(request):
+    try:
+        timeframe = request.GET.get('timeframe', 'monthly')
+        # The cache client is synchronous, so the whole single-flight lookup
+        # (and the rollup queries on a miss) runs as one thread hop instead
+        # of one per cache round trip.
+        def summary():
+            currency = parse_currency(request.GET)
+            return cached_summary(
+                request.user.pk,
+                {**request.GET.dict()},
+                lambda: compute_summary(request.user.id, timeframe, currency),
+                generation=request.data_version,
+            )
+        data = await sync_to_async(summary)()
+        return render(data)
+    except APIException:
+        raise
+    except Exception as e:
+        logger.error(f"Error generating summary: {str(e)}")
+        return render({'error': 'Failed to generate expense summary'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_api_view(authenticated=False)
+async def health_check(request):
+    try:
+        await Expense.objects.aexists()
+    except Exception as e:
+        logger.error(f"Health check failed: {str(e)}")
+        return render({'status': 'unavailable'}, status.HTTP_503_SERVICE_UNAVAILABLE)
+    return render({'status': 'ok'})
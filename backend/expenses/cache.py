@@ -0,0 +1,218 @@
+"""
+Versioned, per-user caching of expense summaries.
+
+Cache keys combine the user, the request parameters and the user's current
+data generation. The generations live in the database (`DataGeneration`),
+not in the cache: web workers, the job runner and management commands are
+separate processes, and the cache may be each process's own LocMemCache.
+Expense writes replace the generation of the owners they touched in their
+own transaction (see `expenses.rollups`), so once a write commits every
+process stops reading those users' older entries at once: a summary is never
+served stale after a write, while other users' entries stay valid. Entries
+themselves may stay per process.
+
+Within one generation an entry is fresh for SUMMARY_FRESH_SECONDS and may
+then be served stale for SUMMARY_STALE_SECONDS while a single request
+recomputes it (stale-while-revalidate). Recomputation is single-flight: the
+request holding the lock computes, concurrent requests either get the stale
+value or wait briefly for the new one instead of all hitting the database.
+
+The same generation drives conditional GETs: `conditional_on_data_version`
+derives ETag and Last-Modified from it, so a request carrying a matching
+If-None-Match is answered with 304 after one primary-key lookup, before the
+view runs. The decorators leave the version on `request.data_version` for
+the view to hand to `cached_summary`.
+
+Totals converted to another currency also depend on the exchange rates, so
+summaries are keyed, and ETags derived, on both the user's generation and
+the rate table's (`expenses.fx`), read in one query; a change to either
+invalidates. Only Last-Modified uses the newer of the two.
+
+The cache alias is taken from the EXPENSES_CACHE_ALIAS setting ('default').
+"""
+import hashlib
+import time
+from functools import wraps
+from typing import NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .fx import VERSION_KEY as FX_VERSION_KEY
+from .models import DataGeneration
+
+GENERATION_KEY = 'user:{}'
+SUMMARY_FRESH_SECONDS = 60
+SUMMARY_STALE_SECONDS = 600
+LOCK_SECONDS = 30
+WAIT_SECONDS = 5
+WAIT_INTERVAL = 0.05
+
+
+def get_cache():
+    return caches[getattr(settings, 'EXPENSES_CACHE_ALIAS', 'default')]
+
+
+def get_generation(user_id):
+    """Return the user's data generation, creating one on first use."""
+    key = GENERATION_KEY.format(user_id)
+    generations = DataGeneration.objects.filter(key=key).values_list('generation', flat=True)
+    generation = generations.first()
+    if generation is None:
+        # A timestamp rather than a counter, so a user's first generation
+        # never matches entries cached before the row existed.
+        DataGeneration.objects.bulk_create([DataGeneration(key=key, generation=time.time_ns())],
+                                           ignore_conflicts=True)
+        generation = generations.first()
+    return generation
+
+
+class DataVersion(NamedTuple):
+    """The user's generation and the exchange rates' (`expenses.fx`)."""
+    user: int
+    fx: int
+
+    def __str__(self):
+        # Both parts, not the newer one: the rates may be stamped before
+        # the user's last write (commit order, another host's clock).
+        return f'{self.user}.{self.fx}'
+
+    @property
+    def modified(self):
+        """Last-Modified, in seconds."""
+        return max(self) // 10 ** 9
+
+
+def data_version(user_id):
+    """
+    Version of everything a user's summaries depend on, read in one query.
+    """
+    key = GENERATION_KEY.format(user_id)
+    generations = dict(DataGeneration.objects.filter(key__in=[key, FX_VERSION_KEY]).values_list('key', 'generation'))
+    generation = generations.get(key)
+    if generation is None:
+        generation = get_generation(user_id)
+    return DataVersion(generation, generations.get(FX_VERSION_KEY, 0))
+
+
+def bump_generation(user_ids):
+    DataGeneration.bump(GENERATION_KEY.format(user_id) for user_id in user_ids if user_id is not None)
+
+
+def summary_key(user_id, params, generation):
+    digest = hashlib.sha1(
+        '&'.join(f'{name}={value}' for name, value in sorted(params.items())).encode()
+    ).hexdigest()
+    return f'expenses:summary:{user_id}:{generation}:{digest}'
+
+
+def _store(cache, key, data):
+    entry = {'data': data, 'fresh_until': time.time() + SUMMARY_FRESH_SECONDS}
+    cache.set(key, entry, SUMMARY_FRESH_SECONDS + SUMMARY_STALE_SECONDS)
+    return data
+
+
+def cached_summary(user_id, params, compute, generation=None):
+    """
+    Return compute() for this user and parameters, going through the cache.
+    Views behind the conditional decorators pass the version they already
+    read (`request.data_version`) as `generation`.
+    """
+    cache = get_cache()
+    if generation is None:
+        generation = data_version(user_id)
+    key = summary_key(user_id, params, generation)
+    lock_key = f'{key}:lock'
+
+    entry = cache.get(key)
+    if entry is not None:
+        if entry['fresh_until'] > time.time() or not cache.add(lock_key, 1, LOCK_SECONDS):
+            # Fresh, or stale while another request is already refreshing it.
+            return entry['data']
+        try:
+            return _store(cache, key, compute())
+        finally:
+            cache.delete(lock_key)
+
+    if cache.add(lock_key, 1, LOCK_SECONDS):
+        try:
+            return _store(cache, key, compute())
+        finally:
+            cache.delete(lock_key)
+
+    # Another request is computing this entry; wait for its result rather
+    # than stampeding the database, but never longer than WAIT_SECONDS.
+    deadline = time.monotonic() + WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['data']
+    return compute()
+
+
+def data_etag(request, generation):
+    renderer = getattr(request, 'accepted_renderer', None)
+    digest = hashlib.sha1(':'.join([
+        str(request.user.pk),
+        str(generation),
+        renderer.format if renderer else '',
+        request.get_full_path(),
+    ]).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def _conditional_response(request, version):
+    """Return (etag, last_modified, response) where response is a 304/412 or None."""
+    etag = data_etag(request, version)
+    last_modified = version.modified
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    return etag, last_modified, response
+
+
+def _add_validators(response, etag, last_modified):
+    response.headers.setdefault('ETag', etag)
+    response.headers.setdefault('Last-Modified', http_date(last_modified))
+    # Private per-user data: browsers may keep it but must revalidate.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional_on_data_version(view_method):
+    """
+    Add ETag/Last-Modified to a read-only viewset action and answer matching
+    If-None-Match / If-Modified-Since requests with 304 without calling it.
+    """
+    @wraps(view_method)
+    def wrapper(viewset, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view_method(viewset, request, *args, **kwargs)
+
+        request.data_version = data_version(request.user.pk)
+        etag, last_modified, response = _conditional_response(request, request.data_version)
+        if response is None:
+            response = view_method(viewset, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        return _add_validators(response, etag, last_modified)
+    return wrapper
+
+
+def aconditional_on_data_version(view_func):
+    """Async counterpart of `conditional_on_data_version` for plain async views."""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await view_func(request, *args, **kwargs)
+
+        request.data_version = await sync_to_async(data_version)(request.user.pk)
+        etag, last_modified, response = _conditional_response(request, request.data_version)
+        if response is None:
+            response = await view_func(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        return _add_validators(response, etag, last_modified)
+    return wrapper
@@ -0,0 +1,89 @@
+"""
+Streaming CSV / NDJSON export of expenses.
+
+Rows are read with `.values_list()` through a server-side cursor
+(`.iterator(chunk_size=...)`) and encoded into bounded text buffers, so
+memory use stays flat however many rows the export contains.
+"""
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+from .serializers import VALUE_CONVERTERS
+
+EXPORT_FIELDS = ['id', 'description', 'amount', 'currency', 'category', 'date', 'created_at']
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+
+def export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield export rows in EXPORT_FIELDS order, with values rendered as in the JSON API."""
+    converters = [VALUE_CONVERTERS[name] for name in EXPORT_FIELDS]
+    rows = queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield tuple(
+            convert(value) if convert is not None and value is not None else value
+            for convert, value in zip(converters, row)
+        )
+
+
+def _buffered(rows, write_row, buffer):
+    """Write rows into `buffer`, yielding its contents whenever it grows past the limit."""
+    for row in rows:
+        write_row(row)
+        if buffer.tell() >= EXPORT_BUFFER_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    return _buffered(rows, writer.writerow, buffer)
+
+
+def stream_ndjson(rows):
+    buffer = io.StringIO()
+
+    def write_row(row):
+        buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, row))))
+        buffer.write('\n')
+    return _buffered(rows, write_row, buffer)
+
+
+class CSVRenderer(BaseRenderer):
+    """Selected by ?format=csv; only renders small non-streamed payloads such as errors."""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+    stream = staticmethod(stream_csv)
+    filename = 'expenses.csv'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return ''
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(data.keys())
+        writer.writerow(data.values())
+        return buffer.getvalue()
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Selected by ?format=ndjson; only renders small non-streamed payloads such as errors."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+    stream = staticmethod(stream_ndjson)
+    filename = 'expenses.ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return ''
+        return json.dumps(data) + '\n'
@@ -0,0 +1,205 @@
+"""
+Currency conversion against the historical rates in `FxRate`.
+
+A rate is the value of one unit of a currency in the base currency
+(EXPENSES_BASE_CURRENCY, always 1) and holds from its date until the
+currency's next one. An amount in currency A on day d is worth
+`amount * rate(A, d) / rate(T, d)` in currency T.
+
+Totals convert in the database, inside the aggregate: `converted()` builds
+an expression that multiplies each amount by rates looked up with correlated
+subqueries (the latest rate on or before the row's date, one probe of the
+unique (currency, date) index each), so a converted summary is still one
+GROUP BY query. Rows already in the target currency skip the lookups. Rows
+with no rate on or before their date convert to NULL: they drop out of the
+sums and are counted instead. `conversion_sql()` is the same for raw SQL.
+
+`rates` is each process's copy of the table, per currency a sorted list of
+dates searched with bisect. It validates requested currencies and converts
+single amounts without a query. Every write to the table bumps its version,
+the `fx` row of `DataGeneration`, in the same transaction; each process
+polls that row every EXPENSES_FX_SYNC_INTERVAL seconds and reloads when it
+changed. Cached summaries and their validators follow the same row (see
+`expenses.cache`), so converted totals never outlive the rates they used.
+"""
+import bisect
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Cast
+from rest_framework.exceptions import ValidationError
+
+from .models import DataGeneration, FxRate, base_currency, currency_code
+
+VERSION_KEY = 'fx'
+CENT = Decimal('0.01')
+# Wide enough for a rollup total times a rate; results are rounded to cents.
+CONVERTED_FIELD = DecimalField(max_digits=30, decimal_places=10)
+
+
+def _latest_rate(currency, day):
+    return Subquery(
+        FxRate.objects.filter(currency=currency, date__lte=day).order_by('-date').values('rate')[:1],
+        output_field=CONVERTED_FIELD,
+    )
+
+
+def _divisor(expression):
+    # SQLite stores whole-number rates as integers, and dividing by an
+    # integer truncates there.
+    if connection.vendor == 'sqlite':
+        return Cast(expression, FloatField())
+    return expression
+
+
+def converted(amount, currency, day, target):
+    """
+    Expression for the `amount` field, in the `currency` field, converted
+    to `target` at the rates of the `day` field; NULL without a rate.
+    """
+    base = base_currency()
+    source_rate = Case(
+        When(**{currency: base}, then=Value(1, output_field=CONVERTED_FIELD)),
+        default=_latest_rate(OuterRef(currency), OuterRef(day)),
+        output_field=CONVERTED_FIELD,
+    )
+    value = F(amount) * source_rate
+    if target != base:
+        value = ExpressionWrapper(value / _divisor(_latest_rate(target, OuterRef(day))),
+                                  output_field=CONVERTED_FIELD)
+    return Case(
+        When(**{currency: target}, then=F(amount)),
+        default=value,
+        output_field=CONVERTED_FIELD,
+    )
+
+
+def conversion_sql(alias, amount, currency, day, target):
+    """
+    `converted()` as raw SQL over the columns of table `alias`: returns the
+    SQL and its parameters.
+    """
+    quote = connection.ops.quote_name
+    table = quote(FxRate._meta.db_table)
+    amount, currency, day = (f'{alias}.{quote(column)}' for column in (amount, currency, day))
+
+    def latest_rate(code):
+        return f'(SELECT rate FROM {table} WHERE currency = {code} AND {quote("date")} <= {day} ' \
+               f'ORDER BY {quote("date")} DESC LIMIT 1)'
+
+    sql = f'{amount} * CASE WHEN {currency} = %s THEN 1 ELSE {latest_rate(currency)} END'
+    params = [base_currency()]
+    if target != base_currency():
+        divisor = latest_rate('%s')
+        sql = f'{sql} / CAST({divisor} AS REAL)' if connection.vendor == 'sqlite' else f'{sql} / {divisor}'
+        params.append(target)
+    return f'CASE WHEN {currency} = %s THEN {amount} ELSE {sql} END', [target, *params]
+
+
+def money(value):
+    """A converted total rounded to cents."""
+    return None if value is None else Decimal(str(value)).quantize(CENT)
+
+
+class FxRateTable:
+    """Per-process, date-indexed copy of the FxRate table."""
+
+    def __init__(self, sync_interval):
+        self.sync_interval = sync_interval
+        self._rates = None
+        self._version = None
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        """The version of the rate table: when it last changed, 0 if never."""
+        return DataGeneration.objects.filter(key=VERSION_KEY).values_list('generation', flat=True).first() or 0
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._rates is not None and now < self._next_sync:
+            return
+        with self._lock:
+            if self._rates is not None and now < self._next_sync:
+                return
+            # Read before the rows: a change committed meanwhile bumps it
+            # again, and the next sync reloads.
+            version = self.version
+            if self._rates is None or version != self._version:
+                rates = {}
+                rows = FxRate.objects.order_by('currency', 'date').values_list('currency', 'date', 'rate')
+                for currency, day, rate in rows.iterator(chunk_size=10000):
+                    dates, values = rates.setdefault(currency, ([], []))
+                    dates.append(day)
+                    values.append(rate)
+                self._rates, self._version = rates, version
+            self._next_sync = now + self.sync_interval
+
+    def currencies(self):
+        """The base currency and every currency with rates."""
+        self._sync()
+        return {base_currency(), *self._rates}
+
+    def rate(self, currency, day):
+        """Value of one unit of `currency` in the base currency on `day`, or None."""
+        if currency == base_currency():
+            return Decimal(1)
+        self._sync()
+        dates, values = self._rates.get(currency, ((), ()))
+        index = bisect.bisect_right(dates, day) - 1
+        return values[index] if index >= 0 else None
+
+    def convert(self, amount, currency, target, day):
+        """`amount` in `currency` converted to `target` on `day`, or None without rates."""
+        if currency == target:
+            return amount
+        source, divisor = self.rate(currency, day), self.rate(target, day)
+        if source is None or divisor is None:
+            return None
+        return money(amount * source / divisor)
+
+    def changed(self):
+        """
+        Record a change to the rate table in the current transaction; every
+        process reloads it at its next sync.
+        """
+        DataGeneration.bump([VERSION_KEY])
+        self._next_sync = 0.0
+
+    def reset(self):
+        """Forget the loaded table; the next use reloads it."""
+        with self._lock:
+            self._rates = None
+            self._next_sync = 0.0
+
+
+def parse_currency(query_params):
+    """The ?currency= to report in: the base currency when absent."""
+    currency = query_params.get('currency', '').strip().upper() or base_currency()
+    if currency == base_currency():
+        return currency
+    if not currency_code.regex.match(currency) or currency not in rates.currencies():
+        raise ValidationError({'currency': [f'No exchange rates for {currency}.']})
+    return currency
+
+
+def load_rates(rows, batch_size=5000):
+    """
+    Insert or update (currency, date, rate) rows, rates in the base
+    currency, in one transaction; returns how many were written.
+    """
+    rows = [FxRate(currency=currency, date=day, rate=rate) for currency, day, rate in rows]
+    with transaction.atomic():
+        FxRate.objects.bulk_create(rows, batch_size=batch_size, update_conflicts=True,
+                                   unique_fields=['currency', 'date'], update_fields=['rate'])
+        rates.changed()
+    return len(rows)
+
+
+rates = FxRateTable(sync_interval=getattr(settings, 'EXPENSES_FX_SYNC_INTERVAL', 5))
+
@@ -0,0 +1,159 @@
+"""
+Background jobs on expense data; see jobs.registry.
+
+- `expenses.export`: the user's expenses, filtered as with /api/expenses/,
+  written to a CSV or NDJSON file the job's download endpoint serves.
+- `expenses.import`: an uploaded CSV or OFX file through `import_expenses`.
+  Retries resume from the command's checkpoint rather than starting over.
+- `expenses.seed` (staff): synthetic expenses for the submitting user.
+- `expenses.rebuild_rollups` (staff): recompute every rollup row.
+- `expenses.materialize_recurring` (staff): write the due occurrences of
+  every recurring expense.
+"""
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from rest_framework.exceptions import ValidationError
+
+from jobs.registry import register
+from jobs.runner import report
+
+from .exports import export_rows, stream_csv, stream_ndjson
+from .models import Expense, currency_code
+from .recurring import materialize
+from .rollups import rebuild_rollups
+from .synthetic import DEFAULT_DAYS, seed_expenses
+from .views import ExpenseFilter
+
+EXPORT_STREAMS = {'csv': stream_csv, 'ndjson': stream_ndjson}
+IMPORT_FORMATS = ['csv', 'ofx']
+MAX_SEED_EXPENSES = 1000000
+
+
+def job_dir(job):
+    """Directory for the files a job reads and writes."""
+    path = os.path.join(settings.JOB_FILES_DIR, str(job.pk))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _check_keys(params, allowed):
+    unknown = sorted(set(params) - set(allowed))
+    if unknown:
+        raise ValidationError({'params': [f"Unknown parameters: {', '.join(unknown)}"]})
+
+
+def _filtered(params, queryset):
+    filterset = ExpenseFilter(data=params, queryset=queryset)
+    if not filterset.is_valid():
+        raise ValidationError({'params': filterset.errors})
+    return filterset.qs
+
+
+def validate_export(params):
+    _check_keys(params, ['format', *ExpenseFilter.Meta.fields])
+    if params.get('format', 'csv') not in EXPORT_STREAMS:
+        raise ValidationError({'params': [f"format must be one of {', '.join(EXPORT_STREAMS)}"]})
+    _filtered(params, Expense.objects.none())
+    return params
+
+
+@register('expenses.export', validate=validate_export)
+def export_job(job, format='csv', **filters):
+    queryset = _filtered(filters, Expense.objects.filter(owner_id=job.owner_id).order_by('date', 'id'))
+    path = os.path.join(job_dir(job), f'expenses.{format}')
+    rows = 0
+
+    def counted():
+        nonlocal rows
+        for row in export_rows(queryset):
+            rows += 1
+            if rows % 1000 == 0:
+                report(job, f'{rows} expenses exported')
+            yield row
+
+    with open(path, 'w', newline='', encoding='utf-8') as handle:
+        for chunk in EXPORT_STREAMS[format](counted()):
+            handle.write(chunk)
+    report(job, f'{rows} expenses exported')
+    return {'file': path, 'rows': rows}
+
+
+def validate_import(params):
+    _check_keys(params, ['format', 'default_category', 'currency'])
+    if params.get('format') not in (None, *IMPORT_FORMATS):
+        raise ValidationError({'params': [f"format must be one of {', '.join(IMPORT_FORMATS)}"]})
+    categories = {choice for choice, _ in Expense.CATEGORY_CHOICES}
+    if params.get('default_category', 'Other') not in categories:
+        raise ValidationError({'params': [f"Unknown category: {params['default_category']}"]})
+    if 'currency' in params and not currency_code.regex.match(str(params['currency'])):
+        raise ValidationError({'params': [f"Invalid currency: {params['currency']}"]})
+    return params
+
+
+class _ProgressOutput:
+    """File-like stdout for call_command that reports each line as job progress."""
+
+    def __init__(self, job):
+        self.job = job
+
+    def write(self, text):
+        text = text.strip()
+        if text:
+            report(self.job, text)
+
+    def flush(self):
+        pass
+
+
+@register('expenses.import', validate=validate_import, takes_file=True)
+def import_job(job, path, format=None, default_category='Other', currency=None):
+    username = get_user_model().objects.values_list('username', flat=True).get(pk=job.owner_id)
+    args = [path, '--user', username, '--default-category', default_category]
+    if format:
+        args += ['--format', format]
+    if currency:
+        args += ['--currency', currency]
+    if os.path.exists(f'{path}.checkpoint'):
+        # An earlier attempt got part of the way.
+        args.append('--resume')
+    output = _ProgressOutput(job)
+    call_command('import_expenses', *args, stdout=output, stderr=output)
+    return {'summary': job.progress}
+
+
+def validate_seed(params):
+    _check_keys(params, ['expenses', 'seed', 'days'])
+    cleaned = {}
+    for name, default, low, high in [('expenses', 200, 0, MAX_SEED_EXPENSES),
+                                     ('seed', 0, None, None), ('days', DEFAULT_DAYS, 1, None)]:
+        value = params.get(name, default)
+        if not isinstance(value, int) or isinstance(value, bool) \
+                or (low is not None and value < low) or (high is not None and value > high):
+            raise ValidationError({'params': [f'{name} must be an integer in range']})
+        cleaned[name] = value
+    return cleaned
+
+
+@register('expenses.seed', validate=validate_seed, staff_only=True)
+def seed_job(job, expenses=200, seed=0, days=DEFAULT_DAYS):
+    written = seed_expenses(
+        1, expenses, seed=seed, days=days, clear=False, owner_ids=[job.owner_id],
+        progress=lambda written: report(job, f'{written} expenses written'),
+    )
+    return {'rows': written}
+
+
+@register('expenses.rebuild_rollups', staff_only=True)
+def rebuild_job(job):
+    return {'rollups': rebuild_rollups()}
+
+
+@register('expenses.materialize_recurring', staff_only=True)
+def materialize_job(job):
+    schedules, expenses = materialize(
+        progress=lambda schedules, expenses: report(job, f'{schedules} schedules, {expenses} expenses written'),
+    )
+    return {'schedules': schedules, 'expenses': expenses}
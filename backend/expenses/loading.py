@@ -0,0 +1,117 @@
+"""
+Fast insertion of already-validated expense rows.
+
+On PostgreSQL rows are streamed into the table with `COPY ... FROM STDIN`;
+other databases fall back to a chunked `executemany` INSERT. Either way the rollups
+are updated with one batch of deltas per call. All rows of one call share a
+currency, the base currency unless given.
+"""
+import csv
+import io
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Expense, base_currency
+from .partitions import ensure_partitions
+from .rollups import apply_expense_rows
+
+LOAD_BATCH_SIZE = 1000
+COPY_COLUMNS = ('owner_id', 'description', 'amount', 'currency', 'category', 'date', 'created_at')
+
+
+def _copy_rows(rows, currency, created_at):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for owner_id, description, amount, category, day in rows:
+        writer.writerow((owner_id, description, amount, currency, category, day.isoformat(), created_at))
+    buffer.seek(0)
+
+    quote = connection.ops.quote_name
+    sql = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        quote(Expense._meta.db_table),
+        ', '.join(quote(column) for column in COPY_COLUMNS),
+    )
+    with connection.cursor() as cursor:
+        cursor.copy_expert(sql, buffer)
+
+
+def _insert_rows(rows, currency, created_at):
+    # One prepared INSERT run with executemany; building model instances
+    # for bulk_create costs more than the insert itself. Values are passed
+    # in the same text form COPY uses.
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(Expense._meta.db_table),
+        ', '.join(quote(column) for column in COPY_COLUMNS),
+        ', '.join(['%s'] * len(COPY_COLUMNS)),
+    )
+    created_at = Expense._meta.get_field('created_at').get_db_prep_value(created_at, connection)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), LOAD_BATCH_SIZE):
+            cursor.executemany(sql, [
+                (owner_id, description, str(amount), currency, category, day.isoformat(), created_at)
+                for owner_id, description, amount, category, day in rows[start:start + LOAD_BATCH_SIZE]
+            ])
+
+
+def insert_expense_rows(rows, currency=None):
+    """
+    Insert (owner id, description, amount, category, date) rows in
+    `currency` (default: the base currency) without touching the rollups;
+    callers must apply or rebuild them. Returns the number of rows.
+    """
+    currency = currency or base_currency()
+    ensure_partitions(day for *_, day in rows)
+    if connection.vendor == 'postgresql':
+        _copy_rows(rows, currency, timezone.now().isoformat())
+    else:
+        _insert_rows(rows, currency, timezone.now())
+    return len(rows)
+
+
+def insert_occurrence_rows(rows):
+    """
+    Insert (owner id, description, amount, category, date, recurring id,
+    currency) rows materialized from recurring expenses, skipping occurrences that
+    already exist (the unique recurring/date constraint). Like
+    `insert_expense_rows`, leaves the rollups to the caller.
+    """
+    ensure_partitions(row[4] for row in rows)
+    quote = connection.ops.quote_name
+    columns = (*COPY_COLUMNS, 'recurring_id')
+    created_at = Expense._meta.get_field('created_at').get_db_prep_value(timezone.now(), connection)
+    # Multi-row VALUES, as many rows per statement as the database takes parameters.
+    batch_size = min(LOAD_BATCH_SIZE, (connection.features.max_query_params or 1 << 16) // len(columns))
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                'INSERT INTO {} ({}) VALUES {} ON CONFLICT ({}, {}) DO NOTHING'.format(
+                    quote(Expense._meta.db_table),
+                    ', '.join(quote(column) for column in columns),
+                    ', '.join(['({})'.format(', '.join(['%s'] * len(columns)))] * len(batch)),
+                    quote('recurring_id'), quote('date'),
+                ),
+                [value
+                 for owner_id, description, amount, category, day, recurring_id, currency in batch
+                 for value in (owner_id, description, str(amount), currency, category, day.isoformat(),
+                               created_at, recurring_id)]
+            )
+
+
+def load_expenses(rows, currency=None):
+    """
+    Insert (owner id, description, amount, category, date) rows in
+    `currency` (default: the base currency) and return how many were written.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    currency = currency or base_currency()
+    with transaction.atomic():
+        insert_expense_rows(rows, currency)
+        apply_expense_rows(
+            (owner_id, day, category, amount, currency) for owner_id, _, amount, category, day in rows
+        )
+    return len(rows)
@@ -0,0 +1,55 @@
+import os
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from expenses.partitions import ARCHIVE_PREFIX, archive_partition, is_partitioned, list_partitions, next_month
+
+DEFAULT_KEEP_MONTHS = 24
+
+
+class Command(BaseCommand):
+    help = (
+        'Takes the monthly expense partitions before a cutoff out of the expense table (PostgreSQL): '
+        'detached and kept as expenses_archive_YYYY_MM tables, or exported to gzipped CSV and dropped'
+    )
+
+    def add_arguments(self, parser):
+        cutoff = parser.add_mutually_exclusive_group()
+        cutoff.add_argument('--before', type=date.fromisoformat,
+                            help='Archive months that end on or before this YYYY-MM-DD date')
+        cutoff.add_argument('--keep-months', type=int, default=DEFAULT_KEEP_MONTHS,
+                            help='Archive months before the last N, counting the current one')
+        parser.add_argument('--export-dir',
+                            help='Write each month to <dir>/expenses_YYYY_MM.csv.gz and drop its partition')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the months that would be archived')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError('The expense table is not partitioned; archiving requires PostgreSQL')
+        if options['before']:
+            cutoff = options['before']
+        else:
+            if options['keep_months'] < 1:
+                raise CommandError('--keep-months must be positive')
+            today = date.today()
+            index = today.year * 12 + today.month - options['keep_months']
+            cutoff = date(index // 12, index % 12 + 1, 1)
+        export_dir = options['export_dir']
+        if export_dir and not os.path.isdir(export_dir):
+            raise CommandError(f'Not a directory: {export_dir}')
+
+        months = [(month, name) for month, name in list_partitions() if next_month(month) <= cutoff]
+        if options['dry_run']:
+            for _, name in months:
+                self.stdout.write(f'Would archive {name}')
+            return
+        archived = 0
+        for month, name in months:
+            export_to = os.path.join(export_dir, f'expenses_{month:%Y_%m}.csv.gz') if export_dir else None
+            count = archive_partition(month, name, export_to=export_to)
+            archived += count
+            target = export_to or f'{ARCHIVE_PREFIX}{month:%Y_%m}'
+            self.stdout.write(f'Archived {name} ({count} expenses) to {target}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully archived {archived} expenses from {len(months)} months before {cutoff.isoformat()}'
+        ))
@@ -0,0 +1,230 @@
+import csv
+import json
+import os
+import re
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from expenses.loading import load_expenses
+from expenses.models import Expense, base_currency, currency_code
+
+OFX_FIELD = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+
+class RowError(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports expenses for --user from a CSV (description, amount, category, date and optional '
+        'currency columns) or OFX file, skipping rows that user already has with the same date, amount and description'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or OFX file to import')
+        parser.add_argument('--user', required=True, help='Username that will own the imported expenses')
+        parser.add_argument('--format', choices=['csv', 'ofx'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue from the checkpoint left by an interrupted run')
+        parser.add_argument('--checkpoint', help='Checkpoint file (default: <path>.checkpoint)')
+        parser.add_argument('--default-category', default='Other',
+                            help='Category for OFX transactions, which carry none')
+        parser.add_argument('--currency', help='Currency of rows without one (default: the base currency)')
+        parser.add_argument('--max-errors', type=int, default=20,
+                            help='How many invalid rows to print before only counting them')
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+        file_format = options['format'] or ('ofx' if path.lower().endswith('.ofx') else 'csv')
+        chunk_size = options['chunk_size']
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        self.owner_id = get_user_model().objects\
+            .filter(username=options['user'])\
+            .values_list('id', flat=True)\
+            .first()
+        if self.owner_id is None:
+            raise CommandError(f"Unknown user: {options['user']}")
+
+        self.categories = {choice for choice, _ in Expense.CATEGORY_CHOICES}
+        self.default_category = options['default_category']
+        if file_format == 'ofx' and self.default_category not in self.categories:
+            raise CommandError(f'Unknown category: {self.default_category}')
+        self.default_currency = options['currency'] or base_currency()
+        if not currency_code.regex.match(self.default_currency):
+            raise CommandError(f'Invalid currency: {self.default_currency}')
+        amount_field = Expense._meta.get_field('amount')
+        self.max_amount = Decimal(10) ** (amount_field.max_digits - amount_field.decimal_places)
+        self.quantum = Decimal(1).scaleb(-amount_field.decimal_places)
+        self.max_description = Expense._meta.get_field('description').max_length
+
+        stats = {'rows_done': 0, 'imported': 0, 'duplicates': 0, 'invalid': 0}
+        if options['resume']:
+            stats.update(self._read_checkpoint(checkpoint_path, path))
+            self.stdout.write(f"Resuming after {stats['rows_done']} rows")
+        resumed_from = stats['rows_done']
+
+        self.errors_shown, self.max_errors = 0, options['max_errors']
+        started = time.monotonic()
+        with open(path, newline='', encoding='utf-8-sig') as handle:
+            records = self._read_ofx(handle) if file_format == 'ofx' else self._read_csv(handle)
+            chunk = []
+            for line, record in records:
+                if line <= stats['rows_done']:
+                    continue
+                try:
+                    chunk.append(self._validate(record))
+                except RowError as e:
+                    stats['invalid'] += 1
+                    self._report_error(line, e)
+                stats['rows_done'] = line
+                if len(chunk) >= chunk_size:
+                    self._flush(chunk, stats, checkpoint_path, path, started, resumed_from)
+                    chunk = []
+            if chunk:
+                self._flush(chunk, stats, checkpoint_path, path, started, resumed_from)
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        elapsed = time.monotonic() - started
+        rate = (stats['rows_done'] - resumed_from) / max(elapsed, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['imported']} expenses in {elapsed:.1f}s ({rate:.0f} rows/sec, "
+            f"{stats['duplicates']} duplicates and {stats['invalid']} invalid rows skipped)"
+        ))
+
+    def _read_csv(self, handle):
+        reader = csv.DictReader(handle)
+        missing = {'description', 'amount', 'category', 'date'} - set(reader.fieldnames or [])
+        if missing:
+            raise CommandError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+        for line, row in enumerate(reader, start=1):
+            yield line, row
+
+    def _read_ofx(self, handle):
+        # Works for both SGML (unclosed tags) and XML flavoured OFX.
+        line, transaction = 0, None
+        for text in handle:
+            if '<STMTTRN>' in text:
+                transaction = {}
+            if transaction is not None:
+                for tag, value in OFX_FIELD.findall(text):
+                    transaction.setdefault(tag, value.strip())
+            if '</STMTTRN>' in text and transaction is not None:
+                line += 1
+                yield line, self._ofx_record(transaction)
+                transaction = None
+
+    def _ofx_record(self, transaction):
+        amount = transaction.get('TRNAMT', '')
+        posted = transaction.get('DTPOSTED', '')[:8]
+        record = {
+            'description': transaction.get('NAME') or transaction.get('MEMO', ''),
+            # Debits are negative in OFX; they are the expenses.
+            'amount': amount[1:] if amount.startswith('-') else amount,
+            'category': self.default_category,
+            'date': f'{posted[:4]}-{posted[4:6]}-{posted[6:8]}' if len(posted) == 8 else posted,
+        }
+        if amount and not amount.startswith('-'):
+            record['error'] = 'credit transactions are not expenses'
+        return record
+
+    def _validate(self, record):
+        if record.get('error'):
+            raise RowError(record['error'])
+
+        description = (record.get('description') or '').strip()
+        if not description or len(description) > self.max_description:
+            raise RowError(f'description must be 1-{self.max_description} characters')
+
+        category = (record.get('category') or '').strip()
+        if category not in self.categories:
+            raise RowError(f'unknown category {category!r}')
+
+        raw_amount = (record.get('amount') or '').strip()
+        try:
+            amount = Decimal(raw_amount)
+        except InvalidOperation:
+            raise RowError(f'invalid amount {raw_amount!r}')
+        if not amount.is_finite() or abs(amount) >= self.max_amount or amount != amount.quantize(self.quantum):
+            raise RowError(f'amount {raw_amount!r} does not fit DecimalField(10, 2)')
+
+        try:
+            day = date.fromisoformat((record.get('date') or '').strip())
+        except ValueError:
+            raise RowError(f"invalid date {record.get('date')!r}")
+
+        currency = (record.get('currency') or '').strip().upper() or self.default_currency
+        if not currency_code.regex.match(currency):
+            raise RowError(f'invalid currency {currency!r}')
+
+        return description, amount.quantize(self.quantum), category, day, currency
+
+    def _flush(self, chunk, stats, checkpoint_path, path, started, resumed_from):
+        rows = self._dedupe(chunk)
+        stats['duplicates'] += len(chunk) - len(rows)
+        by_currency = defaultdict(list)
+        for *row, currency in rows:
+            by_currency[currency].append((self.owner_id, *row))
+        for currency, currency_rows in by_currency.items():
+            stats['imported'] += load_expenses(currency_rows, currency)
+        self._write_checkpoint(checkpoint_path, path, stats)
+
+        rate = (stats['rows_done'] - resumed_from) / max(time.monotonic() - started, 1e-9)
+        self.stdout.write(
+            f"{stats['rows_done']} rows read, {stats['imported']} imported ({rate:.0f} rows/sec)"
+        )
+
+    def _dedupe(self, chunk):
+        """
+        Drop rows whose (date, amount, currency, description) the owner
+        already has or appear earlier in the chunk.
+        """
+        if not chunk:
+            return []
+        seen = set(
+            Expense.objects.filter(
+                owner_id=self.owner_id,
+                date__in={row[3] for row in chunk},
+                description__in={row[0] for row in chunk},
+            ).values_list('date', 'amount', 'currency', 'description')
+        )
+        rows = []
+        for row in chunk:
+            key = (row[3], row[1], row[4], row[0])
+            if key not in seen:
+                seen.add(key)
+                rows.append(row)
+        return rows
+
+    def _report_error(self, line, error):
+        if self.errors_shown < self.max_errors:
+            self.stderr.write(f'Row {line}: {error}')
+            self.errors_shown += 1
+
+    def _read_checkpoint(self, checkpoint_path, path):
+        try:
+            with open(checkpoint_path) as handle:
+                checkpoint = json.load(handle)
+        except FileNotFoundError:
+            raise CommandError(f'No checkpoint to resume from at {checkpoint_path}')
+        if checkpoint.get('path') != path or checkpoint.get('size') != os.path.getsize(path):
+            raise CommandError('Checkpoint belongs to a different or modified file')
+        if checkpoint.get('owner_id') != self.owner_id:
+            raise CommandError('Checkpoint belongs to an import for another user')
+        return {key: checkpoint[key] for key in ('rows_done', 'imported', 'duplicates', 'invalid')}
+
+    def _write_checkpoint(self, checkpoint_path, path, stats):
+        checkpoint = dict(stats, path=path, size=os.path.getsize(path), owner_id=self.owner_id,
+                          updated_at=datetime.now().isoformat())
+        temporary = f'{checkpoint_path}.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump(checkpoint, handle)
+        os.replace(temporary, checkpoint_path)
@@ -0,0 +1,75 @@
+import csv
+import os
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from expenses.fx import load_rates
+from expenses.models import FxRate, base_currency, currency_code
+
+
+class Command(BaseCommand):
+    help = (
+        'Loads historical exchange rates from a CSV with date, currency and rate columns, '
+        'replacing rates already loaded for the same currency and date'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file to load')
+        parser.add_argument('--quote', help='Currency the rates are quoted in (default: the base currency)')
+        parser.add_argument('--inverse', action='store_true',
+                            help='Rates are units of the currency per one unit of --quote, '
+                                 'as in ECB reference rates, rather than its value in --quote')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+        base = base_currency()
+        quote = (options['quote'] or base).upper()
+        if not currency_code.regex.match(quote):
+            raise CommandError(f'Invalid currency: {quote}')
+        places = Decimal(1).scaleb(-FxRate._meta.get_field('rate').decimal_places)
+
+        # Value of one unit of each currency in the quote currency, per date.
+        values = defaultdict(dict)
+        with open(path, newline='', encoding='utf-8-sig') as handle:
+            reader = csv.DictReader(handle)
+            missing = {'date', 'currency', 'rate'} - set(reader.fieldnames or [])
+            if missing:
+                raise CommandError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+            for line, row in enumerate(reader, start=1):
+                day, currency, rate = self._parse(line, row)
+                values[day][currency] = 1 / rate if options['inverse'] else rate
+
+        rows = []
+        for day, day_values in sorted(values.items()):
+            day_values[quote] = Decimal(1)
+            if base not in day_values:
+                raise CommandError(f'No {base} rate on {day}; rates quoted in {quote} need one to convert')
+            # Rebased to the base currency, whose own rate is always 1.
+            rows += [(currency, day, (value / day_values[base]).quantize(places))
+                     for currency, value in day_values.items() if currency != base]
+
+        loaded = load_rates(rows)
+        currencies = len({currency for currency, _, _ in rows})
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully loaded {loaded} rates for {currencies} currencies in {base}'
+        ))
+
+    def _parse(self, line, row):
+        try:
+            day = date.fromisoformat((row['date'] or '').strip())
+        except ValueError:
+            raise CommandError(f"Row {line}: invalid date {row['date']!r}")
+        currency = (row['currency'] or '').strip().upper()
+        if not currency_code.regex.match(currency):
+            raise CommandError(f"Row {line}: invalid currency {row['currency']!r}")
+        try:
+            rate = Decimal((row['rate'] or '').strip())
+        except InvalidOperation:
+            rate = None
+        if rate is None or not rate.is_finite() or rate <= 0:
+            raise CommandError(f"Row {line}: invalid rate {row['rate']!r}")
+        return day, currency, rate
@@ -0,0 +1,32 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from expenses.recurring import MATERIALIZE_BATCH_SIZE, materialize
+
+
+class Command(BaseCommand):
+    help = (
+        'Writes the due occurrences of every active recurring expense as expenses, '
+        'catching up any backlog; safe to run again or alongside another run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat,
+                            help='Write occurrences up to this YYYY-MM-DD date (default: today)')
+        parser.add_argument('--batch-size', type=int, default=MATERIALIZE_BATCH_SIZE,
+                            help='Schedules per transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        started = time.monotonic()
+
+        def progress(schedules, expenses):
+            self.stdout.write(f'{schedules} schedules, {expenses} expenses written')
+
+        schedules, expenses = materialize(options['date'], batch_size=options['batch_size'], progress=progress)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully materialized {expenses} expenses from {schedules} recurring expenses in {elapsed:.1f}s'
+        ))
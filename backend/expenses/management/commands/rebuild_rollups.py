@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from expenses.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the pre-aggregated expense rollups from the expense table'
+
+    def handle(self, *args, **options):
+        created = rebuild_rollups()
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt {created} expense rollups')
+        )
@@ -1,56 +1,58 @@
-from django.core.management.base import BaseCommand
-from expenses.models import Expense
-from decimal import Decimal
-from datetime import date, timedelta
+import time
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from expenses.synthetic import DEFAULT_CHUNK_SIZE, DEFAULT_DAYS, seed_expenses
+
 
 class Command(BaseCommand):
-    help = 'Seeds the database with demo expense data'
+    help = (
+        'Replaces all expenses with reproducible synthetic data: --users users (seed-user-N), '
+        'or the --user accounts, with --expenses expenses each, spread over --days days up to --end-date'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1)
+        parser.add_argument('--user', action='append', dest='usernames', metavar='USERNAME',
+                            help='Existing user to generate expenses for instead of seed users (repeatable)')
+        parser.add_argument('--expenses', type=int, default=200, help='Expenses per user')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--days', type=int, default=DEFAULT_DAYS)
+        parser.add_argument('--end-date', type=date.fromisoformat,
+                            help='Last day of the data as YYYY-MM-DD (default: today)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--append', action='store_true', help='Keep the existing expenses')
 
     def handle(self, *args, **options):
-        # Clear existing expenses
-        Expense.objects.all().delete()
-
-        # Demo expense data
-        expenses = [
-            {
-                'description': 'Monthly Rent',
-                'amount': Decimal('1200.00'),
-                'category': 'Housing',
-                'date': date.today() - timedelta(days=2)
-            },
-            {
-                'description': 'Grocery Shopping',
-                'amount': Decimal('85.50'),
-                'category': 'Food & Dining',
-                'date': date.today() - timedelta(days=1)
-            },
-            {
-                'description': 'Electric Bill',
-                'amount': Decimal('75.20'),
-                'category': 'Utilities',
-                'date': date.today() - timedelta(days=3)
-            },
-            {
-                'description': 'Movie Night',
-                'amount': Decimal('30.00'),
-                'category': 'Entertainment',
-                'date': date.today()
-            },
-            {
-                'description': 'Gas',
-                'amount': Decimal('45.00'),
-                'category': 'Transportation',
-                'date': date.today() - timedelta(days=1)
-            }
-        ]
-
-        # Create expenses
-        for expense_data in expenses:
-            Expense.objects.create(**expense_data)
-            self.stdout.write(
-                self.style.SUCCESS(f'Created expense: {expense_data["description"]}')
-            )
-
-        self.stdout.write(
-            self.style.SUCCESS('Successfully seeded demo expense data')
-        )
\ No newline at end of file
+        if options['users'] < 1 or options['expenses'] < 0 or options['days'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--users, --days and --chunk-size must be positive, --expenses not negative')
+
+        owner_ids = None
+        if options['usernames']:
+            users = get_user_model().objects\
+                .filter(username__in=options['usernames'])\
+                .values_list('username', 'id')
+            by_name = dict(users)
+            missing = [name for name in options['usernames'] if name not in by_name]
+            if missing:
+                raise CommandError(f"Unknown user(s): {', '.join(missing)}")
+            owner_ids = [by_name[name] for name in dict.fromkeys(options['usernames'])]
+
+        started = time.monotonic()
+
+        def progress(written):
+            rate = written / max(time.monotonic() - started, 1e-9)
+            self.stdout.write(f'{written} expenses written ({rate:.0f} rows/sec)')
+
+        written = seed_expenses(
+            options['users'], options['expenses'], seed=options['seed'], end=options['end_date'],
+            days=options['days'], chunk_size=options['chunk_size'], clear=not options['append'],
+            progress=progress, owner_ids=owner_ids,
+        )
+        elapsed = time.monotonic() - started
+        users = len(owner_ids) if owner_ids else options['users']
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {written} expenses for {users} users in {elapsed:.1f}s "
+            f"({written / max(elapsed, 1e-9):.0f} rows/sec, rollups included)"
+        ))
@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-17 07:21
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth, TruncWeek, TruncYear
+
+
+def backfill_rollups(apps, schema_editor):
+    Expense = apps.get_model('expenses', 'Expense')
+    ExpenseRollup = apps.get_model('expenses', 'ExpenseRollup')
+    truncations = {'week': TruncWeek, 'month': TruncMonth, 'year': TruncYear}
+    for granularity, truncation in truncations.items():
+        groups = Expense.objects.order_by()\
+            .annotate(period=truncation('date'))\
+            .values('period', 'category')\
+            .annotate(total=Sum('amount'), count=Count('id'))
+        ExpenseRollup.objects.bulk_create(
+            ExpenseRollup(granularity=granularity, **group) for group in groups
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0002_alter_expense_category'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('week', 'Week'), ('month', 'Month'), ('year', 'Year')], max_length=10)),
+                ('period', models.DateField()),
+                ('category', models.CharField(choices=[('Food & Dining', 'Food & Dining'), ('Transportation', 'Transportation'), ('Utilities', 'Utilities'), ('Housing', 'Housing'), ('Entertainment', 'Entertainment'), ('Healthcare', 'Healthcare'), ('Shopping', 'Shopping'), ('Personal Care', 'Personal Care'), ('Education', 'Education'), ('Travel', 'Travel'), ('Other', 'Other')], max_length=50)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['granularity', 'period', 'category'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='expenserollup',
+            constraint=models.UniqueConstraint(fields=('granularity', 'period', 'category'), name='unique_expense_rollup'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
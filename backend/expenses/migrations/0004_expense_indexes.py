@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-17 08:02
+
+from django.db import migrations, models
+
+
+def create_trigram_index(apps, schema_editor):
+    # Serves ExpenseFilter.description (icontains -> ILIKE '%x%'); PostgreSQL only.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS expense_description_trgm_idx '
+        'ON expenses_expense USING gin (description gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS expense_description_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0003_expenserollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['date', 'id'], name='expense_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['category', 'date'], include=('amount',), name='expense_category_date_idx'),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
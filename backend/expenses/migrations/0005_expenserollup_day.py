@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-17 07:47
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_day_rollups(apps, schema_editor):
+    Expense = apps.get_model('expenses', 'Expense')
+    ExpenseRollup = apps.get_model('expenses', 'ExpenseRollup')
+    groups = Expense.objects.order_by()\
+        .values('date', 'category')\
+        .annotate(total=Sum('amount'), count=Count('id'))
+    ExpenseRollup.objects.bulk_create(
+        [ExpenseRollup(granularity='day', period=group.pop('date'), **group) for group in groups],
+        batch_size=5000,
+    )
+
+
+def remove_day_rollups(apps, schema_editor):
+    apps.get_model('expenses', 'ExpenseRollup').objects.filter(granularity='day').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0004_expense_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='expenserollup',
+            name='granularity',
+            field=models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month'), ('year', 'Year')], max_length=10),
+        ),
+        migrations.RunPython(backfill_day_rollups, remove_day_rollups),
+    ]
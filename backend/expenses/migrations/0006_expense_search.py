@@ -0,0 +1,62 @@
+# Generated by Django 4.2 on 2026-10-17 09:15
+
+from django.db import migrations
+
+# SQLite migrations that rebuild expenses_expense (most AlterField
+# operations do) drop these triggers; such migrations must recreate them.
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE expenses_expense_fts USING fts5("
+    "description, content='expenses_expense', content_rowid='id', "
+    "tokenize='porter unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER expenses_expense_fts_insert AFTER INSERT ON expenses_expense BEGIN "
+    "INSERT INTO expenses_expense_fts(rowid, description) VALUES (new.id, new.description); END",
+    "CREATE TRIGGER expenses_expense_fts_delete AFTER DELETE ON expenses_expense BEGIN "
+    "INSERT INTO expenses_expense_fts(expenses_expense_fts, rowid, description) "
+    "VALUES ('delete', old.id, old.description); END",
+    "CREATE TRIGGER expenses_expense_fts_update AFTER UPDATE OF description ON expenses_expense BEGIN "
+    "INSERT INTO expenses_expense_fts(expenses_expense_fts, rowid, description) "
+    "VALUES ('delete', old.id, old.description); "
+    "INSERT INTO expenses_expense_fts(rowid, description) VALUES (new.id, new.description); END",
+    "INSERT INTO expenses_expense_fts(expenses_expense_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS expenses_expense_fts_insert',
+    'DROP TRIGGER IF EXISTS expenses_expense_fts_delete',
+    'DROP TRIGGER IF EXISTS expenses_expense_fts_update',
+    'DROP TABLE IF EXISTS expenses_expense_fts',
+]
+
+POSTGRESQL_FORWARD = [
+    # Generated, so the database keeps it current on every write path.
+    "ALTER TABLE expenses_expense ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', coalesce(description, ''))) STORED",
+    'CREATE INDEX expense_search_vector_idx ON expenses_expense USING gin (search_vector)',
+]
+
+POSTGRESQL_BACKWARD = [
+    'DROP INDEX IF EXISTS expense_search_vector_idx',
+    'ALTER TABLE expenses_expense DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for statement in statements.get(vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0005_expenserollup_day'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run_for_vendor({'postgresql': POSTGRESQL_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 4.2 on 2026-10-17 08:34
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek, TruncYear
+import django.db.models.deletion
+from importlib import import_module
+
+search_migration = import_module('expenses.migrations.0006_expense_search')
+
+TRUNCATIONS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth, 'year': TruncYear}
+
+
+def assign_owner(apps, schema_editor):
+    """
+    Give every existing expense to the oldest superuser (or the oldest user,
+    if there is no superuser) and rebuild the rollups per owner. Without any
+    user the rows stay unowned, which the API never shows.
+    """
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Expense = apps.get_model('expenses', 'Expense')
+    ExpenseRollup = apps.get_model('expenses', 'ExpenseRollup')
+
+    owner_id = User.objects.filter(is_superuser=True).order_by('date_joined', 'pk')\
+        .values_list('pk', flat=True).first()
+    if owner_id is None:
+        owner_id = User.objects.order_by('date_joined', 'pk').values_list('pk', flat=True).first()
+    if owner_id is not None:
+        Expense.objects.filter(owner__isnull=True).update(owner_id=owner_id)
+
+    ExpenseRollup.objects.all().delete()
+    for granularity, truncation in TRUNCATIONS.items():
+        groups = Expense.objects.order_by()\
+            .annotate(period=truncation('date'))\
+            .values('owner_id', 'period', 'category')\
+            .annotate(total=Sum('amount'), count=Count('id'))
+        ExpenseRollup.objects.bulk_create(
+            [ExpenseRollup(granularity=granularity, **group) for group in groups],
+            batch_size=5000,
+        )
+
+
+def merge_rollups(apps, schema_editor):
+    # Going back to one rollup row per (granularity, period, category).
+    Expense = apps.get_model('expenses', 'Expense')
+    ExpenseRollup = apps.get_model('expenses', 'ExpenseRollup')
+    ExpenseRollup.objects.all().delete()
+    for granularity, truncation in TRUNCATIONS.items():
+        groups = Expense.objects.order_by()\
+            .annotate(period=truncation('date'))\
+            .values('period', 'category')\
+            .annotate(total=Sum('amount'), count=Count('id'))
+        ExpenseRollup.objects.bulk_create(
+            [ExpenseRollup(granularity=granularity, **group) for group in groups],
+            batch_size=5000,
+        )
+
+
+def restore_search_index(apps, schema_editor):
+    # Removing the owner column rebuilds expenses_expense on SQLite, which
+    # drops the FTS triggers; recreate them and the index.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in search_migration.SQLITE_BACKWARD + search_migration.SQLITE_FORWARD:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('expenses', '0006_expense_search'),
+    ]
+
+    # Nullable columns are added with ALTER TABLE on SQLite too, so the
+    # expense table is not rebuilt and the FTS triggers from 0006 survive.
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_search_index),
+        migrations.AddField(
+            model_name='expense',
+            name='owner',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='expenses', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='expenserollup',
+            name='owner',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RemoveConstraint(
+            model_name='expenserollup',
+            name='unique_expense_rollup',
+        ),
+        migrations.RunPython(assign_owner, merge_rollups),
+        migrations.AddConstraint(
+            model_name='expenserollup',
+            constraint=models.UniqueConstraint(fields=('owner', 'granularity', 'period', 'category'), name='unique_owner_expense_rollup'),
+        ),
+        migrations.AlterModelOptions(
+            name='expenserollup',
+            options={'ordering': ['owner', 'granularity', 'period', 'category']},
+        ),
+        migrations.RemoveIndex(
+            model_name='expense',
+            name='expense_date_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='expense',
+            name='expense_category_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['owner', '-date', '-id'], name='expense_owner_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['owner', 'category', 'date'], include=('amount',), name='expense_owner_cat_date_idx'),
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 4.2 on 2026-10-17 11:02
+
+from datetime import date
+
+from django.db import migrations
+
+TABLE = 'expenses_expense'
+DEFAULT_PARTITION = 'expenses_expense_default'
+# Partitions created ahead of today; later months are created on first write.
+MONTHS_AHEAD = 3
+
+
+def next_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def rebuild_table(schema_editor, partitioned):
+    """
+    Copy expenses_expense into a new table, partitioned by month on `date`
+    or not, and swap it in, keeping the column definitions, sequence,
+    foreign keys and index names.
+    """
+    execute, quote = schema_editor.execute, schema_editor.quote_name
+    new = f'{TABLE}_rebuilt'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype IN ('p', 'f')", [TABLE],
+        )
+        constraints = cursor.fetchall()
+        primary_key = next(name for name, kind, _ in constraints if kind == 'p')
+        cursor.execute(
+            'SELECT indexname, indexdef FROM pg_indexes '
+            'WHERE schemaname = current_schema() AND tablename = %s AND indexname <> %s',
+            [TABLE, primary_key],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            'SELECT column_name FROM information_schema.columns '
+            "WHERE table_schema = current_schema() AND table_name = %s AND is_generated = 'NEVER' "
+            'ORDER BY ordinal_position', [TABLE],
+        )
+        columns = ', '.join(quote(name) for name, in cursor.fetchall())
+        cursor.execute(f'SELECT min(date), max(date) FROM {quote(TABLE)}')
+        first, last = cursor.fetchone()
+
+    execute(
+        f'CREATE TABLE {quote(new)} (LIKE {quote(TABLE)} INCLUDING ALL EXCLUDING INDEXES)'
+        + (' PARTITION BY RANGE (date)' if partitioned else '')
+    )
+    if partitioned:
+        today = date.today().replace(day=1)
+        month = min(first or today, today).replace(day=1)
+        end = max(last or today, today).replace(day=1)
+        for _ in range(MONTHS_AHEAD):
+            end = next_month(end)
+        while month <= end:
+            execute(
+                f'CREATE TABLE {quote(f"{TABLE}_p{month:%Y_%m}")} PARTITION OF {quote(new)} '
+                f'FOR VALUES FROM (%s) TO (%s)', [month.isoformat(), next_month(month).isoformat()],
+            )
+            month = next_month(month)
+        execute(f'CREATE TABLE {quote(DEFAULT_PARTITION)} PARTITION OF {quote(new)} DEFAULT')
+
+    execute(f'INSERT INTO {quote(new)} ({columns}) SELECT {columns} FROM {quote(TABLE)}')
+    # LIKE copies an identity column with a fresh sequence; move it past the
+    # copied ids. A serial column's sequence stays and moves to the new table.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s), pg_get_serial_sequence(%s, %s)',
+                       [TABLE, 'id', new, 'id'])
+        old_sequence, new_sequence = cursor.fetchone()
+    if new_sequence:
+        execute(f'SELECT setval(%s, coalesce(max(id), 0) + 1, false) FROM {quote(new)}', [new_sequence])
+    else:
+        execute(f'ALTER SEQUENCE {old_sequence} OWNED BY {quote(new)}.id')
+
+    execute(f'DROP TABLE {quote(TABLE)}')
+    execute(f'ALTER TABLE {quote(new)} RENAME TO {quote(TABLE)}')
+    # A partitioned table's primary key must contain the partition key.
+    execute(
+        f'ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(primary_key)} '
+        f'PRIMARY KEY ({"id, date" if partitioned else "id"})'
+    )
+    for name, kind, definition in constraints:
+        if kind == 'f':
+            execute(f'ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(name)} {definition}')
+    for name, definition in indexes:
+        # Partitioned indexes are reported as "ON ONLY"; recreate them on every partition.
+        execute(definition.replace(' ON ONLY ', ' ON ', 1))
+    execute(f'ANALYZE {quote(TABLE)}')
+
+
+def partition(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        rebuild_table(schema_editor, partitioned=True)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        rebuild_table(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0007_expense_owner'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2 on 2026-10-17 09:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from importlib import import_module
+
+search_migration = import_module('expenses.migrations.0006_expense_search')
+
+
+def restore_search_index(apps, schema_editor):
+    # SQLite adds a plain unique constraint, and drops the recurring FK
+    # column, by rebuilding expenses_expense, which drops the FTS triggers;
+    # recreate them and the index.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in search_migration.SQLITE_BACKWARD + search_migration.SQLITE_FORWARD:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('expenses', '0008_partition_expense'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_search_index),
+        migrations.CreateModel(
+            name='RecurringExpense',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.CharField(max_length=200)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('category', models.CharField(choices=[('Food & Dining', 'Food & Dining'), ('Transportation', 'Transportation'), ('Utilities', 'Utilities'), ('Housing', 'Housing'), ('Entertainment', 'Entertainment'), ('Healthcare', 'Healthcare'), ('Shopping', 'Shopping'), ('Personal Care', 'Personal Care'), ('Education', 'Education'), ('Travel', 'Travel'), ('Other', 'Other')], max_length=50)),
+                ('frequency', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly'), ('yearly', 'Yearly')], max_length=10)),
+                ('interval', models.PositiveIntegerField(default=1)),
+                ('start_date', models.DateField()),
+                ('until', models.DateField(blank=True, null=True)),
+                ('count', models.PositiveIntegerField(blank=True, null=True)),
+                ('active', models.BooleanField(default=True)),
+                ('next_date', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['owner', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='recurringexpense',
+            name='owner',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recurring_expenses', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='recurring',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='expenses', to='expenses.recurringexpense'),
+        ),
+        migrations.AddConstraint(
+            model_name='expense',
+            constraint=models.UniqueConstraint(fields=('recurring', 'date'), name='unique_recurring_occurrence'),
+        ),
+        migrations.RunPython(restore_search_index, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recurringexpense',
+            index=models.Index(fields=['owner', 'id'], name='recurring_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringexpense',
+            index=models.Index(condition=models.Q(('active', True)), fields=['next_date', 'id'], name='recurring_due_idx'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2 on 2026-10-17 09:16
+
+import django.core.validators
+from django.db import migrations, models
+import expenses.models
+from importlib import import_module
+
+search_migration = import_module('expenses.migrations.0006_expense_search')
+
+
+def restore_search_index(apps, schema_editor):
+    # SQLite adds the currency column by rebuilding expenses_expense, which
+    # drops the FTS triggers; recreate them and the index.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in search_migration.SQLITE_BACKWARD + search_migration.SQLITE_FORWARD:
+        schema_editor.execute(statement)
+
+
+def set_database_default(apps, schema_editor):
+    # Django drops the column default once existing rows are filled in; keep
+    # one on PostgreSQL so raw INSERTs that predate currencies still work.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'ALTER TABLE expenses_expense ALTER COLUMN currency SET DEFAULT %s',
+        [expenses.models.base_currency()],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0009_recurring_expense'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FxRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3, validators=[django.core.validators.RegexValidator('^[A-Z]{3}$', 'Enter a three-letter ISO 4217 currency code, e.g. EUR.')])),
+                ('date', models.DateField()),
+                ('rate', models.DecimalField(decimal_places=10, max_digits=20)),
+            ],
+            options={
+                'ordering': ['currency', 'date'],
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='expenserollup',
+            options={'ordering': ['owner', 'granularity', 'period', 'category', 'currency']},
+        ),
+        migrations.RemoveConstraint(
+            model_name='expenserollup',
+            name='unique_owner_expense_rollup',
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restore_search_index),
+        migrations.AddField(
+            model_name='expense',
+            name='currency',
+            field=models.CharField(default=expenses.models.base_currency, max_length=3, validators=[django.core.validators.RegexValidator('^[A-Z]{3}$', 'Enter a three-letter ISO 4217 currency code, e.g. EUR.')]),
+        ),
+        migrations.RunPython(restore_search_index, migrations.RunPython.noop),
+        migrations.RunPython(set_database_default, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='expenserollup',
+            name='currency',
+            field=models.CharField(default=expenses.models.base_currency, max_length=3, validators=[django.core.validators.RegexValidator('^[A-Z]{3}$', 'Enter a three-letter ISO 4217 currency code, e.g. EUR.')]),
+        ),
+        migrations.AddField(
+            model_name='recurringexpense',
+            name='currency',
+            field=models.CharField(default=expenses.models.base_currency, max_length=3, validators=[django.core.validators.RegexValidator('^[A-Z]{3}$', 'Enter a three-letter ISO 4217 currency code, e.g. EUR.')]),
+        ),
+        migrations.AddConstraint(
+            model_name='expenserollup',
+            constraint=models.UniqueConstraint(fields=('owner', 'granularity', 'period', 'category', 'currency'), name='unique_owner_expense_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='fxrate',
+            constraint=models.UniqueConstraint(fields=('currency', 'date'), name='unique_fx_rate'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2 on 2026-10-17 09:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0010_expense_currency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataGeneration',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('generation', models.BigIntegerField()),
+            ],
+        ),
+    ]
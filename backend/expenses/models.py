@@ -1,5 +1,16 @@
+import time
+
+from django.conf import settings
+from django.core.validators import RegexValidator
 from django.db import models
 
+currency_code = RegexValidator(r'^[A-Z]{3}$', 'Enter a three-letter ISO 4217 currency code, e.g. EUR.')
+
+
+def base_currency():
+    return settings.EXPENSES_BASE_CURRENCY
+
+
 class Expense(models.Model):
     CATEGORY_CHOICES = [
         ('Food & Dining', 'Food & Dining'),
@@ -15,14 +26,174 @@ class Expense(models.Model):
         ('Other', 'Other'),
     ]
 
+    # Nullable only for rows that predate ownership; the API never shows
+    # unowned expenses. The owner-leading indexes below make the FK's own
+    # index redundant.
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True,
+                              related_name='expenses', db_index=False)
     description = models.CharField(max_length=200)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, default=base_currency, validators=[currency_code])
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES)
     date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set on expenses materialized from a recurring expense; see expenses.recurring.
+    recurring = models.ForeignKey('RecurringExpense', on_delete=models.SET_NULL, null=True, blank=True,
+                                  related_name='expenses', db_index=False)
 
     class Meta:
         ordering = ['-date']
+        # Every API query is scoped to one owner, so each index leads with
+        # it: a user's requests only ever touch their own index range.
+        indexes = [
+            # List ordering and keyset pagination on (-date, -id), date ranges.
+            models.Index(fields=['owner', '-date', '-id'], name='expense_owner_date_id_idx'),
+            # Category filters; INCLUDE lets PostgreSQL answer category/date
+            # aggregates from the index alone (ignored on other databases).
+            models.Index(fields=['owner', 'category', 'date'], include=['amount'],
+                         name='expense_owner_cat_date_idx'),
+        ]
+        constraints = [
+            # One expense per occurrence, however many materialization runs
+            # overlap. Includes the partition key, as PostgreSQL requires.
+            models.UniqueConstraint(fields=['recurring', 'date'], name='unique_recurring_occurrence'),
+        ]
 
     def __str__(self):
         return f"{self.description} - {self.amount}"
+
+
+class ExpenseRollup(models.Model):
+    """Pre-aggregated expense totals per period and category.
+
+    Rows are kept per owner and currency (summaries convert them; see
+    `expenses.fx`), maintained incrementally by `expenses.rollups` whenever
+    an expense is created, updated or deleted, and can be rebuilt from
+    scratch with the `rebuild_rollups` management command.
+    """
+    GRANULARITY_CHOICES = [
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('month', 'Month'),
+        ('year', 'Year'),
+    ]
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True,
+                              related_name='+', db_index=False)
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    period = models.DateField()
+    category = models.CharField(max_length=50, choices=Expense.CATEGORY_CHOICES)
+    currency = models.CharField(max_length=3, default=base_currency, validators=[currency_code])
+    total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['owner', 'granularity', 'period', 'category', 'currency']
+        constraints = [
+            # Also the index summaries read through: owner and granularity first.
+            models.UniqueConstraint(
+                fields=['owner', 'granularity', 'period', 'category', 'currency'],
+                name='unique_owner_expense_rollup',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.granularity} {self.period} {self.category} - {self.total} {self.currency}"
+
+
+class RecurringExpense(models.Model):
+    """An expense that repeats on an RRULE-like schedule.
+
+    Occurrences fall every `interval` days, weeks, months or years from
+    `start_date`, until `until` or for `count` occurrences. Monthly and
+    yearly schedules keep the start date's day, moved back to the month's
+    last day where it has fewer days (rent due on the 31st is due on
+    30 April). `expenses.recurring` materializes due occurrences into
+    expenses; `next_date`, the next occurrence to write, is its cursor,
+    null once the schedule has ended.
+    """
+    DAILY = 'daily'
+    WEEKLY = 'weekly'
+    MONTHLY = 'monthly'
+    YEARLY = 'yearly'
+    FREQUENCY_CHOICES = [
+        (DAILY, 'Daily'),
+        (WEEKLY, 'Weekly'),
+        (MONTHLY, 'Monthly'),
+        (YEARLY, 'Yearly'),
+    ]
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                              related_name='recurring_expenses', db_index=False)
+    description = models.CharField(max_length=200)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, default=base_currency, validators=[currency_code])
+    category = models.CharField(max_length=50, choices=Expense.CATEGORY_CHOICES)
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES)
+    interval = models.PositiveIntegerField(default=1)
+    start_date = models.DateField()
+    until = models.DateField(null=True, blank=True)
+    count = models.PositiveIntegerField(null=True, blank=True)
+    active = models.BooleanField(default=True)
+    next_date = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['owner', 'id']
+        indexes = [
+            models.Index(fields=['owner', 'id'], name='recurring_owner_idx'),
+            # Materialization scans the due schedules in next_date order.
+            models.Index(fields=['next_date', 'id'], condition=models.Q(active=True),
+                         name='recurring_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.description} - {self.amount} ({self.frequency})"
+
+
+class FxRate(models.Model):
+    """The value of one unit of `currency` in the base currency on `date`.
+
+    A rate holds from its date until the currency's next one, so weekends
+    and holidays use the last published rate. The base currency
+    (EXPENSES_BASE_CURRENCY) has no rows; its rate is always 1. Loaded with
+    the `load_fx_rates` management command; see `expenses.fx`.
+    """
+    currency = models.CharField(max_length=3, validators=[currency_code])
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=20, decimal_places=10)
+
+    class Meta:
+        ordering = ['currency', 'date']
+        constraints = [
+            # Also the index the latest-rate-on-or-before lookups read.
+            models.UniqueConstraint(fields=['currency', 'date'], name='unique_fx_rate'),
+        ]
+
+    def __str__(self):
+        return f"{self.currency} {self.date} - {self.rate}"
+
+
+class DataGeneration(models.Model):
+    """The version of data that cached responses are derived from.
+
+    One row per user (`user:<id>`, see `expenses.cache`) and one for the
+    exchange rates (`fx`, see `expenses.fx`). The generation is the
+    time_ns() of the last change and is written in the transaction making
+    it, so every web worker, job runner and management command agrees on it.
+    """
+    key = models.CharField(max_length=40, primary_key=True)
+    generation = models.BigIntegerField()
+
+    @classmethod
+    def bump(cls, keys):
+        """Replace the generation of `keys` with the current time, in the current transaction."""
+        generation = time.time_ns()
+        # Sorted, so concurrent writers lock the rows in the same order.
+        cls.objects.bulk_create(
+            [cls(key=key, generation=generation) for key in sorted(keys)],
+            update_conflicts=True, unique_fields=['key'], update_fields=['generation'],
+        )
+
+    def __str__(self):
+        return f"{self.key} @ {self.generation}"
@@ -0,0 +1,119 @@
+import base64
+from datetime import date
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ExpenseKeysetPagination(BasePagination):
+    """
+    Opt-in keyset (cursor) pagination ordered on (-date, -id).
+
+    Pagination is only enabled when the client sends `page_size` or `cursor`,
+    so the plain list keeps returning every row. The `next` link carries an
+    opaque cursor holding the (date, id) of the last row served; the next page
+    is a range scan that starts right after it, which keeps the cost of a page
+    the same no matter how deep the client has scrolled.
+
+    Pages may hold model instances or `.values()` dicts carrying `date` and `id`.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    default_page_size = 50
+    max_page_size = 500
+    ordering = ('-date', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_enabled(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_enabled(request):
+            return None
+        return self._set_page(list(self._page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async variant of paginate_queryset for the ASGI views."""
+        if not self.is_enabled(request):
+            return None
+        return self._set_page([row async for row in self._page_queryset(queryset, request)])
+
+    def _page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            last_date, last_id = position
+            # Equivalent to (date, id) < (last_date, last_id); the leading
+            # `date <= last_date` bound lets the database seek into the
+            # (date, id) ordering instead of filtering from the start.
+            queryset = queryset.filter(date__lte=last_date).filter(
+                Q(date__lt=last_date) | Q(id__lt=last_id)
+            )
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.default_page_size
+        if page_size <= 0:
+            return self.default_page_size
+        return min(page_size, self.max_page_size)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        if isinstance(last, dict):
+            last_date, last_id = last['date'], last['id']
+        else:
+            last_date, last_id = last.date, last.id
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(last_date, last_id)
+        )
+
+    def encode_cursor(self, last_date, last_id):
+        raw = f'{last_date.isoformat()}|{last_id}'.encode('ascii')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            last_date, last_id = raw.split('|')
+            return date.fromisoformat(last_date), int(last_id)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
@@ -0,0 +1,201 @@
+"""
+Monthly range partitions of the expense table on PostgreSQL.
+
+Migration 0008 turns `expenses_expense` into a table partitioned by `date`,
+with one partition per calendar month (`expenses_expense_p2024_01` holds
+January 2024) and a DEFAULT partition for anything else. The primary key
+becomes (id, date), as PostgreSQL requires the partition key in it; ids
+still come from the one sequence, so Django keeps treating `id` as the key
+and the ORM is unchanged. Queries filtered on `date` (ExpenseFilter's
+min_date/max_date, keyset pages, the timeseries) are pruned by the planner
+to the months they cover.
+
+Partitions are created on demand: every write path (`save()`, the bulk
+serializers, `insert_expense_rows`) calls `ensure_partitions` with the
+dates it is about to write. A missing month is created as a standalone
+table, filled with that month's rows from the DEFAULT partition if raw SQL
+put any there, and attached, which does not block reads or writes on the
+other partitions. Each process remembers the months it has seen, so the
+common case costs no query.
+
+`archive_expenses` detaches the partitions of old months (see
+`archive_partition`). On other databases every function here is a no-op.
+"""
+import gzip
+import re
+import threading
+from datetime import date
+
+from django.db import connection, transaction
+
+from .models import Expense
+from .rollups import apply_expense_rows
+
+DEFAULT_PARTITION = 'expenses_expense_default'
+ARCHIVE_PREFIX = 'expenses_archive_'
+PARTITION_NAME = re.compile(r'^expenses_expense_p(\d{4})_(\d{2})$')
+# Serialises partition creation across processes (any constant works).
+LOCK_ID = 80220417
+
+_known_months = None
+_partitioned = None
+_lock = threading.Lock()
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def partition_name(month):
+    return f'expenses_expense_p{month:%Y_%m}'
+
+
+def is_partitioned():
+    """Whether the expense table is partitioned (PostgreSQL after migration 0008)."""
+    global _partitioned
+    if connection.vendor != 'postgresql':
+        return False
+    if _partitioned is None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)',
+                [Expense._meta.db_table],
+            )
+            _partitioned = cursor.fetchone() is not None
+    return _partitioned
+
+
+def list_partitions():
+    """[(month, table name)] of the attached monthly partitions, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(%s)',
+            [Expense._meta.db_table],
+        )
+        names = [name for name, in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((date(int(match[1]), int(match[2]), 1), name))
+    return sorted(partitions)
+
+
+def forget_partitions():
+    """Drop this process's view of the partitions; the next write re-reads it."""
+    global _known_months, _partitioned
+    with _lock:
+        _known_months = None
+        _partitioned = None
+
+
+def _remember(month):
+    with _lock:
+        if _known_months is not None:
+            _known_months.add(month)
+
+
+def ensure_partitions(dates):
+    """Create the monthly partitions the given dates fall into, if missing."""
+    global _known_months
+    if not is_partitioned():
+        return
+    months = {month_start(day) for day in dates if day is not None}
+    with _lock:
+        missing = None if _known_months is None else months - _known_months
+    if missing is None:
+        known = {month for month, _ in list_partitions()}
+        with _lock:
+            _known_months = known
+        missing = months - known
+    for month in sorted(missing):
+        create_partition(month)
+
+
+def _columns(cursor, table):
+    # Generated columns (search_vector) are computed on insert, never copied.
+    cursor.execute(
+        'SELECT column_name FROM information_schema.columns '
+        "WHERE table_schema = current_schema() AND table_name = %s AND is_generated = 'NEVER' "
+        'ORDER BY ordinal_position',
+        [table],
+    )
+    return ', '.join(connection.ops.quote_name(name) for name, in cursor.fetchall())
+
+
+def create_partition(month):
+    """Create and attach the partition for `month`, moving its rows out of the DEFAULT partition."""
+    quote = connection.ops.quote_name
+    table, name = Expense._meta.db_table, partition_name(month)
+    bounds = [month.isoformat(), next_month(month).isoformat()]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [LOCK_ID])
+        cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [name])
+        if not cursor.fetchone()[0]:
+            # Built standalone and attached, rather than CREATE TABLE ...
+            # PARTITION OF, which would lock the whole table until commit.
+            cursor.execute(
+                f'CREATE TABLE {quote(name)} (LIKE {quote(table)} INCLUDING DEFAULTS '
+                f'INCLUDING CONSTRAINTS INCLUDING GENERATED INCLUDING STORAGE)'
+            )
+            cursor.execute(
+                f'ALTER TABLE {quote(name)} ADD CONSTRAINT {quote(name + "_range")} '
+                f'CHECK (date >= %s AND date < %s)', bounds,
+            )
+            columns = _columns(cursor, table)
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM {quote(DEFAULT_PARTITION)} WHERE date >= %s AND date < %s '
+                f'RETURNING {columns}) INSERT INTO {quote(name)} ({columns}) SELECT {columns} FROM moved',
+                bounds,
+            )
+            cursor.execute(
+                f'ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)',
+                bounds,
+            )
+            # The partition constraint now does the CHECK's job.
+            cursor.execute(f'ALTER TABLE {quote(name)} DROP CONSTRAINT {quote(name + "_range")}')
+        transaction.on_commit(lambda: _remember(month))
+    return name
+
+
+def archive_partition(month, name, export_to=None):
+    """
+    Take the partition of `month` out of the expense table and return the
+    number of rows it held. Its expenses are subtracted from the rollups.
+    The partition is detached and renamed to expenses_archive_YYYY_MM,
+    queryable but invisible to the API; with `export_to` (a path) its rows
+    are written there as gzipped CSV instead and the table is dropped.
+    """
+    quote = connection.ops.quote_name
+    table = Expense._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Blocks writes to the month until it is detached, so nothing lands in
+        # it after it was counted and exported.
+        cursor.execute(f'LOCK TABLE {quote(name)} IN SHARE MODE')
+        rows = Expense.objects\
+            .filter(date__gte=month, date__lt=next_month(month))\
+            .values_list('owner_id', 'date', 'category', 'amount', 'currency')\
+            .iterator(chunk_size=10000)
+        apply_expense_rows(rows, sign=-1)
+        cursor.execute(f'SELECT count(*) FROM {quote(name)}')
+        count = cursor.fetchone()[0]
+        if export_to is not None:
+            with gzip.open(export_to, 'wt', newline='') as handle:
+                cursor.copy_expert(
+                    f'COPY (SELECT {_columns(cursor, table)} FROM {quote(name)} ORDER BY id) '
+                    f'TO STDOUT WITH (FORMAT csv, HEADER)',
+                    handle,
+                )
+        cursor.execute(f'ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}')
+        if export_to is not None:
+            cursor.execute(f'DROP TABLE {quote(name)}')
+        else:
+            cursor.execute(f'ALTER TABLE {quote(name)} RENAME TO {quote(f"{ARCHIVE_PREFIX}{month:%Y_%m}")}')
+    forget_partitions()
+    return count
@@ -0,0 +1,163 @@
+"""
+Materializing recurring expenses.
+
+Each RecurringExpense carries a cursor, `next_date`: the date of its next
+unwritten occurrence. Occurrence n is computed directly from the start date
+(`occurrence()`), not by stepping from the previous one, so monthly dates
+never drift: a schedule starting
+on 31 January falls on the last day of February, 31 March, 30 April, ...
+
+`materialize()` works through the due schedules (active, `next_date` on or
+before the target day) in batches. For each batch, in one transaction, it:
+
+- locks the schedules, skipping ones another run has locked;
+- computes all their occurrences up to the target day;
+- drops those already written;
+- inserts the rest with multi-row INSERTs (`insert_occurrence_rows`; like
+  `insert_expense_rows`, it skips building model instances);
+- applies their rollups with one batch of deltas;
+- moves the cursors, with one UPDATE per distinct new `next_date`.
+
+The unique (recurring, date) constraint backs this up: the INSERTs skip
+conflicting occurrences (ON CONFLICT DO NOTHING), so overlapping runs never
+write one twice. Catching up a long backlog costs a few queries per batch,
+not per schedule or per occurrence.
+"""
+import calendar
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .loading import insert_occurrence_rows
+from .models import Expense, RecurringExpense
+from .rollups import apply_expense_rows
+
+MATERIALIZE_BATCH_SIZE = 1000
+
+
+def add_months(day, months):
+    """`day` moved by `months`, clamped to the end of shorter months."""
+    index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(index, 12)
+    return day.replace(year=year, month=month + 1, day=min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def occurrence(frequency, interval, start, n):
+    """Date of occurrence `n` (0 for the start date) of a schedule."""
+    if frequency == RecurringExpense.DAILY:
+        return start + timedelta(days=n * interval)
+    if frequency == RecurringExpense.WEEKLY:
+        return start + timedelta(weeks=n * interval)
+    if frequency == RecurringExpense.MONTHLY:
+        return add_months(start, n * interval)
+    return add_months(start, 12 * n * interval)
+
+
+def _periods_between(frequency, start, day):
+    # Whole days, weeks, months or years from start to day, possibly one too many.
+    if frequency == RecurringExpense.DAILY:
+        return (day - start).days
+    if frequency == RecurringExpense.WEEKLY:
+        return (day - start).days // 7
+    months = (day.year - start.year) * 12 + day.month - start.month
+    return months if frequency == RecurringExpense.MONTHLY else months // 12
+
+
+def first_position_after(schedule, day):
+    """Index of the first occurrence of `schedule` after `day`."""
+    position = max(0, _periods_between(schedule.frequency, schedule.start_date, day) // schedule.interval - 1)
+    while occurrence(schedule.frequency, schedule.interval, schedule.start_date, position) <= day:
+        position += 1
+    return position
+
+
+def date_at(schedule, position):
+    """Date of occurrence `position`, or None if the schedule ends before it."""
+    if schedule.count is not None and position >= schedule.count:
+        return None
+    day = occurrence(schedule.frequency, schedule.interval, schedule.start_date, position)
+    if schedule.until is not None and day > schedule.until:
+        return None
+    return day
+
+
+def due_dates(schedule, today):
+    """The unwritten occurrence dates up to `today`; moves the schedule's cursor past them."""
+    dates = []
+    if schedule.next_date is None or schedule.next_date > today:
+        return dates
+    position = first_position_after(schedule, schedule.next_date - timedelta(days=1))
+    while schedule.next_date is not None and schedule.next_date <= today:
+        dates.append(schedule.next_date)
+        position += 1
+        schedule.next_date = date_at(schedule, position)
+    return dates
+
+
+def reschedule(schedule, skip_before=None):
+    """
+    Point the cursor of an edited schedule at its first occurrence after the
+    last expense it already wrote, and on or after `skip_before` if given.
+    Does not save.
+    """
+    after = schedule.expenses.order_by('-date').values_list('date', flat=True).first() \
+        if schedule.pk else None
+    if skip_before is not None and (after is None or after < skip_before - timedelta(days=1)):
+        after = skip_before - timedelta(days=1)
+    schedule.next_date = date_at(schedule, 0 if after is None else first_position_after(schedule, after))
+
+
+def _materialize_batch(due, today, batch_size):
+    with transaction.atomic():
+        batch = list(due.order_by('next_date', 'id').select_for_update(skip_locked=True)[:batch_size])
+        if not batch:
+            return None
+        first_date = min(schedule.next_date for schedule in batch)
+        rows = [
+            (schedule.owner_id, schedule.description, schedule.amount, schedule.category, day, schedule.pk,
+             schedule.currency)
+            for schedule in batch
+            for day in due_dates(schedule, today)
+        ]
+        # Occurrences may exist already if a cursor was moved back, e.g. by
+        # an edit; the rollups must only count the new ones.
+        written = set(
+            Expense.objects.filter(recurring_id__in=[schedule.pk for schedule in batch],
+                                   date__gte=first_date, date__lte=today)
+            .values_list('recurring_id', 'date')
+        )
+        rows = [row for row in rows if (row[5], row[4]) not in written]
+        insert_occurrence_rows(rows)
+        apply_expense_rows(
+            (owner_id, day, category, amount, currency)
+            for owner_id, _, amount, category, day, _, currency in rows
+        )
+        by_next_date = defaultdict(list)
+        for schedule in batch:
+            by_next_date[schedule.next_date].append(schedule.pk)
+        for next_date, ids in by_next_date.items():
+            RecurringExpense.objects.filter(pk__in=ids).update(next_date=next_date)
+        return len(batch), len(rows)
+
+
+def materialize(today=None, owner_id=None, batch_size=MATERIALIZE_BATCH_SIZE, progress=None):
+    """
+    Write every occurrence due by `today` (default: today) of the active
+    schedules, or of one owner's. Returns (schedules, expenses) written.
+    `progress(schedules, expenses)` is called after each batch.
+    """
+    today = today or timezone.localdate()
+    due = RecurringExpense.objects.filter(active=True, next_date__lte=today)
+    if owner_id is not None:
+        due = due.filter(owner_id=owner_id)
+    schedules = expenses = 0
+    while True:
+        counts = _materialize_batch(due, today, batch_size)
+        if counts is None:
+            return schedules, expenses
+        schedules += counts[0]
+        expenses += counts[1]
+        if progress is not None:
+            progress(schedules, expenses)
@@ -0,0 +1,211 @@
+"""
+Incremental maintenance of the `ExpenseRollup` table.
+
+Every expense contributes its amount to one rollup row per granularity
+(day, week, month, year), keyed by its owner, the start of the period, the
+category and the currency. Amounts in different currencies are never added
+together here; summaries convert them when they read (see `expenses.fx`).
+Writes translate into signed deltas that are added to those rows, so the
+summary endpoint only ever reads one row per period and category.
+
+Signal handlers cover `save()` and `delete()`, including `QuerySet.delete()`;
+wrap mass deletes in `deferred_rollups()` so their deltas are applied once.
+Code that bypasses signals (`bulk_create`, `bulk_update`, `QuerySet.update`,
+raw SQL) must call `apply_expense_rows` itself, or run `rebuild_rollups`.
+
+Because every write path funnels through `apply_deltas`, it also bumps the
+data generation (`expenses.cache`) of the owners whose data changed, in the
+same transaction as the write, and sends `expenses_changed` with them once
+the batch has been committed.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek, TruncYear
+from django.dispatch import Signal
+
+from .cache import bump_generation
+from .models import Expense, ExpenseRollup
+
+PERIOD_STARTS = {
+    'day': lambda day: day,
+    'week': lambda day: day - timedelta(days=day.weekday()),
+    'month': lambda day: day.replace(day=1),
+    'year': lambda day: day.replace(month=1, day=1),
+}
+
+PERIOD_TRUNCATIONS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
+GRANULARITY_BY_TIMEFRAME = {
+    'weekly': 'week',
+    'monthly': 'month',
+    'yearly': 'year',
+}
+
+_deferred = threading.local()
+
+# Sent (after commit) once per batch of expense writes, even when the batch
+# leaves every rollup total unchanged, e.g. a description-only edit.
+# `owners` is the set of owner ids whose expenses changed.
+expenses_changed = Signal()
+
+
+def rollup_row(expense):
+    """Return the (owner id, date, category, amount, currency) an expense contributes to rollups."""
+    # Values may still be raw strings when assigned by hand, e.g. date="2024-01-01".
+    field = Expense._meta.get_field
+    return (
+        expense.owner_id,
+        field('date').to_python(expense.date),
+        expense.category,
+        field('amount').to_python(expense.amount),
+        expense.currency,
+    )
+
+
+def collect_deltas(rows, sign=1, deltas=None):
+    """Fold (owner id, date, category, amount, currency) rows into per-rollup-key deltas."""
+    if deltas is None:
+        deltas = defaultdict(lambda: [Decimal('0'), 0])
+    # Summed per owner, day, category and currency first: batches hold many
+    # rows per day, and each day key is then spread over the periods once.
+    daily = defaultdict(lambda: [Decimal('0'), 0])
+    for owner_id, day, category, amount, currency in rows:
+        delta = daily[(owner_id, day, category, currency)]
+        delta[0] += Decimal(amount)
+        delta[1] += 1
+    for (owner_id, day, category, currency), (total, count) in daily.items():
+        for granularity, period_start in PERIOD_STARTS.items():
+            delta = deltas[(owner_id, granularity, period_start(day), category, currency)]
+            delta[0] += sign * total
+            delta[1] += sign * count
+    return deltas
+
+
+def apply_deltas(deltas):
+    """Add the given deltas to the rollup table in a single transaction."""
+    pending = getattr(_deferred, 'deltas', None)
+    if pending is not None:
+        for key, (total, count) in deltas.items():
+            pending[key][0] += total
+            pending[key][1] += count
+        return
+    owners = frozenset(owner_id for owner_id, *_ in deltas)
+    with transaction.atomic():
+        additions = []
+        for (owner_id, granularity, period, category, currency), (total, count) in deltas.items():
+            if not total and not count:
+                continue
+            if owner_id is not None and count >= 0:
+                additions.append((owner_id, granularity, period, category, currency, total, count))
+                continue
+            key = {'owner_id': owner_id, 'granularity': granularity, 'period': period,
+                   'category': category, 'currency': currency}
+            rollups = ExpenseRollup.objects.filter(**key)
+            if not rollups.update(total=F('total') + total, count=F('count') + count):
+                if count < 0:
+                    # Removing rows that were never rolled up (e.g. bulk_create
+                    # without apply_expense_rows); rebuild_rollups repairs this.
+                    continue
+                try:
+                    with transaction.atomic():
+                        ExpenseRollup.objects.create(total=total, count=count, **key)
+                except IntegrityError:
+                    # Another writer created the row first; add on top of it.
+                    rollups.update(total=F('total') + total, count=F('count') + count)
+            if count < 0:
+                rollups.filter(count__lte=0).delete()
+        _add_to_rollups(additions)
+        mark_changed(owners)
+
+
+def mark_changed(owners):
+    """
+    Bump the owners' data generations in the current transaction, so they
+    commit together with the write, and send `expenses_changed` after it.
+    """
+    owners = frozenset(owners)
+    bump_generation(owners)
+    transaction.on_commit(lambda: expenses_changed.send(sender=Expense, owners=owners))
+
+
+def _add_to_rollups(rows):
+    # (owner id, granularity, period, category, currency, total, count) rows
+    # added in one upsert per batch: inserting a rollup row or adding to the
+    # existing one. Rows without an owner never conflict (NULLs are distinct) and go
+    # through the per-key path above instead.
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    fields = [ExpenseRollup._meta.get_field(name)
+              for name in ('owner', 'granularity', 'period', 'category', 'currency', 'total', 'count')]
+    table = quote(ExpenseRollup._meta.db_table)
+    columns = [quote(field.column) for field in fields]
+    # Passed in their text form, as expenses.loading does; far cheaper than
+    # preparing each value through its field.
+    rows = [(owner_id, granularity, period.isoformat(), category, currency, str(total), count)
+            for owner_id, granularity, period, category, currency, total, count in rows]
+    key = ', '.join(columns[:5])
+    batch_size = connection.ops.bulk_batch_size(fields, rows)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(columns)}) VALUES '
+                + ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(batch))
+                + f' ON CONFLICT ({key}) DO UPDATE SET'
+                f' {columns[5]} = {table}.{columns[5]} + excluded.{columns[5]},'
+                f' {columns[6]} = {table}.{columns[6]} + excluded.{columns[6]}',
+                [value for row in batch for value in row]
+            )
+
+
+def apply_expense_rows(rows, sign=1):
+    """Add (sign=1) or remove (sign=-1) (owner id, date, category, amount, currency) rows."""
+    apply_deltas(collect_deltas(rows, sign))
+
+
+@contextmanager
+def deferred_rollups():
+    """Collect rollup deltas from the enclosed block and apply them once at exit."""
+    if getattr(_deferred, 'deltas', None) is not None:
+        # Already deferring; the outermost block applies everything.
+        yield
+        return
+    _deferred.deltas = collect_deltas([])
+    try:
+        yield
+        deltas = _deferred.deltas
+    finally:
+        _deferred.deltas = None
+    apply_deltas(deltas)
+
+
+def rebuild_rollups():
+    """Recompute every rollup row from the expense table."""
+    with transaction.atomic():
+        owners = set(ExpenseRollup.objects.values_list('owner_id', flat=True).distinct())
+        ExpenseRollup.objects.all().delete()
+        created = 0
+        for granularity, truncation in PERIOD_TRUNCATIONS.items():
+            groups = Expense.objects.order_by()\
+                .annotate(period=truncation('date'))\
+                .values('owner_id', 'period', 'category', 'currency')\
+                .annotate(total=Sum('amount'), count=Count('id'))
+            rollups = ExpenseRollup.objects.bulk_create(
+                ExpenseRollup(granularity=granularity, **group) for group in groups
+            )
+            owners.update(rollup.owner_id for rollup in rollups)
+            created += len(rollups)
+        mark_changed(owners)
+    return created
@@ -0,0 +1,137 @@
+"""
+Full-text search over expense descriptions.
+
+On PostgreSQL, migration 0006 adds a generated `search_vector` column
+(`to_tsvector('english', description)`) with a GIN index. Every search term
+becomes a prefix match (`coff` finds "coffee"), and descriptions within
+trigram word similarity of the whole query also match, which tolerates
+typos (`cofee`), through the trigram index from migration 0004. The rank
+adds `ts_rank` and the trigram similarity.
+
+On SQLite the same migration creates an external-content FTS5 table kept in
+sync by triggers; terms are prefix matches, ranked by bm25. There is no typo
+tolerance there; it exists so search can be used and tested locally.
+
+Both indexes are maintained by the database itself, so rows written by
+`bulk_create`, `QuerySet.update` or raw SQL are searchable too. Large loads
+on SQLite can run inside `deferred_search_index()`, which indexes the new
+rows in one pass at the end instead of through the per-row trigger.
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import ValidationError
+
+from .models import Expense
+
+FTS_TABLE = 'expenses_expense_fts'
+FTS_INSERT_TRIGGER = 'expenses_expense_fts_insert'
+SEARCH_CONFIG = 'english'
+MAX_TERMS = 8
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+TERM = re.compile(r'\w+')
+
+
+def search_terms(text):
+    """Lower-cased word tokens of the query; punctuation is dropped."""
+    return TERM.findall((text or '').lower())[:MAX_TERMS]
+
+
+def parse_limit(query_params):
+    """?limit= for ranked results, DEFAULT_LIMIT when absent."""
+    try:
+        limit = int(query_params.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ValidationError({'limit': ['Enter a whole number.']})
+    if not 0 < limit <= MAX_LIMIT:
+        raise ValidationError({'limit': [f'Enter a number between 1 and {MAX_LIMIT}.']})
+    return limit
+
+
+def _column(name):
+    return f'{connection.ops.quote_name(Expense._meta.db_table)}.{connection.ops.quote_name(name)}'
+
+
+def _postgresql_query(terms):
+    tsquery = ' & '.join(f'{term}:*' for term in terms)
+    vector, description = _column('search_vector'), _column('description')
+    match = f"({vector} @@ to_tsquery(%s, %s) OR %s <%% {description})"
+    rank = f"(ts_rank({vector}, to_tsquery(%s, %s)) + word_similarity(%s, {description}))"
+    params = (SEARCH_CONFIG, tsquery, ' '.join(terms))
+    return (match, params), (rank, params)
+
+
+def _sqlite_query(terms):
+    fts_query = ' '.join(f'"{term}"*' for term in terms)
+    expense_id = _column('id')
+    match = f"{expense_id} IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)"
+    # FTS5's rank is bm25(), where lower is better; negate it so that, as on
+    # PostgreSQL, a higher rank means a better match.
+    # Correlated MATCH subqueries rerun the full-text query for every row; the
+    # materialized CTE runs it once and is then probed by id.
+    rank = f"(WITH matches AS MATERIALIZED (SELECT rowid AS id, rank FROM {FTS_TABLE} " \
+           f"WHERE {FTS_TABLE} MATCH %s) SELECT -rank FROM matches WHERE matches.id = {expense_id})"
+    return (match, (fts_query,)), (rank, (fts_query,))
+
+
+def _query(text):
+    terms = search_terms(text)
+    if not terms:
+        return None
+    if connection.vendor == 'postgresql':
+        return _postgresql_query(terms)
+    return _sqlite_query(terms)
+
+
+def search_filter(queryset, text):
+    """Restrict `queryset` to expenses whose description matches `text`."""
+    query = _query(text)
+    if query is None:
+        return queryset.none()
+    (sql, params), _ = query
+    return queryset.filter(RawSQL(sql, params, output_field=BooleanField()))
+
+
+def ranked(queryset, text):
+    """
+    Annotate `rank` on a queryset already restricted by `search_filter` and
+    order it best match first.
+    """
+    query = _query(text)
+    if query is None:
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField())).none()
+    _, (sql, params) = query
+    return queryset\
+        .annotate(rank=RawSQL(sql, params, output_field=FloatField()))\
+        .order_by('-rank', '-date', '-id')
+
+
+@contextmanager
+def deferred_search_index():
+    """
+    On SQLite, index rows inserted in the enclosed block once at exit: the
+    insert trigger is dropped meanwhile and the FTS table rebuilt afterwards.
+    Use inside a transaction; a no-op on other databases.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = %s", [FTS_INSERT_TRIGGER]
+        )
+        trigger = cursor.fetchone()
+        if trigger is None:
+            yield
+            return
+        cursor.execute(f'DROP TRIGGER {FTS_INSERT_TRIGGER}')
+        try:
+            yield
+        finally:
+            cursor.execute(trigger[0])
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
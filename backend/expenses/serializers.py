@@ -1,7 +1,134 @@
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Expense
+from .models import Expense, RecurringExpense
+from .partitions import ensure_partitions
+from .recurring import reschedule
+from .rollups import apply_deltas, apply_expense_rows, collect_deltas, rollup_row
+
+BULK_BATCH_SIZE = 1000
+
+
+class ExpenseListSerializer(serializers.ListSerializer):
+    """Validates a batch of expenses in one pass and writes it with bulk queries."""
+
+    def create(self, validated_data):
+        expenses = [Expense(**attrs) for attrs in validated_data]
+        ensure_partitions(expense.date for expense in expenses)
+        with transaction.atomic():
+            expenses = Expense.objects.bulk_create(expenses, batch_size=BULK_BATCH_SIZE)
+            apply_expense_rows(rollup_row(expense) for expense in expenses)
+        return expenses
+
+    def update(self, instances, validated_data):
+        deltas = collect_deltas([rollup_row(expense) for expense in instances], sign=-1)
+        fields = set()
+        for expense, attrs in zip(instances, validated_data):
+            for attr, value in attrs.items():
+                setattr(expense, attr, value)
+            fields.update(attrs)
+        collect_deltas([rollup_row(expense) for expense in instances], deltas=deltas)
+        ensure_partitions(expense.date for expense in instances)
+
+        with transaction.atomic():
+            if fields:
+                Expense.objects.bulk_update(instances, fields, batch_size=BULK_BATCH_SIZE)
+            apply_deltas(deltas)
+        return instances
+
 
 class ExpenseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Expense
-        fields = ['id', 'description', 'amount', 'category', 'date', 'created_at']
\ No newline at end of file
+        fields = ['id', 'description', 'amount', 'currency', 'category', 'date', 'created_at']
+        list_serializer_class = ExpenseListSerializer
+
+
+def iso_datetime(value):
+    # Mirrors DRF's DateTimeField: current timezone, ISO 8601, UTC as a trailing Z.
+    value = timezone.localtime(value).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _value_converter(field):
+    if isinstance(field, models.DecimalField):
+        quantum = Decimal(1).scaleb(-field.decimal_places)
+        return lambda value: '{:f}'.format(value.quantize(quantum))
+    if isinstance(field, models.DateTimeField):
+        return iso_datetime
+    if isinstance(field, models.DateField):
+        return lambda value: value.isoformat()
+    return None
+
+
+VALUE_CONVERTERS = {
+    name: _value_converter(Expense._meta.get_field(name))
+    for name in ExpenseSerializer.Meta.fields
+}
+
+
+def serialize_values(rows, fields=ExpenseSerializer.Meta.fields):
+    """
+    Read-only fast path for ExpenseSerializer(..., many=True).data.
+
+    Takes `.values()` rows and converts each column with a plain function
+    instead of instantiating models and running DRF field machinery. The
+    result renders to exactly the same JSON as the serializer.
+    """
+    converters = [(name, VALUE_CONVERTERS[name]) for name in fields]
+    data = []
+    for row in rows:
+        item = {}
+        for name, convert in converters:
+            value = row[name]
+            item[name] = convert(value) if convert is not None and value is not None else value
+        data.append(item)
+    return data
+
+
+class RecurringExpenseSerializer(serializers.ModelSerializer):
+    """Edits to the schedule move its cursor; see expenses.recurring.reschedule."""
+    SCHEDULE_FIELDS = ('frequency', 'interval', 'start_date', 'until', 'count')
+
+    class Meta:
+        model = RecurringExpense
+        fields = ['id', 'description', 'amount', 'currency', 'category', 'frequency', 'interval',
+                  'start_date', 'until', 'count', 'active', 'next_date', 'created_at']
+        read_only_fields = ['next_date', 'created_at']
+        extra_kwargs = {
+            'interval': {'min_value': 1, 'max_value': 1000},
+            'count': {'min_value': 1},
+        }
+
+    def validate(self, attrs):
+        start_date = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        until = attrs.get('until', getattr(self.instance, 'until', None))
+        if start_date and until and until < start_date:
+            raise serializers.ValidationError({'until': ['Must not be before start_date.']})
+        return attrs
+
+    def create(self, validated_data):
+        schedule = RecurringExpense(**validated_data)
+        reschedule(schedule)
+        schedule.save()
+        return schedule
+
+    def update(self, instance, validated_data):
+        resumed = validated_data.get('active') and not instance.active
+        changed = any(
+            name in validated_data and validated_data[name] != getattr(instance, name)
+            for name in self.SCHEDULE_FIELDS
+        )
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        if resumed:
+            # Occurrences that fell while the schedule was paused are skipped.
+            reschedule(instance, skip_before=timezone.localdate())
+        elif changed:
+            reschedule(instance)
+        instance.save()
+        return instance
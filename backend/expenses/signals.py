@@ -0,0 +1,47 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .analytics import register_sqlite_functions
+from .fx import rates
+from .models import Expense, FxRate
+from .partitions import ensure_partitions
+from .rollups import apply_deltas, collect_deltas, rollup_row
+
+
+@receiver(pre_save, sender=Expense)
+def remember_previous_values(sender, instance, raw, **kwargs):
+    ensure_partitions([Expense._meta.get_field('date').to_python(instance.date)])
+    instance._rollup_previous = None
+    if instance.pk and not raw:
+        instance._rollup_previous = Expense.objects.filter(pk=instance.pk)\
+            .values_list('owner_id', 'date', 'category', 'amount', 'currency')\
+            .first()
+
+
+@receiver(post_save, sender=Expense)
+def update_rollups_on_save(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    deltas = collect_deltas([rollup_row(instance)])
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        collect_deltas([previous], sign=-1, deltas=deltas)
+    apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=Expense)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    apply_deltas(collect_deltas([rollup_row(instance)], sign=-1))
+
+
+@receiver(post_save, sender=FxRate)
+@receiver(post_delete, sender=FxRate)
+def reload_fx_rates(sender, **kwargs):
+    # Single edits, e.g. in the admin; load_fx_rates records its bulk writes itself.
+    rates.changed()
+
+
+@receiver(connection_created)
+def register_database_functions(sender, connection, **kwargs):
+    register_sqlite_functions(connection)
@@ -0,0 +1,192 @@
+"""
+Reproducible synthetic expense data for demos, load and performance tests.
+
+Each generated user (`seed-user-N`, or the given owners) owns their expenses
+and gets their own spending profile: an overall scale and per-category
+weights drawn around the shared `CATEGORY_PROFILES`. For every
+expense a category is picked by weight, a day by that category's seasonal
+and weekday pattern (more eating out at weekends, travel in summer, shopping
+before Christmas, utilities in winter), and an amount from a log-normal
+distribution, so most amounts are small with a long tail of large ones.
+
+The same seed, user count, expense count and date range always produce the
+same rows. Rows are written with `insert_expense_rows` (COPY on PostgreSQL),
+and the rollup totals (and on SQLite the search index) are written once at
+the end rather than per chunk.
+"""
+import bisect
+import itertools
+import math
+import random
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+
+from .loading import insert_expense_rows
+from .models import Expense, ExpenseRollup, base_currency
+from .rollups import PERIOD_STARTS, apply_deltas, collect_deltas, mark_changed
+from .search import deferred_search_index
+
+# category: (share of transactions, median amount, log-normal sigma,
+#            weekend factor, (seasonal amplitude, peak day of year), descriptions)
+CATEGORY_PROFILES = {
+    'Food & Dining': (30, 18, 0.7, 1.3, (0.10, 355), [
+        'Groceries', 'Supermarket', 'Coffee', 'Lunch', 'Dinner out', 'Takeaway', 'Bakery', 'Farmers market',
+    ]),
+    'Transportation': (15, 12, 0.8, 0.8, (0.10, 30), [
+        'Bus ticket', 'Train ticket', 'Taxi', 'Fuel', 'Parking', 'Bike repair', 'Monthly transit pass',
+    ]),
+    'Utilities': (5, 80, 0.4, 0.5, (0.35, 15), [
+        'Electricity bill', 'Gas bill', 'Water bill', 'Internet', 'Mobile phone plan',
+    ]),
+    'Housing': (2, 1200, 0.3, 0.3, (0.0, 1), [
+        'Rent', 'Home insurance', 'Furniture', 'Plumber', 'Cleaning supplies',
+    ]),
+    'Entertainment': (8, 25, 0.8, 1.6, (0.15, 200), [
+        'Cinema', 'Concert tickets', 'Streaming subscription', 'Video game', 'Board games', 'Museum',
+    ]),
+    'Healthcare': (4, 60, 1.0, 0.5, (0.20, 30), [
+        'Pharmacy', 'Doctor visit', 'Dentist', 'Eye test', 'Physiotherapy',
+    ]),
+    'Shopping': (12, 40, 1.0, 1.2, (0.45, 350), [
+        'Clothes', 'Shoes', 'Electronics', 'Books', 'Gifts', 'Home decor', 'Online order',
+    ]),
+    'Personal Care': (5, 25, 0.6, 1.1, (0.05, 150), [
+        'Haircut', 'Toiletries', 'Gym membership', 'Cosmetics',
+    ]),
+    'Education': (2, 120, 1.0, 0.6, (0.40, 250), [
+        'Course fee', 'Textbooks', 'Online course', 'Stationery', 'Exam fee',
+    ]),
+    'Travel': (3, 250, 1.1, 1.2, (0.60, 200), [
+        'Flight', 'Hotel', 'Car rental', 'Travel insurance', 'Tour booking',
+    ]),
+    'Other': (4, 30, 1.2, 1.0, (0.0, 1), [
+        'Donation', 'Bank fee', 'Postage', 'Miscellaneous',
+    ]),
+}
+
+DEFAULT_DAYS = 365
+DEFAULT_CHUNK_SIZE = 50000
+SEED_USERNAME = 'seed-user-{}'
+MIN_AMOUNT = 0.5
+MAX_AMOUNT = 50000.0
+
+
+def _day_weights(days, weekend, seasonality):
+    """Cumulative weights over `days` for one category."""
+    amplitude, peak = seasonality
+    cumulative, total = [], 0.0
+    for day in days:
+        weight = 1 + amplitude * math.cos(2 * math.pi * (day.timetuple().tm_yday - peak) / 365.25)
+        if day.weekday() >= 5:
+            weight *= weekend
+        total += max(weight, 0.05)
+        cumulative.append(total)
+    return cumulative
+
+
+def generate_expenses(users, per_user, seed=0, end=None, days=DEFAULT_DAYS):
+    """
+    Yield (user index, description, amount, category, date) for `per_user`
+    expenses of each of `users` users, dated within `days` days up to `end`.
+    """
+    end = end or date.today()
+    calendar = [end - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+    categories = list(CATEGORY_PROFILES)
+    day_weights = {
+        category: _day_weights(calendar, profile[3], profile[4])
+        for category, profile in CATEGORY_PROFILES.items()
+    }
+    rng = random.Random(seed)
+
+    for user in range(users):
+        scale = rng.lognormvariate(0, 0.35)
+        weights = [profile[0] * rng.uniform(0.5, 1.5) for profile in CATEGORY_PROFILES.values()]
+        for category in rng.choices(categories, weights=weights, k=per_user):
+            _, median, sigma, _, _, descriptions = CATEGORY_PROFILES[category]
+            cumulative = day_weights[category]
+            day = calendar[bisect.bisect(cumulative, rng.random() * cumulative[-1], hi=days - 1)]
+            amount = min(max(median * scale * rng.lognormvariate(0, sigma), MIN_AMOUNT), MAX_AMOUNT)
+            yield user, rng.choice(descriptions), Decimal(f'{amount:.2f}'), category, day
+
+
+def ensure_users(count):
+    """Return `count` seed users, creating the missing ones with unusable passwords."""
+    User = get_user_model()
+    usernames = [SEED_USERNAME.format(index) for index in range(count)]
+    existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    password = make_password(None)
+    User.objects.bulk_create(
+        [User(username=username, password=password) for username in usernames if username not in existing],
+        batch_size=1000,
+    )
+    by_name = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+    return [by_name[username] for username in usernames]
+
+
+def clear_expenses():
+    """Remove every expense and rollup without per-row signals."""
+    quote = connection.ops.quote_name
+    tables = [quote(Expense._meta.db_table), quote(ExpenseRollup._meta.db_table)]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"TRUNCATE {', '.join(tables)}")
+        else:
+            for table in tables:
+                cursor.execute(f'DELETE FROM {table}')
+
+
+def seed_expenses(users, per_user, seed=0, end=None, days=DEFAULT_DAYS,
+                  chunk_size=DEFAULT_CHUNK_SIZE, clear=True, progress=None, owner_ids=None):
+    """
+    Write generated expenses in chunks, with their rollups; returns the
+    number of expenses written. Expenses belong to `users` seed users, or to
+    `owner_ids` when given. `progress(written)` is called after each chunk.
+    """
+    owner_ids = list(owner_ids) if owner_ids is not None else ensure_users(users)
+    rows = generate_expenses(len(owner_ids), per_user, seed=seed, end=end, days=days)
+    # Summed per owner, day and category first; far fewer keys to spread
+    # over the rollup periods than rows.
+    daily_totals, daily_counts = defaultdict(Decimal), Counter()
+    written = 0
+    with transaction.atomic():
+        if clear:
+            changed = set(ExpenseRollup.objects.values_list('owner_id', flat=True).distinct())
+            clear_expenses()
+        with deferred_search_index():
+            while True:
+                chunk = [(owner_ids[user], *row) for user, *row in itertools.islice(rows, chunk_size)]
+                if not chunk:
+                    break
+                written += insert_expense_rows(chunk)
+                for owner_id, _, amount, category, day in chunk:
+                    daily_totals[owner_id, day, category] += amount
+                    daily_counts[owner_id, day, category] += 1
+                if progress is not None:
+                    progress(written)
+        deltas = collect_deltas([])
+        currency = base_currency()
+        for (owner_id, day, category), total in daily_totals.items():
+            for granularity, period_start in PERIOD_STARTS.items():
+                delta = deltas[(owner_id, granularity, period_start(day), category, currency)]
+                delta[0] += total
+                delta[1] += daily_counts[owner_id, day, category]
+        if clear:
+            # The rollup table is empty: write the totals instead of upserting them.
+            ExpenseRollup.objects.bulk_create(
+                [
+                    ExpenseRollup(owner_id=owner_id, granularity=granularity, period=period,
+                                  category=category, currency=currency, total=total, count=count)
+                    for (owner_id, granularity, period, category, currency), (total, count) in deltas.items()
+                ],
+                batch_size=5000,
+            )
+            changed.update(owner_ids)
+            mark_changed(changed)
+        else:
+            apply_deltas(deltas)
+    return written
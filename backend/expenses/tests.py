@@ -1,10 +1,42 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek, TruncYear
 from django.test import TestCase, Client
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
-from .models import Expense
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from .cache import (
+    SUMMARY_FRESH_SECONDS, bump_generation, cached_summary, data_version, get_generation, summary_key,
+)
+from .fx import load_rates, rates
+from .models import DataGeneration, Expense, ExpenseRollup, FxRate, RecurringExpense
+from .partitions import DEFAULT_PARTITION, list_partitions, next_month, partition_name
+from .recurring import materialize, occurrence, reschedule
+from .serializers import ExpenseSerializer
+from .views import ExpenseViewSet, compute_summary
 from decimal import Decimal
-from datetime import date
+from datetime import date, timedelta
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import Mock, patch
+import csv
+import json
+import gzip
+import os
+import re
+import tempfile
+import time
+import tracemalloc
+
+User = get_user_model()
 
 class ExpenseModelTests(TestCase):
     def test_create_expense(self):
@@ -95,3 +127,1205 @@ class ExpenseAPITests(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 2)  # Checking pagination
+
+class ExpenseKeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='pager', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('expense-list')
+        for i in range(7):
+            Expense.objects.create(
+                description=f"Expense {i}",
+                amount=Decimal("10.00") + i,
+                category="Food & Dining" if i % 2 else "Shopping",
+                date=date(2024, 1, 1 + i // 2), owner=self.user
+            )
+
+    def _collect(self, params):
+        ids, response = [], self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(row['id'] for row in response.data['results'])
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_unpaginated_by_default(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 7)
+
+    def test_pages_follow_date_then_id_descending(self):
+        expected = list(
+            Expense.objects.order_by('-date', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(self._collect({'page_size': 2}), expected)
+
+    def test_pages_honor_filters(self):
+        expected = list(
+            Expense.objects.filter(category="Shopping", amount__gte=Decimal("12.00"))
+            .order_by('-date', '-id').values_list('id', flat=True)
+        )
+        ids = self._collect({'page_size': 1, 'category': 'Shopping', 'min_amount': '12'})
+        self.assertEqual(ids, expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class ExpenseRollupTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='summariser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('expense-summary')
+
+    def _expected_summary(self, truncation):
+        time_series = Expense.objects.order_by()\
+            .annotate(period=truncation('date'))\
+            .values('period')\
+            .annotate(total=Sum('amount'))\
+            .order_by('period')
+        category_totals = Expense.objects.order_by()\
+            .values('category')\
+            .annotate(total=Sum('amount'))\
+            .order_by('-total')
+        return list(time_series), list(category_totals)
+
+    def test_rollups_follow_create_update_and_delete(self):
+        lunch = Expense.objects.create(
+            description="Lunch", amount=Decimal("12.50"),
+            category="Food & Dining", date=date(2024, 1, 31), owner=self.user
+        )
+        Expense.objects.create(
+            description="Train", amount=Decimal("40.00"),
+            category="Transportation", date="2024-02-01", owner=self.user
+        )
+        rent = Expense.objects.create(
+            description="Rent", amount=Decimal("900.00"),
+            category="Housing", date=date(2024, 2, 1), owner=self.user
+        )
+        lunch.date = date(2024, 2, 2)
+        lunch.amount = Decimal("15.00")
+        lunch.save()
+        rent.delete()
+
+        rollups = ExpenseRollup.objects.filter(granularity='month')
+        self.assertEqual(
+            list(rollups.values_list('period', 'category', 'total', 'count')),
+            [
+                (date(2024, 2, 1), "Food & Dining", Decimal("15.00"), 1),
+                (date(2024, 2, 1), "Transportation", Decimal("40.00"), 1),
+            ]
+        )
+        self.assertFalse(ExpenseRollup.objects.filter(category="Housing").exists())
+
+    def test_summary_matches_direct_aggregation(self):
+        for i in range(12):
+            Expense.objects.create(
+                description=f"Expense {i}", amount=Decimal("7.25") * (i + 1),
+                category=Expense.CATEGORY_CHOICES[i % 3][0],
+                date=date(2023, 11, 1) + timedelta(days=9 * i), owner=self.user
+            )
+        for timeframe, truncation in (('weekly', TruncWeek), ('monthly', TruncMonth), ('yearly', TruncYear)):
+            response = self.client.get(self.url, {'timeframe': timeframe})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            time_series, category_totals = self._expected_summary(truncation)
+            self.assertEqual(response.data['time_series'], time_series)
+            self.assertEqual(response.data['category_totals'], category_totals)
+
+    def test_rebuild_rollups_command(self):
+        Expense.objects.create(
+            description="Gym", amount=Decimal("30.00"),
+            category="Healthcare", date=date(2024, 3, 4), owner=self.user
+        )
+        expected = list(ExpenseRollup.objects.values_list('granularity', 'period', 'category', 'total', 'count'))
+        ExpenseRollup.objects.all().delete()
+
+        call_command('rebuild_rollups', stdout=StringIO())
+
+        self.assertEqual(
+            list(ExpenseRollup.objects.values_list('granularity', 'period', 'category', 'total', 'count')),
+            expected
+        )
+
+class ExpenseBulkAPITests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='bulkuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('expense-bulk')
+        self.rows = [
+            {"description": f"Row {i}", "amount": f"{i + 1}.50",
+             "category": "Utilities", "date": "2024-02-0%d" % (i + 1)}
+            for i in range(3)
+        ]
+
+    def test_bulk_create(self):
+        response = self.client.post(self.url, self.rows, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 3)
+        self.assertTrue(all(row['id'] for row in response.data))
+        self.assertEqual(Expense.objects.count(), 3)
+        rollup = ExpenseRollup.objects.get(granularity='month', category="Utilities")
+        self.assertEqual((rollup.total, rollup.count), (Decimal("7.50"), 3))
+
+    def test_bulk_create_reports_errors_per_row(self):
+        self.rows[1]['category'] = "Invalid Category"
+        self.rows[2]['amount'] = "not a number"
+
+        response = self.client.post(self.url, self.rows, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([row['index'] for row in response.data['errors']], [1, 2])
+        self.assertIn('category', response.data['errors'][0]['errors'])
+        self.assertIn('amount', response.data['errors'][1]['errors'])
+        self.assertEqual(Expense.objects.count(), 0)
+
+    def test_bulk_update(self):
+        first, second = [
+            Expense.objects.create(description=f"Old {i}", amount=Decimal("5.00"),
+                                   category="Other", date=date(2024, 3, 1), owner=self.user)
+            for i in range(2)
+        ]
+
+        response = self.client.patch(self.url, [
+            {"id": first.id, "amount": "8.00"},
+            {"id": second.id, "category": "Travel", "description": "Flight"},
+        ], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.amount, Decimal("8.00"))
+        self.assertEqual((second.category, second.description), ("Travel", "Flight"))
+        self.assertEqual(
+            dict(ExpenseRollup.objects.filter(granularity='year').values_list('category', 'total')),
+            {"Other": Decimal("8.00"), "Travel": Decimal("5.00")}
+        )
+
+    def test_bulk_update_unknown_id(self):
+        expense = Expense.objects.create(description="Kept", amount=Decimal("5.00"),
+                                         category="Other", date=date(2024, 3, 1), owner=self.user)
+
+        response = self.client.patch(self.url, [
+            {"id": expense.id, "amount": "9.00"},
+            {"id": expense.id + 100, "amount": "1.00"},
+        ], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        expense.refresh_from_db()
+        self.assertEqual(expense.amount, Decimal("5.00"))
+
+    def test_bulk_delete(self):
+        expenses = [
+            Expense.objects.create(description=f"Gone {i}", amount=Decimal("2.00"),
+                                   category="Other", date=date(2024, 3, i + 1), owner=self.user)
+            for i in range(3)
+        ]
+
+        response = self.client.delete(
+            self.url, {"ids": [expenses[0].id, expenses[2].id]}, format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(Expense.objects.values_list('id', flat=True)), [expenses[1].id])
+        rollup = ExpenseRollup.objects.get(granularity='year')
+        self.assertEqual((rollup.total, rollup.count), (Decimal("2.00"), 1))
+
+        response = self.client.delete(self.url, {"ids": [expenses[1].id, 0]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Expense.objects.count(), 1)
+
+class ExpenseExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='exporter', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('expense-export')
+
+    def _create(self, count):
+        Expense.objects.bulk_create(
+            Expense(description=f"Export {i}", amount=Decimal("3.10") + i,
+                    category="Travel" if i % 2 else "Shopping",
+                    date=date(2024, 1, 1) + timedelta(days=i % 300), owner=self.user)
+            for i in range(count)
+        )
+
+    def _content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_honors_filters(self):
+        self._create(10)
+        response = self.client.get(self.url, {'format': 'csv', 'category': 'Travel', 'max_amount': '8'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        rows = list(csv.reader(StringIO(self._content(response))))
+        self.assertEqual(rows[0], ['id', 'description', 'amount', 'currency', 'category', 'date', 'created_at'])
+        self.assertEqual([row[1] for row in rows[1:]], ["Export 3", "Export 1"])
+        self.assertEqual(rows[1][2], "6.10")
+
+    def test_ndjson_export_matches_api_representation(self):
+        self._create(3)
+        response = self.client.get(self.url, {'format': 'ndjson'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = [json.loads(line) for line in self._content(response).splitlines()]
+        api_rows = json.loads(self.client.get(reverse('expense-list')).content)
+        self.assertEqual(lines, api_rows)
+
+    def test_memory_stays_flat_as_export_grows(self):
+        def peak_memory(count):
+            self._create(count - Expense.objects.count())
+            tracemalloc.start()
+            response = self.client.get(self.url, {'format': 'csv'})
+            size = sum(len(chunk) for chunk in response.streaming_content)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return size, peak
+
+        with patch.object(ExpenseViewSet, 'export_chunk_size', 200):
+            small_size, small_peak = peak_memory(1000)
+            large_size, large_peak = peak_memory(10000)
+
+        self.assertGreater(large_size, small_size * 9)
+        self.assertLess(large_peak, small_peak * 1.5)
+
+class ImportExpensesCommandTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.user = User.objects.create_user(username='importer', password='testpass123')
+
+    def _write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', newline='') as handle:
+            handle.write(content)
+        return path
+
+    def _import(self, path, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_expenses', path, '--user', 'importer', *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_csv_import_validates_and_dedupes(self):
+        Expense.objects.create(description="Coffee", amount=Decimal("3.50"),
+                               category="Food & Dining", date=date(2024, 5, 1), owner=self.user)
+        path = self._write('statement.csv', (
+            "date,description,amount,category\n"
+            "2024-05-01,Coffee,3.50,Food & Dining\n"
+            "2024-05-02,Bus pass,45.00,Transportation\n"
+            "2024-05-02,Bus pass,45.00,Transportation\n"
+            "2024-05-03,Mystery,10.00,Not A Category\n"
+            "2024-05-03,Too precise,1.005,Other\n"
+            "2024-05-03,Too large,100000000.00,Other\n"
+            "2024-05-04,Books,28.99,Education\n"
+        ))
+
+        stdout, stderr = self._import(path, '--chunk-size', '2')
+
+        self.assertEqual(
+            sorted(Expense.objects.values_list('description', flat=True)),
+            ["Books", "Bus pass", "Coffee"]
+        )
+        self.assertIn("2 duplicates and 3 invalid rows skipped", stdout)
+        self.assertIn("Row 4: unknown category", stderr)
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+        rollup = ExpenseRollup.objects.get(granularity='year', category="Education")
+        self.assertEqual(rollup.total, Decimal("28.99"))
+
+    def test_resume_from_checkpoint(self):
+        path = self._write('statement.csv', "date,description,amount,category\n" + "".join(
+            f"2024-06-{day:02d},Lunch {day},12.00,Food & Dining\n" for day in range(1, 6)
+        ))
+        with open(path + '.checkpoint', 'w') as handle:
+            json.dump({'path': path, 'size': os.path.getsize(path), 'owner_id': self.user.id, 'rows_done': 3,
+                       'imported': 3, 'duplicates': 0, 'invalid': 0}, handle)
+
+        self._import(path, '--resume')
+
+        self.assertEqual(
+            list(Expense.objects.order_by('date').values_list('description', flat=True)),
+            ["Lunch 4", "Lunch 5"]
+        )
+
+    def test_csv_currency_column(self):
+        path = self._write('statement.csv', (
+            "date,description,amount,category,currency\n"
+            "2024-05-01,Croissant,2.40,Food & Dining,eur\n"
+            "2024-05-01,Bagel,3.10,Food & Dining,\n"
+            "2024-05-02,Museum,18.00,Entertainment,EURO\n"
+        ))
+
+        stdout, stderr = self._import(path, '--currency', 'GBP')
+
+        self.assertEqual(dict(Expense.objects.values_list('description', 'currency')),
+                         {"Croissant": "EUR", "Bagel": "GBP"})
+        self.assertIn("Row 3: invalid currency 'EURO'", stderr)
+        self.assertEqual(
+            dict(ExpenseRollup.objects.filter(granularity='year').values_list('currency', 'total')),
+            {"EUR": Decimal("2.40"), "GBP": Decimal("3.10")}
+        )
+
+    def test_ofx_import(self):
+        path = self._write('statement.ofx', (
+            "<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n"
+            "<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20240701120000\n<TRNAMT>-64.20\n<NAME>Pharmacy\n</STMTTRN>\n"
+            "<STMTTRN>\n<TRNTYPE>CREDIT\n<DTPOSTED>20240702\n<TRNAMT>1500.00\n<NAME>Salary\n</STMTTRN>\n"
+            "</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n"
+        ))
+
+        self._import(path, '--default-category', 'Healthcare')
+
+        expense = Expense.objects.get()
+        self.assertEqual(
+            (expense.description, expense.amount, expense.category, expense.date),
+            ("Pharmacy", Decimal("64.20"), "Healthcare", date(2024, 7, 1))
+        )
+        self.assertEqual(expense.owner, self.user)
+
+class ExpenseQueryPlanTests(TestCase):
+    """Fails when a hot expense query stops using an index on a large table."""
+    row_count = 20000
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = [choice for choice, _ in Expense.CATEGORY_CHOICES]
+        owners = [User.objects.create_user(username=f'planner-{i}').id for i in range(4)]
+        cls.owner_id = owners[0]
+        Expense.objects.bulk_create(
+            (
+                Expense(description=f"Seeded expense {i}", amount=Decimal(i % 700) + Decimal("0.45"),
+                        category=categories[i % len(categories)],
+                        date=date(2020, 1, 1) + timedelta(days=i // 10), owner_id=owners[i % len(owners)])
+                for i in range(cls.row_count)
+            ),
+            batch_size=2000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            # The table is partitioned by month (migration 0008). The few
+            # partitions left after pruning may be read whole, but a query
+            # must not read many of them.
+            self.assertLessEqual(len(re.findall(r'Seq Scan on expenses_expense', plan)), 3)
+        else:
+            # SQLite reports a full table scan as a bare "SCAN <table>".
+            self.assertNotRegex(plan, r'SCAN expenses_expense\s*$|SCAN expenses_expense\n')
+            self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_keyset_page(self):
+        cursor_date, cursor_id = date(2024, 3, 1), 15000
+        self.assertUsesIndex(
+            Expense.objects.filter(owner_id=self.owner_id, date__lte=cursor_date)
+            .filter(Q(date__lt=cursor_date) | Q(id__lt=cursor_id))
+            .order_by('-date', '-id')[:51]
+        )
+
+    def test_date_range(self):
+        self.assertUsesIndex(
+            Expense.objects.filter(owner_id=self.owner_id, date__gte=date(2024, 1, 1), date__lte=date(2024, 1, 31))
+            .order_by('-date', '-id')
+        )
+
+    def test_category_and_date_range(self):
+        self.assertUsesIndex(
+            Expense.objects.filter(owner_id=self.owner_id, category="Travel",
+                                   date__gte=date(2024, 1, 1), date__lte=date(2024, 3, 31))
+        )
+
+    def test_category_totals_by_date(self):
+        self.assertUsesIndex(
+            Expense.objects.filter(owner_id=self.owner_id, category="Travel", date__gte=date(2024, 1, 1))
+            .values('date').annotate(total=Sum('amount')).order_by('date')
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'trigram index is PostgreSQL only')
+    def test_description_search(self):
+        self.assertUsesIndex(Expense.objects.filter(owner_id=self.owner_id, description__icontains='expense 1234'))
+
+class ExpenseSummaryCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cached', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('expense-summary')
+
+    def _total(self, response):
+        return sum(row['total'] for row in response.data['category_totals'])
+
+    def test_summary_reflects_writes_immediately(self):
+        self.assertEqual(self._total(self.client.get(self.url)), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(description="Taxi", amount=Decimal("19.00"),
+                                   category="Transportation", date=date(2024, 4, 2), owner=self.user)
+
+        self.assertEqual(self._total(self.client.get(self.url)), Decimal("19.00"))
+
+    def test_entries_are_per_user_and_parameters(self):
+        compute = Mock(return_value={'value': 1})
+        cached_summary(1, {'timeframe': 'weekly'}, compute)
+        cached_summary(1, {'timeframe': 'weekly'}, compute)
+        cached_summary(2, {'timeframe': 'weekly'}, compute)
+        cached_summary(1, {'timeframe': 'yearly'}, compute)
+        self.assertEqual(compute.call_count, 3)
+
+    def test_generation_bump_invalidates(self):
+        compute = Mock(side_effect=[{'value': 1}, {'value': 2}])
+        self.assertEqual(cached_summary(1, {}, compute), {'value': 1})
+        bump_generation([1])
+        self.assertEqual(cached_summary(1, {}, compute), {'value': 2})
+
+    def test_writes_by_other_processes_invalidate(self):
+        compute = Mock(side_effect=[{'value': 1}, {'value': 2}])
+        self.assertEqual(cached_summary(1, {}, compute), {'value': 1})
+        # A job or another worker shares only the database with this process.
+        DataGeneration.objects.filter(key='user:1').update(generation=F('generation') + 1)
+        self.assertEqual(cached_summary(1, {}, compute), {'value': 2})
+
+    def test_stale_entry_served_while_another_request_refreshes(self):
+        cached_summary(1, {}, Mock(return_value={'value': 'old'}))
+        key = summary_key(1, {}, data_version(1))
+        cache.add(f'{key}:lock', 1)  # someone else is refreshing
+        compute = Mock(return_value={'value': 'new'})
+
+        with patch('expenses.cache.time.time', return_value=time.time() + SUMMARY_FRESH_SECONDS + 1):
+            self.assertEqual(cached_summary(1, {}, compute), {'value': 'old'})
+        compute.assert_not_called()
+
+        cache.delete(f'{key}:lock')
+        with patch('expenses.cache.time.time', return_value=time.time() + SUMMARY_FRESH_SECONDS + 1):
+            self.assertEqual(cached_summary(1, {}, compute), {'value': 'new'})
+
+    def test_single_flight_waits_for_the_computing_request(self):
+        key = summary_key(1, {}, data_version(1))
+        cache.add(f'{key}:lock', 1)
+        compute = Mock(return_value={'value': 'mine'})
+
+        def other_request_finishes(seconds):
+            cache.set(key, {'data': {'value': 'theirs'}, 'fresh_until': time.time() + 60})
+
+        with patch('expenses.cache.time.sleep', side_effect=other_request_finishes):
+            self.assertEqual(cached_summary(1, {}, compute), {'value': 'theirs'})
+        compute.assert_not_called()
+
+class ExpenseListFastPathTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='lean', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('expense-list')
+        for i in range(5):
+            Expense.objects.create(description=f"Lean \"{i}\" ünïcode", amount=Decimal("0.10") * (i + 1),
+                                   category="Personal Care", date=date(2024, 8, 1 + i), owner=self.user)
+
+    def _serializer_json(self, fields=None):
+        queryset = Expense.objects.order_by('-date', '-id')
+        data = ExpenseSerializer(queryset, many=True).data
+        if fields is not None:
+            data = [{name: row[name] for name in fields} for row in data]
+        return JSONRenderer().render(data)
+
+    def test_fast_path_is_byte_identical_to_serializer(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.content, self._serializer_json())
+
+    def test_sparse_fieldsets(self):
+        response = self.client.get(self.url, {'fields': 'amount,id'})
+        self.assertEqual(response.content, self._serializer_json(fields=['id', 'amount']))
+        self.assertEqual(list(response.data[0]), ['id', 'amount'])
+
+    def test_sparse_fieldsets_with_pagination(self):
+        response = self.client.get(self.url, {'fields': 'description', 'page_size': 2})
+        self.assertEqual(response.data['results'], [
+            {'description': 'Lean "4" ünïcode'}, {'description': 'Lean "3" ünïcode'}
+        ])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_unknown_field(self):
+        response = self.client.get(self.url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class ExpenseConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='etagger', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.list_url = reverse('expense-list')
+        self.summary_url = reverse('expense-summary')
+        Expense.objects.create(description="Internet", amount=Decimal("49.99"),
+                               category="Utilities", date=date(2024, 9, 1), owner=self.user)
+
+    def test_matching_etag_returns_304_after_one_query(self):
+        for url in (self.list_url, self.summary_url):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn('private', response['Cache-Control'])
+
+            # Only the data version is read.
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response.content, b'')
+
+    def test_if_modified_since(self):
+        response = self.client.get(self.list_url)
+        response = self.client.get(self.list_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_with_writes_and_parameters(self):
+        etag = self.client.get(self.list_url)['ETag']
+        self.assertNotEqual(self.client.get(self.list_url, {'category': 'Utilities'})['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(description="Phone", amount=Decimal("20.00"),
+                                   category="Utilities", date=date(2024, 9, 2), owner=self.user)
+
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_version_commits_with_the_write(self):
+        etag = self.client.get(self.list_url)['ETag']
+        # No on_commit callback runs here: the generation is written with the expense.
+        Expense.objects.create(description="Phone", amount=Decimal("20.00"),
+                               category="Utilities", date=date(2024, 9, 2), owner=self.user)
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class AsyncExpenseViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='asyncuser', password='testpass123')
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        for day in range(1, 6):
+            Expense.objects.create(description=f"Coffee {day}", amount=Decimal("3.50"),
+                                   category="Food", date=date(2024, 3, day), owner=self.user)
+        Expense.objects.create(description="Bus", amount=Decimal("2.00"),
+                               category="Transportation", date=date(2024, 3, 6), owner=self.user)
+        self.api = APIClient()
+        self.api.force_authenticate(user=self.user)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(reverse('async-expense-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+
+        response = await self.async_client.get(
+            reverse('async-expense-list'), headers={'Authorization': 'Bearer not-a-token'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_list_matches_sync_endpoint(self):
+        for params in ({}, {'category': 'Food', 'fields': 'id,amount'}, {'page_size': 2}):
+            response = await self.async_client.get(
+                reverse('async-expense-list'), params, headers=self.headers
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            expected = await sync_to_async(self.api.get)(reverse('expense-list'), params)
+            if 'page_size' in params:
+                self.assertEqual(len(response.json()['results']), 2)
+                self.assertIn('/api/async/expenses/', response.json()['next'])
+            else:
+                self.assertEqual(response.content, expected.content)
+
+    async def test_list_rejects_bad_filters(self):
+        response = await self.async_client.get(
+            reverse('async-expense-list'), {'min_amount': 'abc'}, headers=self.headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('min_amount', response.json())
+
+    async def test_detail(self):
+        expense = await Expense.objects.aget(description="Bus")
+        response = await self.async_client.get(
+            reverse('async-expense-detail', args=[expense.pk]), headers=self.headers
+        )
+        self.assertEqual(response.json(), ExpenseSerializer(expense).data)
+
+        response = await self.async_client.get(
+            reverse('async-expense-detail', args=[expense.pk + 1000]), headers=self.headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_summary_and_conditional_get(self):
+        response = await self.async_client.get(reverse('async-expense-summary'), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        totals = {row['category']: Decimal(str(row['total'])) for row in response.json()['category_totals']}
+        self.assertEqual(totals, {'Food': Decimal('17.50'), 'Transportation': Decimal('2.00')})
+
+        response = await self.async_client.get(
+            reverse('async-expense-summary'), headers={**self.headers, 'If-None-Match': response['ETag']}
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_health_check(self):
+        response = await self.async_client.get(reverse('async-health-check'))
+        self.assertEqual(response.json(), {'status': 'ok'})
+
+        response = await self.async_client.post(reverse('async-health-check'))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class ExpenseAnalyticsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='analyst', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('expense-analytics')
+        for description, amount, category, day in [
+            ("Rent", "1200.00", "Housing", date(2024, 1, 1)),
+            ("Groceries", "80.00", "Food", date(2024, 1, 5)),
+            ("Lunch", "12.50", "Food", date(2024, 1, 20)),
+            ("Dinner", "45.00", "Food", date(2024, 2, 3)),
+            ("Bus", "2.75", "Transportation", date(2024, 2, 10)),
+        ]:
+            Expense.objects.create(description=description, amount=Decimal(amount),
+                                   category=category, date=day, owner=self.user)
+
+    def test_month_by_category_in_one_query(self):
+        # The data version, then the statistics.
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {
+                'group_by': 'month,category', 'metrics': 'sum,count,avg,min,max',
+            })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['group_by'], ['month', 'category'])
+        self.assertEqual(response.data['rows'], [
+            {'month': '2024-01-01', 'category': 'Food', 'sum': '92.50', 'count': 2,
+             'avg': '46.25', 'min': '12.50', 'max': '80.00'},
+            {'month': '2024-01-01', 'category': 'Housing', 'sum': '1200.00', 'count': 1,
+             'avg': '1200.00', 'min': '1200.00', 'max': '1200.00'},
+            {'month': '2024-02-01', 'category': 'Food', 'sum': '45.00', 'count': 1,
+             'avg': '45.00', 'min': '45.00', 'max': '45.00'},
+            {'month': '2024-02-01', 'category': 'Transportation', 'sum': '2.75', 'count': 1,
+             'avg': '2.75', 'min': '2.75', 'max': '2.75'},
+        ])
+
+    def test_amount_buckets_percentiles_and_filters(self):
+        response = self.client.get(self.url, {
+            'group_by': 'amount_bucket', 'metrics': 'count', 'buckets': '10,100',
+        })
+        self.assertEqual(response.data['rows'], [
+            {'amount_bucket': '<10', 'count': 1},
+            {'amount_bucket': '10-100', 'count': 3},
+            {'amount_bucket': '>=100', 'count': 1},
+        ])
+
+        response = self.client.get(self.url, {'metrics': 'p50,p90,count', 'category': 'Food'})
+        # percentile_cont over 12.50, 45.00, 80.00
+        self.assertEqual(response.data['rows'], [{'p50': '45.00', 'p90': '73.00', 'count': 3}])
+
+    def test_rejects_unknown_dimensions_and_metrics(self):
+        for params in ({'group_by': 'owner'}, {'metrics': 'median'}, {'group_by': 'month,year'},
+                       {'buckets': 'ten'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class ExpenseTimeseriesTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='forecaster', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('expense-timeseries')
+        for description, amount, category, day in [
+            ("Deposit", "500.00", "Housing", date(2023, 12, 15)),
+            ("Groceries", "70.00", "Food", date(2024, 1, 29)),
+            ("Lunch", "14.00", "Food", date(2024, 1, 31)),
+            ("Bus", "7.00", "Transportation", date(2024, 1, 31)),
+            ("Dinner", "21.00", "Food", date(2024, 2, 2)),
+        ]:
+            Expense.objects.create(description=description, amount=Decimal(amount),
+                                   category=category, date=day, owner=self.user)
+
+    def test_zero_filled_running_totals_in_one_query(self):
+        # The data version, then the series.
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'start': '2024-01-30', 'end': '2024-02-03'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = response.data['rows']
+        self.assertEqual([row['date'] for row in rows],
+                         ['2024-01-30', '2024-01-31', '2024-02-01', '2024-02-02', '2024-02-03'])
+        self.assertEqual([row['total'] for row in rows], ['0.00', '21.00', '0.00', '21.00', '0.00'])
+        self.assertEqual([row['cumulative'] for row in rows],
+                         ['570.00', '591.00', '591.00', '612.00', '612.00'])
+        # Month-to-date restarts on the first of February.
+        self.assertEqual([row['month_to_date'] for row in rows],
+                         ['70.00', '91.00', '0.00', '21.00', '21.00'])
+        # 2024-02-03 looks back to 2024-01-28: 70 + 14 + 7 + 21 over 7 days.
+        self.assertEqual(rows[-1]['rolling_7'], '16.00')
+        self.assertEqual(rows[-1]['rolling_30'], '3.73')
+
+    def test_per_category_and_category_filter(self):
+        response = self.client.get(self.url, {'start': '2024-02-01', 'end': '2024-02-02', 'by_category': 'true'})
+        rows = {(row['category'], row['date']): row for row in response.data['rows']}
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[('Food', '2024-02-02')]['cumulative'], '105.00')
+        self.assertEqual(rows[('Food', '2024-02-02')]['month_to_date'], '21.00')
+        self.assertEqual(rows[('Housing', '2024-02-01')]['cumulative'], '500.00')
+        self.assertEqual(rows[('Transportation', '2024-02-02')]['rolling_7'], '1.00')
+
+        response = self.client.get(self.url, {'start': '2024-02-02', 'end': '2024-02-02', 'category': 'Food'})
+        self.assertEqual(response.data['rows'], [{
+            'date': '2024-02-02', 'total': '21.00', 'cumulative': '105.00', 'month_to_date': '21.00',
+            'rolling_7': '15.00', 'rolling_30': '3.50',
+        }])
+
+    def test_invalid_ranges(self):
+        for params in ({'start': 'yesterday'}, {'start': '2024-02-02', 'end': '2024-02-01'},
+                       {'start': '2000-01-01', 'end': '2024-01-01'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class ExpenseSearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='searcher', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('expense-search')
+        for description, category, day in [
+            ("Coffee with Sam", "Food & Dining", date(2024, 3, 1)),
+            ("Coffee beans and coffee filters", "Shopping", date(2024, 3, 2)),
+            ("Train to the coffee festival", "Transportation", date(2024, 3, 3)),
+            ("Monthly rent", "Housing", date(2024, 3, 4)),
+        ]:
+            Expense.objects.create(description=description, amount=Decimal("5.00"),
+                                   category=category, date=day, owner=self.user)
+
+    def descriptions(self, response):
+        return [row['description'] for row in response.data['results']]
+
+    def test_ranked_prefix_matches(self):
+        response = self.client.get(self.url, {'search': 'coff', 'fields': 'id,description'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.descriptions(response)[0], "Coffee beans and coffee filters")
+        self.assertEqual(len(response.data['results']), 3)
+        ranks = [row['rank'] for row in response.data['results']]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+
+    def test_combines_with_filters_and_list(self):
+        response = self.client.get(self.url, {'search': 'coffee', 'category': 'Transportation'})
+        self.assertEqual(self.descriptions(response), ["Train to the coffee festival"])
+
+        response = self.client.get(reverse('expense-list'), {'search': 'coffee sam'})
+        self.assertEqual([row['description'] for row in response.data], ["Coffee with Sam"])
+
+    def test_index_follows_writes(self):
+        rent = Expense.objects.get(description="Monthly rent")
+        rent.description = "Monthly espresso subscription"
+        rent.save()
+        Expense.objects.filter(description="Coffee with Sam").delete()
+        Expense.objects.bulk_create([Expense(description="Espresso machine", amount=Decimal("99.00"),
+                                             category="Shopping", date=date(2024, 3, 5), owner=self.user)])
+
+        response = self.client.get(self.url, {'search': 'espresso'})
+        self.assertEqual(sorted(self.descriptions(response)),
+                         ["Espresso machine", "Monthly espresso subscription"])
+        self.assertEqual(self.client.get(self.url, {'search': 'sam'}).data['results'], [])
+        self.assertEqual(self.client.get(self.url, {'search': 'rent'}).data['results'], [])
+
+    def test_requires_search_terms(self):
+        for params in ({}, {'search': ' '}, {'search': 'coffee', 'limit': '0'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+        response = self.client.get(self.url, {'search': '!!!'})
+        self.assertEqual(response.data['results'], [])
+
+
+class SeedExpensesCommandTests(TestCase):
+    def _seed(self, *args):
+        call_command('seed_expenses', '--end-date', '2024-06-30', *args, stdout=StringIO())
+        return list(Expense.objects.order_by('id').values_list('description', 'amount', 'category', 'date'))
+
+    def test_reproducible_users_and_rollups(self):
+        first = self._seed('--users', '3', '--expenses', '400', '--seed', '7', '--chunk-size', '250')
+        self.assertEqual(len(first), 1200)
+        self.assertEqual(User.objects.filter(username__startswith='seed-user-').count(), 3)
+        self.assertEqual(self._seed('--users', '3', '--expenses', '400', '--seed', '7'), first)
+        self.assertNotEqual(self._seed('--users', '3', '--expenses', '400', '--seed', '8'), first)
+
+        self.assertTrue(all(date(2023, 7, 2) <= row[3] <= date(2024, 6, 30) for row in first))
+        self.assertTrue({row[2] for row in first} <= {choice for choice, _ in Expense.CATEGORY_CHOICES})
+        amounts = sorted(row[1] for row in first)
+        # Heavy tail: the largest amounts dwarf the median.
+        self.assertGreater(amounts[-1], amounts[len(amounts) // 2] * 20)
+
+        seeded = list(ExpenseRollup.objects.values_list('granularity', 'period', 'category', 'total', 'count'))
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(
+            list(ExpenseRollup.objects.values_list('granularity', 'period', 'category', 'total', 'count')),
+            seeded
+        )
+
+    def test_append_keeps_rows_and_indexes_them(self):
+        user = User.objects.create_user(username='seed-searcher', password='testpass123')
+        self._seed('--expenses', '50', '--user', 'seed-searcher')
+        rows = self._seed('--expenses', '50', '--seed', '1', '--append', '--user', 'seed-searcher')
+        self.assertEqual(len(rows), 100)
+        self.assertEqual(Expense.objects.filter(owner=user).count(), 100)
+        self.assertEqual(ExpenseRollup.objects.filter(granularity='year').aggregate(n=Sum('count'))['n'], 100)
+        word = rows[-1][0].split()[0]
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get(reverse('expense-list'), {'search': word})
+        self.assertEqual(len(response.data), sum(1 for row in rows if word.lower() in row[0].lower().split()))
+
+    def test_unknown_user(self):
+        with self.assertRaises(CommandError):
+            self._seed('--user', 'nobody')
+
+
+class ExpenseOwnershipTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', password='testpass123')
+        self.other = User.objects.create_user(username='neighbour', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.mine = Expense.objects.create(description="Groceries", amount=Decimal("40.00"),
+                                           category="Food & Dining", date=date(2024, 5, 1), owner=self.user)
+        self.theirs = Expense.objects.create(description="Groceries", amount=Decimal("900.00"),
+                                             category="Shopping", date=date(2024, 5, 2), owner=self.other)
+
+    def test_other_users_expenses_are_invisible(self):
+        response = self.client.get(reverse('expense-list'))
+        self.assertEqual([row['id'] for row in response.data], [self.mine.id])
+
+        response = self.client.get(reverse('expense-detail', args=[self.theirs.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(reverse('expense-search'), {'search': 'groceries'})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.mine.id])
+
+        response = self.client.get(reverse('expense-summary'))
+        self.assertEqual(response.data['category_totals'], [{'category': "Food & Dining", 'total': Decimal("40.00")}])
+
+    def test_writes_are_owned_and_scoped(self):
+        response = self.client.post(reverse('expense-list'), {
+            'description': "Taxi", 'amount': '15.00', 'category': "Transportation", 'date': '2024-05-03',
+        }, format='json')
+        self.assertEqual(Expense.objects.get(pk=response.data['id']).owner, self.user)
+
+        response = self.client.patch(reverse('expense-bulk'), [{'id': self.theirs.id, 'amount': '1.00'}],
+                                     format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.delete(reverse('expense-detail', args=[self.theirs.id]))
+        self.assertNotEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.theirs.refresh_from_db()
+        self.assertEqual(self.theirs.amount, Decimal("900.00"))
+
+    def test_writes_only_invalidate_the_owners_summaries(self):
+        self.client.get(reverse('expense-summary'))
+        other_generation, generation = get_generation(self.other.id), get_generation(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(description="Cinema", amount=Decimal("12.00"),
+                                   category="Entertainment", date=date(2024, 5, 4), owner=self.other)
+
+        self.assertEqual(get_generation(self.user.id), generation)
+        self.assertNotEqual(get_generation(self.other.id), other_generation)
+        self.assertEqual(ExpenseRollup.objects.filter(owner=self.user, granularity='year').get().total,
+                         Decimal("40.00"))
+
+
+class ExpensePartitionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='archivist', password='testpass123')
+
+    def _create(self, *days):
+        for day in days:
+            Expense.objects.create(description=f"Expense on {day}", amount=Decimal("10.00"),
+                                   category="Other", date=day, owner=self.user)
+
+    def test_month_arithmetic(self):
+        self.assertEqual(next_month(date(2023, 12, 1)), date(2024, 1, 1))
+        self.assertEqual(partition_name(date(2024, 3, 1)), 'expenses_expense_p2024_03')
+
+    @skipUnless(connection.vendor != 'postgresql', 'PostgreSQL partitions the table')
+    def test_archive_requires_partitioning(self):
+        with self.assertRaises(CommandError):
+            call_command('archive_expenses', stdout=StringIO())
+
+    @skipUnless(connection.vendor == 'postgresql', 'partitioning is PostgreSQL only')
+    def test_date_filters_prune_partitions(self):
+        self._create(date(2023, 11, 5), date(2023, 12, 5), date(2024, 1, 5), date(2024, 2, 5))
+        plan = Expense.objects.filter(owner=self.user, date__gte=date(2024, 1, 1),
+                                      date__lte=date(2024, 1, 31)).explain()
+        self.assertIn('expenses_expense_p2024_01', plan)
+        for other in ('expenses_expense_p2023_11', 'expenses_expense_p2023_12',
+                      'expenses_expense_p2024_02', DEFAULT_PARTITION):
+            self.assertNotIn(other, plan)
+
+    @skipUnless(connection.vendor == 'postgresql', 'partitioning is PostgreSQL only')
+    def test_partitions_are_created_on_write(self):
+        with connection.cursor() as cursor:
+            # Raw SQL for a month without a partition lands in the DEFAULT one...
+            cursor.execute(
+                'INSERT INTO expenses_expense (owner_id, description, amount, category, date, created_at) '
+                "VALUES (%s, 'Raw', 1, 'Other', '1998-02-10', now())", [self.user.id],
+            )
+            self._create(date(1998, 2, 20))
+            # ...and moves out of it once the ORM writes to that month.
+            cursor.execute(f'SELECT count(*) FROM {partition_name(date(1998, 2, 1))}')
+            self.assertEqual(cursor.fetchone()[0], 2)
+            cursor.execute(f'SELECT count(*) FROM {DEFAULT_PARTITION}')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertIn((date(1998, 2, 1), 'expenses_expense_p1998_02'), list_partitions())
+        self.assertEqual(Expense.objects.filter(date__year=1998).count(), 2)
+
+    @skipUnless(connection.vendor == 'postgresql', 'partitioning is PostgreSQL only')
+    def test_archive_exports_and_detaches_old_months(self):
+        self._create(date(1997, 1, 10), date(1997, 1, 11), date(1997, 2, 10))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        call_command('archive_expenses', '--before', '1997-02-01', '--export-dir', directory.name,
+                     stdout=StringIO())
+
+        self.assertEqual(list(Expense.objects.filter(date__year=1997).values_list('date', flat=True)),
+                         [date(1997, 2, 10)])
+        self.assertEqual(ExpenseRollup.objects.get(granularity='year', period=date(1997, 1, 1)).count, 1)
+        self.assertNotIn('expenses_expense_p1997_01', dict(list_partitions()).values())
+        with gzip.open(os.path.join(directory.name, 'expenses_1997_01.csv.gz'), 'rt') as handle:
+            rows = list(csv.DictReader(handle))
+        self.assertEqual(sorted(row['date'] for row in rows), ['1997-01-10', '1997-01-11'])
+
+
+class RecurringExpenseTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='subscriber', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def _schedule(self, **fields):
+        fields = {'owner': self.user, 'description': "Rent", 'amount': Decimal("1200.00"), 'category': "Housing",
+                  'frequency': RecurringExpense.MONTHLY, 'start_date': date(2024, 1, 31), **fields}
+        schedule = RecurringExpense(**fields)
+        reschedule(schedule)
+        schedule.save()
+        return schedule
+
+    def test_monthly_occurrences_keep_the_day(self):
+        dates = [occurrence(RecurringExpense.MONTHLY, 1, date(2024, 1, 31), n) for n in range(4)]
+        self.assertEqual(dates, [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)])
+        self.assertEqual(occurrence(RecurringExpense.YEARLY, 1, date(2024, 2, 29), 1), date(2025, 2, 28))
+        self.assertEqual(occurrence(RecurringExpense.WEEKLY, 2, date(2024, 1, 1), 3), date(2024, 2, 12))
+
+    def test_materialize_catches_up_once(self):
+        rent = self._schedule()
+        self._schedule(description="Gym", amount=Decimal("30.00"), category="Personal Care",
+                       frequency=RecurringExpense.WEEKLY, start_date=date(2024, 1, 1), count=3)
+
+        self.assertEqual(materialize(date(2024, 6, 15), batch_size=1), (2, 8))
+        self.assertEqual(
+            list(rent.expenses.order_by('date').values_list('date', flat=True)),
+            [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30), date(2024, 5, 31)]
+        )
+        self.assertEqual(ExpenseRollup.objects.get(owner=self.user, granularity='year', category="Housing").total,
+                         Decimal("6000.00"))
+        rent.refresh_from_db()
+        self.assertEqual(rent.next_date, date(2024, 6, 30))
+
+        # Nothing new until the next occurrence; the gym schedule has ended.
+        self.assertEqual(materialize(date(2024, 6, 29)), (0, 0))
+        self.assertEqual(materialize(date(2024, 7, 1)), (1, 1))
+        self.assertEqual(Expense.objects.count(), 9)
+
+    def test_overlapping_runs_do_not_duplicate(self):
+        rent = self._schedule(until=date(2024, 3, 31))
+        materialize(date(2024, 12, 31))
+        # A run that read the schedule before the first one moved its cursor.
+        RecurringExpense.objects.filter(pk=rent.pk).update(next_date=date(2024, 1, 31))
+        self.assertEqual(materialize(date(2024, 12, 31)), (1, 0))
+        self.assertEqual(Expense.objects.filter(recurring=rent).count(), 3)
+        self.assertEqual(ExpenseRollup.objects.get(owner=self.user, granularity='year').count, 3)
+
+    def test_api(self):
+        start = timezone.localdate() - timedelta(days=20)
+        response = self.client.post(reverse('recurring-expense-list'), {
+            'description': "Streaming", 'amount': '9.99', 'category': "Entertainment",
+            'frequency': 'weekly', 'start_date': start.isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['next_date'], start.isoformat())
+        schedule_url = reverse('recurring-expense-detail', args=[response.data['id']])
+
+        response = self.client.post(reverse('recurring-expense-materialize'))
+        self.assertEqual(response.data, {'schedules': 1, 'expenses': 3})
+        self.assertEqual(len(self.client.get(reverse('expense-list')).data), 3)
+
+        # Pausing and resuming skips the occurrences in between.
+        self.client.patch(schedule_url, {'active': False}, format='json')
+        RecurringExpense.objects.update(start_date=start - timedelta(weeks=10))
+        response = self.client.patch(schedule_url, {'active': True}, format='json')
+        self.assertGreaterEqual(date.fromisoformat(response.data['next_date']), timezone.localdate())
+
+        response = self.client.post(reverse('recurring-expense-list'), {
+            'description': "Bad", 'amount': '1.00', 'category': "Other", 'frequency': 'daily',
+            'start_date': '2024-02-01', 'until': '2024-01-01',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        other = User.objects.create_user(username='nonsubscriber', password='testpass123')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(reverse('recurring-expense-list')).data['results'], [])
+        self.assertEqual(self.client.get(schedule_url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_command(self):
+        self._schedule(start_date=date(2020, 1, 1))
+        stdout = StringIO()
+        call_command('materialize_recurring', '--date', '2020-12-31', stdout=stdout)
+        self.assertIn('Successfully materialized 12 expenses from 1 recurring expenses', stdout.getvalue())
+
+
+class CurrencyTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='traveler', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        # Values in USD, the base currency; no GBP rates at all.
+        with self.captureOnCommitCallbacks(execute=True):
+            load_rates([('EUR', date(2024, 1, 1), Decimal('1.10')), ('EUR', date(2024, 1, 10), Decimal('1.20'))])
+        self.addCleanup(rates.reset)
+        for description, amount, currency, day in [
+            ("Hotel", "100.00", "EUR", date(2024, 1, 5)),
+            ("Train", "50.00", "EUR", date(2024, 1, 13)),
+            ("Taxi", "20.00", "USD", date(2024, 1, 5)),
+            ("Tea", "10.00", "GBP", date(2024, 1, 6)),
+        ]:
+            Expense.objects.create(description=description, amount=Decimal(amount), currency=currency,
+                                   category="Travel", date=day, owner=self.user)
+
+    def test_rate_table_is_indexed_by_date(self):
+        self.assertEqual(rates.rate('EUR', date(2023, 12, 31)), None)
+        self.assertEqual(rates.rate('EUR', date(2024, 1, 9)), Decimal('1.10'))
+        self.assertEqual(rates.rate('EUR', date(2024, 2, 1)), Decimal('1.20'))
+        self.assertEqual(rates.rate('USD', date(2000, 1, 1)), Decimal(1))
+        self.assertEqual(rates.convert(Decimal('100.00'), 'EUR', 'USD', date(2024, 1, 5)), Decimal('110.00'))
+        self.assertEqual(rates.convert(Decimal('12.00'), 'USD', 'EUR', date(2024, 1, 12)), Decimal('10.00'))
+        self.assertIsNone(rates.convert(Decimal('1.00'), 'GBP', 'USD', date(2024, 1, 5)))
+
+    def test_rollups_are_kept_per_currency(self):
+        totals = dict(ExpenseRollup.objects.filter(granularity='year').values_list('currency', 'total'))
+        self.assertEqual(totals, {'EUR': Decimal('150.00'), 'USD': Decimal('20.00'), 'GBP': Decimal('10.00')})
+
+        taxi = Expense.objects.get(description="Taxi")
+        taxi.currency = 'EUR'
+        taxi.save()
+        totals = dict(ExpenseRollup.objects.filter(granularity='year').values_list('currency', 'total'))
+        self.assertEqual(totals, {'EUR': Decimal('170.00'), 'GBP': Decimal('10.00')})
+
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(
+            dict(ExpenseRollup.objects.filter(granularity='year').values_list('currency', 'total')), totals
+        )
+
+    def test_summary_converts_in_the_aggregation_queries(self):
+        # One query to spot other currencies, then series, categories and unconverted.
+        with self.assertNumQueries(4):
+            data = compute_summary(self.user.id, 'monthly', 'USD')
+        # 100 EUR at 1.10, 50 EUR at 1.20, 20 USD; the GBP tea has no rate.
+        self.assertEqual(data['time_series'], [{'period': date(2024, 1, 1), 'total': Decimal('190.00')}])
+        self.assertEqual(data['category_totals'], [{'category': "Travel", 'total': Decimal('190.00')}])
+        self.assertEqual(data['unconverted_count'], 1)
+
+        response = self.client.get(reverse('expense-summary'), {'currency': 'eur', 'timeframe': 'weekly'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['currency'], 'EUR')
+        # 20 USD at 1.10 is 18.18 EUR.
+        self.assertEqual(response.data['time_series'], [
+            {'period': date(2024, 1, 1), 'total': Decimal('118.18')},
+            {'period': date(2024, 1, 8), 'total': Decimal('50.00')},
+        ])
+
+        response = self.client.get(reverse('expense-summary'), {'currency': 'JPY'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rates_stamped_before_the_users_last_write_invalidate(self):
+        url = reverse('expense-summary')
+        response = self.client.get(url)
+        self.assertEqual(response.data['time_series'][0]['total'], Decimal('190.00'))
+
+        # Committed later, but stamped earlier (another host's clock).
+        earlier = get_generation(self.user.id) - 1
+        with patch('expenses.models.time.time_ns', return_value=earlier):
+            load_rates([('EUR', date(2024, 1, 1), Decimal('2.00'))])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # 100 EUR at 2.00, 50 EUR at 1.20, 20 USD.
+        self.assertEqual(response.data['time_series'][0]['total'], Decimal('280.00'))
+
+    def test_rate_changes_reach_every_process(self):
+        url = reverse('expense-summary')
+        etag = self.client.get(url)['ETag']
+        # Versions live in the database, not in this process's cache.
+        cache.clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(url, {'currency': 'JPY'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Another process loads rates; only the database tells this one.
+        with patch.object(rates, 'changed', lambda: DataGeneration.bump(['fx'])):
+            load_rates([('JPY', date(2024, 1, 1), Decimal('0.0070'))])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+        with patch('expenses.fx.time.monotonic', return_value=time.monotonic() + rates.sync_interval + 1):
+            response = self.client.get(url, {'currency': 'JPY'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['currency'], 'JPY')
+
+    def test_analytics_and_timeseries_convert(self):
+        response = self.client.get(reverse('expense-analytics'), {
+            'currency': 'EUR', 'metrics': 'sum,count,max', 'group_by': 'amount_bucket', 'buckets': '50',
+        })
+        self.assertEqual(response.data['currency'], 'EUR')
+        rows = sorted(response.data['rows'], key=lambda row: row['amount_bucket'] or '')
+        self.assertEqual(rows, [
+            # The GBP tea, without a rate to convert it with.
+            {'amount_bucket': None, 'sum': None, 'count': 1, 'max': None},
+            {'amount_bucket': '<50', 'sum': '18.18', 'count': 1, 'max': '18.18'},
+            {'amount_bucket': '>=50', 'sum': '150.00', 'count': 2, 'max': '100.00'},
+        ])
+
+        # A whole-number rate, which SQLite stores as an integer: no integer division.
+        with self.captureOnCommitCallbacks(execute=True):
+            load_rates([('CHF', date(2024, 1, 1), Decimal('3'))])
+        response = self.client.get(reverse('expense-analytics'), {'currency': 'CHF', 'metrics': 'sum'})
+        self.assertEqual(response.data['rows'], [{'sum': '63.33'}])
+
+        response = self.client.get(reverse('expense-timeseries'), {
+            'currency': 'USD', 'start': '2024-01-05', 'end': '2024-01-13',
+        })
+        rows = {row['date']: row for row in response.data['rows']}
+        self.assertEqual(rows['2024-01-05']['total'], '130.00')
+        self.assertEqual(rows['2024-01-13']['total'], '60.00')
+        self.assertEqual(rows['2024-01-13']['cumulative'], '190.00')
+
+    def test_load_fx_rates_rebases_quotes(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'rates.csv')
+        # ECB style: units of each currency per euro.
+        with open(path, 'w') as handle:
+            handle.write("date,currency,rate\n2024-02-01,USD,1.25\n2024-02-01,GBP,0.5\n")
+        stdout = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('load_fx_rates', path, '--quote', 'EUR', '--inverse', stdout=stdout)
+
+        self.assertIn('Successfully loaded 2 rates for 2 currencies in USD', stdout.getvalue())
+        self.assertEqual(rates.rate('EUR', date(2024, 2, 1)), Decimal('1.25'))
+        self.assertEqual(rates.rate('GBP', date(2024, 2, 5)), Decimal('2.5'))
+        self.assertEqual(FxRate.objects.filter(currency='EUR').count(), 3)
+
+        with open(path, 'w') as handle:
+            handle.write("date,currency,rate\n2024-02-01,GBP,-1\n")
+        with self.assertRaisesMessage(CommandError, 'Row 1: invalid rate'):
+            call_command('load_fx_rates', path, stdout=StringIO())
+
@@ -0,0 +1,183 @@
+"""
+Daily spend series with running totals, computed with window functions.
+
+The series is read from the owner's `day` rollups rather than from
+`Expense`, so a request costs one row per day (and category) in the
+requested range no matter how many expenses those days hold. A recursive CTE generates the
+calendar and a LEFT JOIN zero-fills days without spend; window functions
+then add, per day:
+
+- `cumulative`: everything spent up to and including the day,
+- `month_to_date`: spend since the first of the day's month,
+- `rolling_7` / `rolling_30`: average daily spend over the last 7/30 days.
+
+The calendar starts early enough (30 days, or the first of the month) for
+the windows of the first requested day to be complete; those lead-in days
+are dropped from the output.
+
+Given a currency, each rollup total is converted to it in the sums, at the
+rate of its day (see `expenses.fx`).
+"""
+from datetime import date, timedelta
+
+from django.db import connection
+from rest_framework.exceptions import ValidationError
+
+from .analytics import _money
+from .fx import conversion_sql
+from .models import ExpenseRollup
+
+DEFAULT_DAYS = 90
+MAX_DAYS = 3660
+ROLLING_WINDOWS = (7, 30)
+
+
+def _parse_date(query_params, name, errors):
+    value = query_params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        errors[name] = ['Enter a date as YYYY-MM-DD.']
+
+
+def parse_params(query_params):
+    """Validate ?start=, ?end=, ?category= and ?by_category= into a dict."""
+    errors = {}
+    start = _parse_date(query_params, 'start', errors)
+    end = _parse_date(query_params, 'end', errors)
+    if errors:
+        raise ValidationError(errors)
+
+    end = end or date.today()
+    start = start or end - timedelta(days=DEFAULT_DAYS - 1)
+    if start > end:
+        raise ValidationError({'start': ['Start must not be after end.']})
+    if (end - start).days >= MAX_DAYS:
+        raise ValidationError({'start': [f'Request at most {MAX_DAYS} days.']})
+
+    return {
+        'start': start,
+        'end': end,
+        'category': query_params.get('category') or None,
+        'by_category': query_params.get('by_category', '').lower() in ('1', 'true', 'yes'),
+    }
+
+
+def _calendar_sql():
+    if connection.vendor == 'postgresql':
+        return 'CAST(%s AS date)', 'day + 1'
+    return 'date(%s)', "date(day, '+1 day')"
+
+
+def _total_sql(currency):
+    # The rollup total as summed, with the parameters of its SQL.
+    if currency is None:
+        return 'rollup.total', []
+    return conversion_sql('rollup', 'total', 'currency', 'period', currency)
+
+
+def _series_sql(by_category, category, currency):
+    """Return the SQL and parameter slots; see `daily_series` for the order."""
+    table = connection.ops.quote_name(ExpenseRollup._meta.db_table)
+    anchor, next_day = _calendar_sql()
+    month, month_params = connection.ops.date_trunc_sql('month', 'series.day', ())
+    total, _ = _total_sql(currency)
+
+    if by_category:
+        categories = (
+            f"CROSS JOIN (SELECT DISTINCT category FROM {table} "
+            f"WHERE owner_id = %s AND granularity = 'day' AND period <= %s) AS categories"
+        )
+        category_column = group_by = 'categories.category'
+        join_category = 'AND rollup.category = categories.category'
+        opening = f"SELECT category, SUM({total}) AS total FROM {table} AS rollup " \
+                  f"WHERE owner_id = %s AND granularity = 'day' AND period < %s GROUP BY category"
+        opening_join = 'LEFT JOIN opening ON opening.category = series.category'
+    else:
+        categories = ''
+        category_column, group_by = "''", ''
+        join_category = 'AND rollup.category = %s' if category else ''
+        opening = f"SELECT SUM({total}) AS total FROM {table} AS rollup " \
+                  f"WHERE owner_id = %s AND granularity = 'day' AND period < %s " \
+                  f"{'AND category = %s' if category else ''}"
+        opening_join = 'CROSS JOIN opening'
+
+    windows = ',\n'.join(
+        f"SUM(series.total) OVER (PARTITION BY series.category ORDER BY series.day "
+        f"ROWS BETWEEN {days - 1} PRECEDING AND CURRENT ROW) / {days}.0 AS rolling_{days}"
+        for days in ROLLING_WINDOWS
+    )
+    sql = f"""
+        WITH RECURSIVE calendar(day) AS (
+            SELECT {anchor}
+            UNION ALL
+            SELECT {next_day} FROM calendar WHERE day < {anchor}
+        ),
+        series AS (
+            SELECT calendar.day AS day, {category_column} AS category,
+                   COALESCE(SUM({total}), 0) AS total
+            FROM calendar
+            {categories}
+            LEFT JOIN {table} AS rollup
+                ON rollup.owner_id = %s AND rollup.granularity = 'day'
+                AND rollup.period = calendar.day {join_category}
+            GROUP BY calendar.day{', ' + group_by if group_by else ''}
+        ),
+        opening AS ({opening})
+        SELECT * FROM (
+            SELECT series.day, series.category, series.total,
+                   COALESCE(opening.total, 0) + SUM(series.total) OVER (
+                       PARTITION BY series.category ORDER BY series.day ROWS UNBOUNDED PRECEDING
+                   ) AS cumulative,
+                   SUM(series.total) OVER (
+                       PARTITION BY series.category, {month}
+                       ORDER BY series.day ROWS UNBOUNDED PRECEDING
+                   ) AS month_to_date,
+                   {windows}
+            FROM series
+            {opening_join}
+        ) AS windowed
+        WHERE day >= {anchor}
+        ORDER BY category, day
+    """
+    return sql, month_params
+
+
+def daily_series(owner_id, start, end, category=None, by_category=False, currency=None):
+    """
+    One dict per day from `start` to `end` (per category when `by_category`)
+    of `owner_id`'s spend, with the day's total and its cumulative,
+    month-to-date and rolling sums, converted to `currency` if given.
+    """
+    lead_in = min(start - timedelta(days=max(ROLLING_WINDOWS) - 1), start.replace(day=1))
+    sql, month_params = _series_sql(by_category, category, currency)
+    _, total_params = _total_sql(currency)
+
+    params = [lead_in, end, *total_params]
+    if by_category:
+        params += [owner_id, end, owner_id, *total_params, owner_id, lead_in]
+    else:
+        params += [owner_id] + ([category] if category else [])
+        params += [*total_params, owner_id, lead_in] + ([category] if category else [])
+    params += [*month_params, start]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    results = []
+    for row in rows:
+        day = row['day']
+        item = {'date': day if isinstance(day, str) else day.isoformat()}
+        if by_category:
+            item['category'] = row['category']
+        item['total'] = _money(row['total'])
+        item['cumulative'] = _money(row['cumulative'])
+        item['month_to_date'] = _money(row['month_to_date'])
+        for days in ROLLING_WINDOWS:
+            item[f'rolling_{days}'] = _money(row[f'rolling_{days}'])
+        results.append(item)
+    return results
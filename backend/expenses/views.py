@@ -2,15 +2,24 @@ from django.shortcuts import render
 from rest_framework import viewsets, permissions
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
 from django_filters import rest_framework as filters
 from rest_framework.decorators import action
+from django.db import transaction
 from django.db.models import Sum
-from django.db.models.functions import TruncMonth, TruncWeek, TruncYear
 from django.db.models import Prefetch
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
-from .models import Expense
-from .serializers import ExpenseSerializer
+from django.http import StreamingHttpResponse
+from .analytics import grouped_statistics, parse_params as parse_analytics_params
+from .cache import cached_summary, conditional_on_data_version
+from .exports import EXPORT_CHUNK_SIZE, CSVRenderer, NDJSONRenderer, export_rows
+from .fx import converted, money, parse_currency
+from .models import Expense, ExpenseRollup, RecurringExpense
+from .pagination import ExpenseKeysetPagination
+from .recurring import materialize
+from .rollups import GRANULARITY_BY_TIMEFRAME, PERIOD_TRUNCATIONS, deferred_rollups
+from .search import parse_limit as parse_search_limit, ranked, search_filter
+from .serializers import BULK_BATCH_SIZE, ExpenseSerializer, RecurringExpenseSerializer, serialize_values
+from .timeseries import daily_series, parse_params as parse_timeseries_params
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,23 +31,116 @@ class ExpenseFilter(filters.FilterSet):
     min_amount = filters.NumberFilter(field_name='amount', lookup_expr='gte')
     max_amount = filters.NumberFilter(field_name='amount', lookup_expr='lte')
     description = filters.CharFilter(field_name='description', lookup_expr='icontains')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Expense
-        fields = ['min_date', 'max_date', 'category', 'min_amount', 'max_amount', 'description']
+        fields = ['min_date', 'max_date', 'category', 'min_amount', 'max_amount', 'description', 'search']
+
+    def filter_search(self, queryset, name, value):
+        # Indexed full-text match; see expenses.search.
+        return search_filter(queryset, value)
+
+def requested_fields(query_params):
+    """Fields named by ?fields=a,b (all serializer fields when absent)."""
+    available = ExpenseSerializer.Meta.fields
+    requested = query_params.get('fields')
+    if not requested:
+        return available
+    names = {name.strip() for name in requested.split(',') if name.strip()}
+    unknown = names - set(available)
+    if unknown:
+        raise ValidationError({'fields': [f"Unknown field(s): {', '.join(sorted(unknown))}"]})
+    return [name for name in available if name in names]
+
+def compute_summary(owner_id, timeframe, currency):
+    """Uncached summary payload for one owner, built from the rollup tables."""
+    # Anything other than weekly/monthly falls back to yearly, as before.
+    granularity = GRANULARITY_BY_TIMEFRAME.get(timeframe, 'year')
+    rollups = ExpenseRollup.objects.filter(owner_id=owner_id)
+    if rollups.filter(granularity='year').exclude(currency=currency).exists():
+        return converted_summary(rollups, granularity, currency)
+
+    expenses = rollups.filter(granularity=granularity)\
+        .values('period')\
+        .annotate(total=Sum('total'))\
+        .order_by('period')
+
+    # Yearly rollups hold the fewest rows per category.
+    category_totals = rollups.filter(granularity='year')\
+        .values('category')\
+        .annotate(total=Sum('total'))\
+        .order_by('-total')
+
+    return {
+        'currency': currency,
+        'time_series': list(expenses),
+        'category_totals': list(category_totals),
+        'unconverted_count': 0,
+    }
+
+def converted_summary(rollups, granularity, currency):
+    """
+    The summary of rollups in several currencies, converted to `currency`
+    in the aggregation queries. Rates change daily, so it reads the day
+    rollups; expenses without a rate are left out and counted.
+    """
+    days = rollups.filter(granularity='day')\
+        .annotate(converted=converted('total', 'currency', 'period', currency))
+
+    expenses = days.values(bucket=PERIOD_TRUNCATIONS[granularity]('period'))\
+        .annotate(total=Sum('converted'))\
+        .order_by('bucket')
+
+    category_totals = days.values('category')\
+        .annotate(total=Sum('converted'))\
+        .order_by('-total')
+
+    unconverted = days.filter(converted__isnull=True).aggregate(count=Sum('count'))['count']
+
+    return {
+        'currency': currency,
+        'time_series': [{'period': row['bucket'], 'total': money(row['total'])} for row in expenses],
+        'category_totals': [
+            {'category': row['category'], 'total': money(row['total'])} for row in category_totals
+        ],
+        'unconverted_count': unconverted or 0,
+    }
 
 class ExpenseViewSet(viewsets.ModelViewSet):
-    queryset = Expense.objects.all().order_by('-date')
+    queryset = Expense.objects.all().order_by('-date', '-id')
     serializer_class = ExpenseSerializer
+    filter_backends = [filters.DjangoFilterBackend]
     filterset_class = ExpenseFilter
-    pagination_class = None  # Disable pagination for this viewset
+    pagination_class = ExpenseKeysetPagination  # Opt-in via ?page_size= or ?cursor=
     permission_classes = [permissions.IsAuthenticated]
+    export_chunk_size = EXPORT_CHUNK_SIZE
 
+    def get_queryset(self):
+        # request.user may be a ClaimsUser without a row; filter on the id.
+        return super().get_queryset().filter(owner_id=self.request.user.id)
+
+    def perform_create(self, serializer):
+        serializer.save(owner_id=self.request.user.id)
+
+    def get_requested_fields(self):
+        return requested_fields(self.request.query_params)
+
+    @conditional_on_data_version
     def list(self, request, *args, **kwargs):
+        # Read-only fast path: fetch only the needed columns with .values()
+        # and render them without instantiating models or serializer fields.
         try:
+            fields = self.get_requested_fields()
             queryset = self.filter_queryset(self.get_queryset())
-            serializer = self.get_serializer(queryset, many=True)
-            return Response(serializer.data)
+            # Keyset pagination needs date and id even when they aren't requested.
+            rows = queryset.values(*dict.fromkeys([*fields, 'date', 'id']))
+            page = self.paginate_queryset(rows)
+            if page is not None:
+                return self.get_paginated_response(serialize_values(page, fields))
+            return Response(serialize_values(rows, fields))
+        except APIException:
+            raise
         except Exception as e:
             logger.error(f"Error listing expenses: {str(e)}")
             return Response(
@@ -71,40 +173,239 @@ class ExpenseViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-    @method_decorator(cache_page(60))  # Cache summary for 1 minute
+    def _bulk_error(self, message, errors=None):
+        body = {'error': message}
+        if errors is not None:
+            # Only failing rows are reported, each with its position in the payload.
+            body['errors'] = [
+                {'index': index, 'errors': row_errors}
+                for index, row_errors in enumerate(errors) if row_errors
+            ]
+        return Response(body, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'], url_path='bulk', url_name='bulk')
+    def bulk_create(self, request):
+        try:
+            if not isinstance(request.data, list) or not request.data:
+                return self._bulk_error('Expected a non-empty list of expenses')
+            serializer = self.get_serializer(data=request.data, many=True)
+            if not serializer.is_valid():
+                return self._bulk_error('Invalid expenses', serializer.errors)
+            serializer.save(owner_id=request.user.id)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        except Exception as e:
+            logger.error(f"Error bulk creating expenses: {str(e)}")
+            return self._bulk_error('Failed to create expenses')
+
+    @bulk_create.mapping.patch
+    def bulk_update(self, request):
+        try:
+            items = request.data
+            if not isinstance(items, list) or not items:
+                return self._bulk_error('Expected a non-empty list of expenses')
+
+            ids = [item.get('id') if isinstance(item, dict) else None for item in items]
+            found = self.get_queryset().in_bulk(
+                [pk for pk in ids if isinstance(pk, int)]
+            )
+            errors, seen = [], set()
+            for pk in ids:
+                if not isinstance(pk, int) or pk not in found:
+                    errors.append({'id': ['Expense not found.']})
+                elif pk in seen:
+                    errors.append({'id': ['Duplicate expense id.']})
+                else:
+                    errors.append({})
+                seen.add(pk)
+            if any(errors):
+                return self._bulk_error('Invalid expenses', errors)
+
+            serializer = self.get_serializer(
+                [found[pk] for pk in ids], data=items, many=True, partial=True
+            )
+            if not serializer.is_valid():
+                return self._bulk_error('Invalid expenses', serializer.errors)
+            serializer.save()
+            return Response(serializer.data)
+        except Exception as e:
+            logger.error(f"Error bulk updating expenses: {str(e)}")
+            return self._bulk_error('Failed to update expenses')
+
+    @bulk_create.mapping.delete
+    def bulk_destroy(self, request):
+        try:
+            ids = request.data.get('ids') if isinstance(request.data, dict) else None
+            if not isinstance(ids, list) or not ids:
+                return self._bulk_error('Expected a non-empty list of expense ids')
+
+            valid_ids = [pk for pk in ids if isinstance(pk, int)]
+            chunks = [
+                valid_ids[start:start + BULK_BATCH_SIZE]
+                for start in range(0, len(valid_ids), BULK_BATCH_SIZE)
+            ]
+            found = set()
+            for chunk in chunks:
+                found.update(self.get_queryset().filter(id__in=chunk).values_list('id', flat=True))
+            errors = [
+                {} if isinstance(pk, int) and pk in found else {'id': ['Expense not found.']}
+                for pk in ids
+            ]
+            if any(errors):
+                return self._bulk_error('Invalid expense ids', errors)
+
+            with transaction.atomic(), deferred_rollups():
+                for chunk in chunks:
+                    self.get_queryset().filter(id__in=chunk).delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        except Exception as e:
+            logger.error(f"Error bulk deleting expenses: {str(e)}")
+            return self._bulk_error('Failed to delete expenses')
+
     @action(detail=False, methods=['get'])
-    def summary(self, request):
+    @conditional_on_data_version
+    def search(self, request):
+        # Ranked matches for ?search=, best first, combined with the other filters.
         try:
-            timeframe = request.query_params.get('timeframe', 'monthly')
-            queryset = self.get_queryset()
-
-            if timeframe == 'weekly':
-                expenses = queryset.annotate(period=TruncWeek('date'))\
-                    .values('period')\
-                    .annotate(total=Sum('amount'))\
-                    .order_by('period')
-            elif timeframe == 'monthly':
-                expenses = queryset.annotate(period=TruncMonth('date'))\
-                    .values('period')\
-                    .annotate(total=Sum('amount'))\
-                    .order_by('period')
-            else:  # yearly
-                expenses = queryset.annotate(period=TruncYear('date'))\
-                    .values('period')\
-                    .annotate(total=Sum('amount'))\
-                    .order_by('period')
-
-            category_totals = queryset.values('category')\
-                .annotate(total=Sum('amount'))\
-                .order_by('-total')
+            if not request.query_params.get('search', '').strip():
+                raise ValidationError({'search': ['This parameter is required.']})
+            limit = parse_search_limit(request.query_params)
+            fields = self.get_requested_fields()
+            queryset = ranked(self.filter_queryset(self.get_queryset()), request.query_params['search'])
+            rows = list(queryset.values(*fields, 'rank')[:limit])
+            results = serialize_values(rows, fields)
+            for item, row in zip(results, rows):
+                item['rank'] = round(row['rank'], 6)
+            return Response({'results': results})
+        except APIException:
+            raise
+        except Exception as e:
+            logger.error(f"Error searching expenses: {str(e)}")
+            return Response(
+                {'error': 'Failed to search expenses'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
 
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        # ?format=csv|ndjson picks the renderer; CSV is the default.
+        try:
+            renderer = request.accepted_renderer
+            queryset = self.filter_queryset(self.get_queryset())
+            response = StreamingHttpResponse(
+                renderer.stream(export_rows(queryset, self.export_chunk_size)),
+                content_type=f'{renderer.media_type}; charset={renderer.charset}'
+            )
+            response['Content-Disposition'] = f'attachment; filename="{renderer.filename}"'
+            return response
+        except APIException:
+            raise
+        except Exception as e:
+            logger.error(f"Error exporting expenses: {str(e)}")
+            return Response(
+                {'error': 'Failed to export expenses'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=['get'])
+    @conditional_on_data_version
+    def analytics(self, request):
+        try:
+            dimensions, metrics, buckets = parse_analytics_params(request.query_params)
+            currency = parse_currency(request.query_params)
+            queryset = self.filter_queryset(self.get_queryset())
+            rows = cached_summary(
+                request.user.pk,
+                {'action': 'analytics', **request.query_params.dict()},
+                lambda: grouped_statistics(queryset, dimensions, metrics, buckets, currency),
+                generation=request.data_version,
+            )
+            return Response({'group_by': dimensions, 'metrics': metrics, 'currency': currency, 'rows': rows})
+        except APIException:
+            raise
+        except Exception as e:
+            logger.error(f"Error computing expense analytics: {str(e)}")
+            return Response(
+                {'error': 'Failed to compute expense analytics'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=['get'])
+    @conditional_on_data_version
+    def timeseries(self, request):
+        try:
+            params = parse_timeseries_params(request.query_params)
+            params['currency'] = parse_currency(request.query_params)
+            rows = cached_summary(
+                request.user.pk,
+                {'action': 'timeseries', **params},
+                lambda: daily_series(request.user.id, **params),
+                generation=request.data_version,
+            )
             return Response({
-                'time_series': list(expenses),
-                'category_totals': list(category_totals)
+                'start': params['start'].isoformat(),
+                'end': params['end'].isoformat(),
+                'category': params['category'],
+                'currency': params['currency'],
+                'rows': rows,
             })
+        except APIException:
+            raise
+        except Exception as e:
+            logger.error(f"Error computing expense time series: {str(e)}")
+            return Response(
+                {'error': 'Failed to compute expense time series'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=['get'])
+    @conditional_on_data_version
+    def summary(self, request):
+        try:
+            timeframe = request.query_params.get('timeframe', 'monthly')
+            currency = parse_currency(request.query_params)
+            data = cached_summary(
+                request.user.pk,
+                {**request.query_params.dict()},
+                lambda: compute_summary(request.user.id, timeframe, currency),
+                generation=request.data_version,
+            )
+            return Response(data)
+        except APIException:
+            raise
         except Exception as e:
             logger.error(f"Error generating summary: {str(e)}")
             return Response(
                 {'error': 'Failed to generate expense summary'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class RecurringExpenseViewSet(viewsets.ModelViewSet):
+    """
+    The user's recurring expenses. Their occurrences become expenses when
+    `materialize_recurring` runs, or at once through the materialize action.
+    Deleting one keeps the expenses it already wrote.
+    """
+    queryset = RecurringExpense.objects.all()
+    serializer_class = RecurringExpenseSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return super().get_queryset().filter(owner_id=self.request.user.id)
+
+    def perform_create(self, serializer):
+        serializer.save(owner_id=self.request.user.id)
+
+    @action(detail=False, methods=['post'])
+    def materialize(self, request):
+        # Writes the user's occurrences due by today, e.g. right after
+        # creating a schedule that starts in the past.
+        try:
+            schedules, expenses = materialize(owner_id=request.user.id)
+            return Response({'schedules': schedules, 'expenses': expenses})
+        except Exception as e:
+            logger.error(f"Error materializing recurring expenses: {str(e)}")
+            return Response(
+                {'error': 'Failed to materialize recurring expenses'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import Job
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'owner', 'status', 'attempts', 'progress', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('worker', 'heartbeat_at', 'started_at', 'finished_at')
+    ordering = ('-created_at',)
@@ -0,0 +1,26 @@
+import os
+import shutil
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from jobs.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Deletes finished jobs older than --older-than-days days, with their files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=30)
+
+    def handle(self, *args, **options):
+        if options['older_than_days'] < 0:
+            raise CommandError('--older-than-days must not be negative')
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        jobs = Job.objects.filter(status__in=Job.FINISHED, finished_at__lt=cutoff)
+        ids = list(jobs.values_list('id', flat=True))
+        for job_id in ids:
+            shutil.rmtree(os.path.join(settings.JOB_FILES_DIR, str(job_id)), ignore_errors=True)
+        Job.objects.filter(id__in=ids).delete()
+        self.stdout.write(self.style.SUCCESS(f'Successfully purged {len(ids)} jobs'))
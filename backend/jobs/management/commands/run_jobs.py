@@ -0,0 +1,42 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from jobs.runner import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs queued background jobs in a pool of threads, or of processes for CPU-bound work, '
+        'until interrupted (SIGINT/SIGTERM let running jobs finish first)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.JOB_WORKER_CONCURRENCY,
+                            help='Jobs run at once')
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread')
+        parser.add_argument('--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL,
+                            help='Seconds between checks for new jobs when idle')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['poll_interval'] <= 0:
+            raise CommandError('--concurrency and --poll-interval must be positive')
+        worker = Worker(
+            concurrency=options['concurrency'], pool=options['pool'],
+            poll_interval=options['poll_interval'], log=self.stdout.write,
+        )
+
+        def stop(signum, frame):
+            self.stdout.write('Stopping after the running jobs finish')
+            worker.stop()
+        previous = {signum: signal.signal(signum, stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+        self.stdout.write(
+            f"Worker {worker.name} running up to {options['concurrency']} jobs in a {options['pool']} pool"
+        )
+        try:
+            worker.run(burst=options['burst'])
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        self.stdout.write(self.style.SUCCESS(f'Successfully stopped worker {worker.name}'))
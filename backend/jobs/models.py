@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.db import models
+
+
+class Job(models.Model):
+    """A unit of background work, run by the `run_jobs` worker.
+
+    `kind` names a handler registered with `jobs.registry.register`; `params`
+    are its keyword arguments. Workers claim queued jobs whose `run_after`
+    has passed, and record the outcome in `result` or `error`. See
+    `jobs.runner` for the life cycle.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+    ]
+    FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True,
+                              related_name='jobs', db_index=False)
+    kind = models.CharField(max_length=100)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # Human-readable progress the handler reports, e.g. "5000 rows imported".
+    progress = models.CharField(max_length=200, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    cancel_requested = models.BooleanField(default=False)
+    run_after = models.DateTimeField()
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Claiming: the oldest due job in the queue.
+            models.Index(fields=['status', 'run_after', 'id'], name='job_status_run_after_idx'),
+            # A user's jobs, newest first.
+            models.Index(fields=['owner', '-created_at', '-id'], name='job_owner_created_idx'),
+        ]
+
+    @property
+    def finished(self):
+        return self.status in self.FINISHED
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
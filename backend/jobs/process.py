@@ -0,0 +1,27 @@
+"""
+Entry points for worker pools.
+
+Pool processes are spawned, so they unpickle these functions by importing
+this module before Django is set up; it must not import models at the top.
+"""
+import os
+
+
+def setup():
+    """Process pool initializer."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+
+
+def execute(job_id):
+    """Run a claimed job in a pool thread or process."""
+    from django.db import close_old_connections
+    from .runner import execute
+
+    # Like a request: drop connections that broke or outlived CONN_MAX_AGE.
+    close_old_connections()
+    try:
+        return execute(job_id)
+    finally:
+        close_old_connections()
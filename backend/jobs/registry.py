@@ -0,0 +1,64 @@
+"""
+Job handlers, by kind.
+
+Apps declare handlers in a `jobs` module, which the jobs app imports when
+Django starts:
+
+    @register('expenses.export', validate=validate_export)
+    def export(job, format='csv', **filters):
+        ...
+        return {'rows': count}
+
+A handler is called with the Job and its params as keyword arguments and
+returns a JSON-serialisable result. Handlers that run for a while call
+`jobs.runner.report(job, ...)` between steps: it records progress, keeps the
+job's heartbeat fresh and raises JobCancelled once cancellation has been
+requested. A failing handler is retried up to `max_attempts` times, so it
+should be safe to run again after a partial run.
+
+`validate(params)` checks params submitted through the API and returns the
+cleaned params, raising a DRF ValidationError otherwise; without it the API
+accepts no params. `takes_file` handlers receive the uploaded file's path
+as the `path` param. `staff_only` kinds can only be submitted by staff.
+"""
+from rest_framework.exceptions import ValidationError
+
+
+class Handler:
+    def __init__(self, kind, func, max_attempts, validate, takes_file, staff_only):
+        self.kind = kind
+        self.func = func
+        self.max_attempts = max_attempts
+        self.validate = validate or self._no_params
+        self.takes_file = takes_file
+        self.staff_only = staff_only
+
+    @staticmethod
+    def _no_params(params):
+        if params:
+            raise ValidationError({'params': ['This kind of job takes no parameters.']})
+        return {}
+
+    def __call__(self, job, **params):
+        return self.func(job, **params)
+
+
+_handlers = {}
+
+
+def register(kind, max_attempts=3, validate=None, takes_file=False, staff_only=False):
+    def decorator(func):
+        if kind in _handlers:
+            raise ValueError(f'Job kind {kind!r} is already registered')
+        _handlers[kind] = Handler(kind, func, max_attempts, validate, takes_file, staff_only)
+        return func
+    return decorator
+
+
+def get_handler(kind):
+    """The Handler registered for `kind`, or None."""
+    return _handlers.get(kind)
+
+
+def kinds():
+    return sorted(_handlers)
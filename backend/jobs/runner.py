@@ -0,0 +1,242 @@
+"""
+Running jobs: queueing, claiming, retries with backoff and cancellation.
+
+A job is created `queued` with `run_after` set to now. A worker claims it
+with a conditional UPDATE (status still queued), so two workers can poll
+the same table without a broker or row locks, on SQLite as on PostgreSQL.
+Claiming counts an attempt and marks the job `running`.
+
+The outcome is one of:
+
+- `succeeded`, with the handler's return value as `result`;
+- `queued` again after an exception, while attempts remain, with
+  `run_after` pushed back exponentially: JOB_RETRY_BACKOFF seconds doubled
+  per attempt, at most JOB_RETRY_BACKOFF_MAX, with jitter;
+- `failed` once the attempts are used up, with the traceback in `error`;
+- `cancelled`: a queued job is cancelled at once, a running one when its
+  handler next calls `report()`.
+
+The worker refreshes `heartbeat_at` of the jobs it runs. Running jobs whose
+heartbeat is older than JOB_STALE_AFTER seconds (their worker died) are
+queued again, which counts as a failed attempt.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import timedelta
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import process
+from .models import Job
+from .registry import get_handler
+
+logger = logging.getLogger(__name__)
+
+# Progress and cancellation checks hit the database at most this often per job.
+REPORT_INTERVAL = 1.0
+
+
+class JobCancelled(Exception):
+    """Raised by `report()` in a handler whose job is being cancelled."""
+
+
+def enqueue(kind, params=None, owner_id=None, delay=0):
+    """Queue a job of a registered `kind` and return it."""
+    handler = get_handler(kind)
+    if handler is None:
+        raise ValueError(f'Unknown job kind: {kind}')
+    return Job.objects.create(
+        kind=kind, params=params or {}, owner_id=owner_id, max_attempts=handler.max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def retry_delay(attempts):
+    """Seconds to wait before attempt `attempts + 1`: exponential, capped, with jitter."""
+    delay = min(settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1), settings.JOB_RETRY_BACKOFF_MAX)
+    # Spread retries of jobs that failed together, e.g. during an outage.
+    return delay * random.uniform(0.5, 1)
+
+
+def cancel(job):
+    """
+    Cancel `job`: at once if it is still queued, otherwise once its handler
+    next reports. Returns False if it had already finished.
+    """
+    now = timezone.now()
+    if Job.objects.filter(pk=job.pk, status=Job.QUEUED)\
+            .update(status=Job.CANCELLED, cancel_requested=True, finished_at=now):
+        return True
+    return bool(Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(cancel_requested=True))
+
+
+def report(job, message=None):
+    """
+    Record progress for a running job and raise JobCancelled if it is being
+    cancelled. Calls within REPORT_INTERVAL of the last one are free.
+    """
+    now = time.monotonic()
+    if message is not None:
+        job.progress = message[:200]
+    if now - getattr(job, '_reported_at', 0) < REPORT_INTERVAL:
+        return
+    job._reported_at = now
+    Job.objects.filter(pk=job.pk).update(progress=job.progress, heartbeat_at=timezone.now())
+    if Job.objects.filter(pk=job.pk, cancel_requested=True).exists():
+        raise JobCancelled()
+
+
+def claim(worker, limit=1):
+    """Mark up to `limit` due queued jobs as running by `worker`; returns their ids."""
+    now = timezone.now()
+    candidates = Job.objects\
+        .filter(status=Job.QUEUED, run_after__lte=now)\
+        .order_by('run_after', 'id')\
+        .values_list('id', flat=True)[:limit * 2]
+    claimed = []
+    for job_id in candidates:
+        # Another worker may have claimed it since; only one UPDATE wins.
+        won = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING, worker=worker, attempts=F('attempts') + 1,
+            started_at=now, heartbeat_at=now, progress='',
+        )
+        if won:
+            claimed.append(job_id)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def _finish(job, **fields):
+    # Only while this worker still owns the job: a stale job may have been
+    # handed to another worker meanwhile.
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(**fields)
+
+
+def execute(job_id):
+    """Run a claimed job in this thread and record the outcome; returns (job id, status)."""
+    job = Job.objects.get(pk=job_id)
+    handler = get_handler(job.kind)
+    now = timezone.now
+    if job.cancel_requested:
+        _finish(job, status=Job.CANCELLED, finished_at=now())
+        return job_id, Job.CANCELLED
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for {job.kind}')
+        result = handler(job, **job.params)
+    except JobCancelled:
+        _finish(job, status=Job.CANCELLED, progress=job.progress, finished_at=now())
+        return job_id, Job.CANCELLED
+    except Exception as e:
+        logger.error(f"Job {job.kind} #{job.pk} failed (attempt {job.attempts}): {str(e)}")
+        error = traceback.format_exc()
+        if handler is not None and job.attempts < job.max_attempts:
+            _finish(job, status=Job.QUEUED, error=error, worker='', progress=job.progress,
+                    run_after=now() + timedelta(seconds=retry_delay(job.attempts)))
+            return job_id, Job.QUEUED
+        _finish(job, status=Job.FAILED, error=error, progress=job.progress, finished_at=now())
+        return job_id, Job.FAILED
+    _finish(job, status=Job.SUCCEEDED, result=result, progress=job.progress, finished_at=now())
+    return job_id, Job.SUCCEEDED
+
+
+def _requeue(jobs, error):
+    # Running jobs whose attempt was lost: queued again while attempts remain.
+    now = timezone.now()
+    with transaction.atomic():
+        count = jobs.filter(cancel_requested=True).update(status=Job.CANCELLED, finished_at=now)
+        count += jobs.filter(attempts__lt=F('max_attempts')).update(
+            status=Job.QUEUED, worker='', error=error, run_after=now,
+        )
+        count += jobs.update(status=Job.FAILED, error=error, finished_at=now)
+    return count
+
+
+def requeue_stale(stale_after=None):
+    """Recover running jobs whose worker stopped sending heartbeats; returns how many."""
+    stale_after = settings.JOB_STALE_AFTER if stale_after is None else stale_after
+    stale = Job.objects.filter(status=Job.RUNNING,
+                               heartbeat_at__lt=timezone.now() - timedelta(seconds=stale_after))
+    return _requeue(stale, 'The worker running this job stopped responding.')
+
+
+class Worker:
+    """
+    Claims due jobs and runs up to `concurrency` of them at once in a thread
+    pool, or in a pool of processes for CPU-bound handlers.
+    """
+
+    def __init__(self, concurrency=1, pool='thread', poll_interval=None, name=None, log=None):
+        self.concurrency = concurrency
+        self.pool = pool
+        self.poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.log = log or logger.info
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Stop claiming jobs; `run` returns once the running ones finish."""
+        self._stop.set()
+
+    def _executor(self):
+        if self.pool == 'process':
+            # Spawned rather than forked, so no process inherits a database
+            # connection; see jobs.process.
+            connections.close_all()
+            return ProcessPoolExecutor(self.concurrency, mp_context=get_context('spawn'),
+                                       initializer=process.setup)
+        return ThreadPoolExecutor(self.concurrency, thread_name_prefix='job-worker')
+
+    def run(self, burst=False):
+        """Work until stopped, or with `burst` until no job is due."""
+        running = {}
+        next_recovery = 0.0
+        executor = self._executor()
+        try:
+            while True:
+                broken = False
+                for future in [future for future in running if future.done()]:
+                    job_id = running.pop(future)
+                    try:
+                        self.log(f'Job #{job_id}: {future.result()[1]}')
+                    except Exception as e:
+                        # The pool itself failed, e.g. a pool process was killed.
+                        logger.error(f"Worker lost job #{job_id}: {str(e)}")
+                        _requeue(Job.objects.filter(pk=job_id, status=Job.RUNNING, worker=self.name),
+                                 f'The worker lost this job: {str(e)}')
+                        broken = broken or isinstance(e, BrokenExecutor)
+                if broken:
+                    executor.shutdown(wait=False)
+                    executor = self._executor()
+                if self._stop.is_set():
+                    if not running:
+                        return
+                else:
+                    if running:
+                        Job.objects.filter(pk__in=running.values(), status=Job.RUNNING, worker=self.name)\
+                            .update(heartbeat_at=timezone.now())
+                    if time.monotonic() >= next_recovery:
+                        requeue_stale()
+                        next_recovery = time.monotonic() + settings.JOB_STALE_AFTER / 2
+                    claimed = claim(self.name, self.concurrency - len(running))
+                    for job_id in claimed:
+                        running[executor.submit(process.execute, job_id)] = job_id
+                    if burst and not running:
+                        return
+                if running:
+                    wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                else:
+                    self._stop.wait(self.poll_interval)
+        finally:
+            executor.shutdown(wait=True)
@@ -0,0 +1,56 @@
+import os
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.exceptions import PermissionDenied
+
+from .models import Job
+from .registry import get_handler, kinds
+from .runner import enqueue
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Submits a job of a registered kind; everything but `kind`, `params` and `file` is read-only."""
+    file = serializers.FileField(write_only=True, required=False)
+
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'params', 'file', 'status', 'progress', 'result', 'error', 'attempts',
+                  'max_attempts', 'cancel_requested', 'run_after', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = [name for name in fields if name not in ('kind', 'params', 'file')]
+
+    def validate_params(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('Expected an object.')
+        return value
+
+    def validate(self, attrs):
+        handler = get_handler(attrs['kind'])
+        if handler is None:
+            raise serializers.ValidationError({'kind': [f"Unknown job kind; expected one of {', '.join(kinds())}"]})
+        user = self.context['request'].user
+        if handler.staff_only and not user.is_staff:
+            raise PermissionDenied('Only staff can submit this kind of job.')
+        if handler.takes_file and 'file' not in attrs:
+            raise serializers.ValidationError({'file': ['This kind of job needs a file.']})
+        if not handler.takes_file and 'file' in attrs:
+            raise serializers.ValidationError({'file': ['This kind of job takes no file.']})
+        attrs['params'] = handler.validate(attrs.get('params') or {})
+        return attrs
+
+    def create(self, validated_data):
+        upload = validated_data.pop('file', None)
+        with transaction.atomic():
+            job = enqueue(validated_data['kind'], validated_data['params'], owner_id=validated_data['owner_id'])
+            if upload is not None:
+                # The job is only visible to workers once the file is in place.
+                directory = os.path.join(settings.JOB_FILES_DIR, str(job.pk))
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, os.path.basename(upload.name) or 'upload')
+                with open(path, 'wb') as handle:
+                    for chunk in upload.chunks():
+                        handle.write(chunk)
+                job.params = dict(job.params, path=path)
+                job.save(update_fields=['params'])
+        return job
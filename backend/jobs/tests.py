@@ -0,0 +1,260 @@
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from expenses.models import Expense
+from .models import Job
+from .registry import register
+from .runner import JobCancelled, cancel, claim, enqueue, execute, report, requeue_stale, retry_delay
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+import json
+import shutil
+import tempfile
+
+User = get_user_model()
+
+calls = []
+
+
+@register('tests.echo', validate=lambda params: params)
+def echo(job, **params):
+    calls.append(params)
+    return params
+
+
+@register('tests.flaky', max_attempts=2)
+def flaky(job):
+    raise RuntimeError('boom')
+
+
+@register('tests.cancel_midway')
+def cancel_midway(job):
+    report(job, 'started')
+    cancel(job)
+    job._reported_at = 0
+    report(job, 'still going')
+    return 'not reached'
+
+
+class JobFilesMixin:
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(JOB_FILES_DIR=self.directory)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        super().tearDown()
+
+
+def run_one(worker='test-worker'):
+    job_ids = claim(worker)
+    return execute(job_ids[0])[1] if job_ids else None
+
+
+class JobRunnerTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_claim_execute(self):
+        job = enqueue('tests.echo', {'value': 1})
+        self.assertEqual(job.status, Job.QUEUED)
+
+        self.assertEqual(run_one(), Job.SUCCEEDED)
+        job.refresh_from_db()
+        self.assertEqual(job.result, {'value': 1})
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(calls, [{'value': 1}])
+        # Nothing left to claim.
+        self.assertEqual(claim('test-worker'), [])
+
+    def test_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            enqueue('tests.missing')
+
+    def test_claim_skips_jobs_not_yet_due_and_claimed_ones(self):
+        later = enqueue('tests.echo', delay=60)
+        due = enqueue('tests.echo')
+        self.assertEqual(claim('a', limit=5), [due.pk])
+        self.assertEqual(claim('b', limit=5), [])
+        later.refresh_from_db()
+        self.assertEqual(later.status, Job.QUEUED)
+
+    @override_settings(JOB_RETRY_BACKOFF=10, JOB_RETRY_BACKOFF_MAX=300)
+    def test_retry_with_backoff_then_fail(self):
+        job = enqueue('tests.flaky')
+        before = timezone.now()
+        self.assertEqual(run_one(), Job.QUEUED)
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('RuntimeError: boom', job.error)
+        self.assertGreaterEqual(job.run_after, before + timedelta(seconds=5))
+        # Not due yet.
+        self.assertEqual(claim('test-worker'), [])
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(run_one(), Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    @override_settings(JOB_RETRY_BACKOFF=5, JOB_RETRY_BACKOFF_MAX=60)
+    def test_retry_delay_is_capped(self):
+        self.assertTrue(2.5 <= retry_delay(1) <= 5)
+        self.assertTrue(20 <= retry_delay(4) <= 40)
+        self.assertTrue(30 <= retry_delay(20) <= 60)
+
+    def test_cancel_queued_job(self):
+        job = enqueue('tests.echo')
+        self.assertTrue(cancel(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.CANCELLED)
+        self.assertIsNone(run_one())
+        # Finished jobs cannot be cancelled again.
+        self.assertFalse(cancel(job))
+
+    def test_cancel_running_job_at_next_report(self):
+        job = enqueue('tests.cancel_midway')
+        self.assertEqual(run_one(), Job.CANCELLED)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.CANCELLED)
+        self.assertIsNone(job.result)
+
+    def test_report_raises_once_cancelled(self):
+        job = enqueue('tests.echo')
+        claim('test-worker')
+        job.refresh_from_db()
+        report(job, 'half way')
+        self.assertEqual(Job.objects.get(pk=job.pk).progress, 'half way')
+        cancel(job)
+        job._reported_at = 0
+        with self.assertRaises(JobCancelled):
+            report(job)
+
+    def test_requeue_stale(self):
+        stale = enqueue('tests.echo')
+        exhausted = enqueue('tests.echo')
+        fresh = enqueue('tests.echo')
+        claim('dead-worker', limit=3)
+        Job.objects.filter(pk=exhausted.pk).update(attempts=3)
+        Job.objects.exclude(pk=fresh.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=10))
+
+        self.assertEqual(requeue_stale(stale_after=60), 2)
+        statuses = dict(Job.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {stale.pk: Job.QUEUED, exhausted.pk: Job.FAILED, fresh.pk: Job.RUNNING})
+        # The dead worker can no longer record an outcome for the requeued job.
+        self.assertEqual(run_one('another-worker'), Job.SUCCEEDED)
+
+
+class RunJobsCommandTests(JobFilesMixin, TransactionTestCase):
+    def test_burst(self):
+        calls.clear()
+        jobs = [enqueue('tests.echo', {'n': n}) for n in range(3)]
+        stdout = StringIO()
+        call_command('run_jobs', '--burst', '--concurrency', '2', '--poll-interval', '0.01', stdout=stdout)
+        self.assertEqual(
+            set(Job.objects.filter(pk__in=[job.pk for job in jobs]).values_list('status', flat=True)),
+            {Job.SUCCEEDED}
+        )
+        self.assertEqual(sorted(call['n'] for call in calls), [0, 1, 2])
+        self.assertIn('Successfully stopped worker', stdout.getvalue())
+
+
+class JobAPITests(JobFilesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='jobuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('job-list')
+        Expense.objects.create(owner=self.user, description='Lunch', amount=Decimal('12.50'),
+                               category='Food & Dining', date=date(2024, 1, 5))
+        Expense.objects.create(owner=self.user, description='Taxi', amount=Decimal('30.00'),
+                               category='Transportation', date=date(2024, 1, 6))
+
+    def test_export_job_lifecycle(self):
+        response = self.client.post(self.url, {'kind': 'expenses.export',
+                                               'params': {'format': 'ndjson', 'category': 'Transportation'}},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], Job.QUEUED)
+        detail = response['Location']
+        self.assertTrue(detail.endswith(reverse('job-detail', args=[response.data['id']])))
+
+        self.assertEqual(run_one(), Job.SUCCEEDED)
+        response = self.client.get(detail)
+        self.assertEqual(response.data['status'], Job.SUCCEEDED)
+        self.assertEqual(response.data['result']['rows'], 1)
+
+        response = self.client.get(reverse('job-download', args=[response.data['id']]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['description'] for row in rows], ['Taxi'])
+
+    def test_import_job(self):
+        upload = SimpleUploadedFile('expenses.csv', b'description,amount,category,date\n'
+                                                    b'Coffee,3.20,Food & Dining,2024-02-01\n')
+        response = self.client.post(self.url, {'kind': 'expenses.import', 'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(run_one(), Job.SUCCEEDED)
+        self.assertTrue(Expense.objects.filter(owner=self.user, description='Coffee').exists())
+        self.assertIn('Imported 1 expenses', Job.objects.get().result['summary'])
+
+    def test_invalid_submissions(self):
+        response = self.client.post(self.url, {'kind': 'expenses.unknown'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'kind': 'expenses.export', 'params': {'format': 'xml'}},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'kind': 'expenses.export', 'params': {'path': '/etc'}},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'kind': 'expenses.import'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Job.objects.exists())
+
+    def test_staff_only_kinds(self):
+        response = self.client.post(self.url, {'kind': 'expenses.rebuild_rollups'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post(self.url, {'kind': 'expenses.rebuild_rollups'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(run_one(), Job.SUCCEEDED)
+
+    def test_cancel(self):
+        job = enqueue('expenses.export', owner_id=self.user.id)
+        url = reverse('job-cancel', args=[job.pk])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], Job.CANCELLED)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_jobs_are_scoped_to_their_owner(self):
+        other = User.objects.create_user(username='otherjobuser', password='testpass123')
+        theirs = enqueue('expenses.export', owner_id=other.id)
+        mine = enqueue('expenses.export', owner_id=self.user.id)
+
+        response = self.client.get(self.url)
+        self.assertEqual([job['id'] for job in response.data['results']], [mine.pk])
+        self.assertEqual(self.client.get(reverse('job-detail', args=[theirs.pk])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.post(reverse('job-cancel', args=[theirs.pk])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+        # Their export only contains their expenses.
+        Expense.objects.create(owner=other, description='Theirs', amount=Decimal('1.00'),
+                               category='Other', date=date(2024, 1, 7))
+        cancel(mine)
+        self.assertEqual(run_one(), Job.SUCCEEDED)
+        theirs.refresh_from_db()
+        self.assertEqual(theirs.result['rows'], 1)
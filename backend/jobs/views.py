@@ -0,0 +1,71 @@
+import logging
+import os
+
+from django.http import FileResponse
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+
+from .models import Job
+from . import runner
+from .serializers import JobSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class JobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                 viewsets.GenericViewSet):
+    """
+    Submit background jobs and poll them. POST answers 202 with the queued
+    job and its URL in Location; GET that URL until `status` is succeeded,
+    failed or cancelled.
+    """
+    serializer_class = JobSerializer
+    queryset = Job.objects.all()
+
+    def get_queryset(self):
+        return Job.objects.filter(owner_id=self.request.user.id)
+
+    def perform_create(self, serializer):
+        serializer.save(owner_id=self.request.user.id)
+
+    def create(self, request, *args, **kwargs):
+        try:
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            self.perform_create(serializer)
+            location = reverse('job-detail', args=[serializer.instance.pk], request=request)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED, headers={'Location': location})
+        except APIException:
+            raise
+        except Exception as e:
+            logger.error(f"Error submitting job: {str(e)}")
+            return Response(
+                {'error': 'Failed to submit job'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        # Queued jobs are cancelled at once; running ones at their next progress report.
+        job = self.get_object()
+        if not runner.cancel(job):
+            job.refresh_from_db()
+            return Response(
+                {'error': f'Job already {job.status}'},
+                status=status.HTTP_409_CONFLICT
+            )
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        path = (job.result or {}).get('file') if isinstance(job.result, dict) else None
+        if job.status != Job.SUCCEEDED or not path:
+            return Response({'error': 'This job has no file to download'}, status=status.HTTP_404_NOT_FOUND)
+        if not os.path.exists(path):
+            return Response({'error': 'The file has been removed'}, status=status.HTTP_410_GONE)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))